@@ -30,14 +30,18 @@ CHAT_CONFIG = {
     "api_key": os.getenv("CHAT_API_KEY"),
     "base_url": os.getenv("CHAT_BASE_URL", "https://openrouter.ai/api/v1"),
     "model": os.getenv("CHAT_MODEL", "gpt-3.5-turbo"),
-    "timeout": int(os.getenv("CHAT_TIMEOUT", "45"))  # 评价器超时时间
+    "timeout": int(os.getenv("CHAT_TIMEOUT", "45")),  # 评价器超时时间
+    "judge_batch_questions": int(os.getenv("JUDGE_BATCH_QUESTIONS", "1")),  # 每次评分请求打包的问题数（0表示逐项评分）
+    "judge_batch_max_answers": int(os.getenv("JUDGE_BATCH_MAX_ANSWERS", "8"))  # 每次评分请求的最大回答数
 }
 
 EMBEDDING_CONFIG = {
     "base_url": os.getenv("EMBEDDING_BASE_URL", "http://localhost:11434"),
     "model": os.getenv("EMBEDDING_MODEL", "nomic-embed-text:latest"),
     "api_key": os.getenv("EMBEDDING_API_KEY", ""),  # 嵌入模型通常不需要API key，但保留选项
-    "timeout": int(os.getenv("EMBEDDING_TIMEOUT", "30"))  # 嵌入模型超时时间
+    "timeout": int(os.getenv("EMBEDDING_TIMEOUT", "30")),  # 嵌入模型超时时间
+    "batch_size": int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),  # 单次 /api/embed 请求的最大文本数
+    "batch_interval_ms": float(os.getenv("EMBEDDING_BATCH_INTERVAL_MS", "5"))  # 未满批次的最长等待时间（毫秒）
 }
 
 # 异步配置
@@ -48,16 +52,39 @@ ASYNC_CONFIG = {
     
     # 并发控制配置
     "max_concurrency": int(os.getenv("MAX_CONCURRENCY", "3")),  # 最大并发数
+    "evaluator_max_concurrency": int(os.getenv("EVALUATOR_MAX_CONCURRENCY", os.getenv("MAX_CONCURRENCY", "3"))),  # 每个评价器的最大并发数
     "batch_size": int(os.getenv("BATCH_SIZE", "10")),  # 批处理大小
     
+    # 流式评估流水线配置（查询和评分两个阶段独立的并发预算）
+    "judge_concurrency": int(os.getenv("JUDGE_CONCURRENCY", os.getenv("EVALUATOR_MAX_CONCURRENCY", os.getenv("MAX_CONCURRENCY", "3")))),  # 评分阶段的worker数
+    "pipeline_queue_size": int(os.getenv("PIPELINE_QUEUE_SIZE", "10")),  # 待评分队列容量（已就绪的问题数），满时暂停查询
+    
+    # 自适应并发（AIMD）：每个上游（RAG系统、评分模型、嵌入服务）独立调整并发上限，
+    # 上面的并发数作为初始值；延迟稳定时逐步加1，遇到429/5xx/超时时减半
+    "adaptive_concurrency": os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() == "true",  # 是否启用自适应并发
+    "adaptive_min_concurrency": int(os.getenv("ADAPTIVE_MIN_CONCURRENCY", "1")),  # 并发下限
+    "adaptive_max_concurrency": int(os.getenv("ADAPTIVE_MAX_CONCURRENCY", "32")),  # 并发上限（不超过HTTP连接池大小）
+    "adaptive_decrease_factor": float(os.getenv("ADAPTIVE_DECREASE_FACTOR", "0.5")),  # 过载时的缩减倍数
+    "adaptive_latency_tolerance": float(os.getenv("ADAPTIVE_LATENCY_TOLERANCE", "1.5")),  # p95延迟超过基线的该倍数时停止增加
+    "adaptive_embedding_concurrency": int(os.getenv("ADAPTIVE_EMBEDDING_CONCURRENCY", "4")),  # 嵌入服务的初始并发批次数
+    
     # 重试机制配置
     "retry_attempts": int(os.getenv("RETRY_ATTEMPTS", "2")),  # 重试次数
     "retry_delay": float(os.getenv("RETRY_DELAY", "1.0")),  # 重试延迟
+    "retry_max_delay": float(os.getenv("RETRY_MAX_DELAY", "30")),  # 重试等待上限（去相关抖动）
+    
+    # 熔断器配置（每个RAG系统、聊天模型和嵌入模型一个）
+    "circuit_breaker_enabled": os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true",  # 是否启用熔断
+    "circuit_failure_threshold": int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),  # 打开熔断的连续失败次数
+    "circuit_cooldown": float(os.getenv("CIRCUIT_COOLDOWN", "30")),  # 熔断打开后的冷却时间（秒）
+    "circuit_half_open_probes": int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1")),  # 半开状态的探测请求数
     
     # HTTP客户端配置
     "http_timeout": int(os.getenv("ASYNC_HTTP_TIMEOUT", "30")),  # HTTP超时时间
     "http_pool_size": int(os.getenv("ASYNC_HTTP_POOL_SIZE", "10")),  # 连接池大小
     "http_max_connections": int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "20")),  # 最大连接数
+    "http_dns_cache_ttl": int(os.getenv("ASYNC_HTTP_DNS_CACHE_TTL", "300")),  # DNS缓存时间（秒）
+    "http_keepalive_timeout": int(os.getenv("ASYNC_HTTP_KEEPALIVE_TIMEOUT", "30")),  # 空闲连接保活时间（秒）
     
     # 进度跟踪配置
     "progress_update_interval": float(os.getenv("PROGRESS_UPDATE_INTERVAL", "1.0")),  # 进度更新间隔
@@ -68,6 +95,73 @@ ASYNC_CONFIG = {
     "log_format": os.getenv("ASYNC_LOG_FORMAT", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")  # 日志格式
 }
 
+def _parse_rate_limits(value: str) -> dict:
+    """
+    解析按上游配置的速率限制
+    
+    Args:
+        value: "名称=RPM,TPM;名称=RPM"，名称为模型名、RAG系统名或完整的上游名（如chat:gpt-4o-mini）
+        
+    Returns:
+        {名称: (RPM, TPM)}，0表示不限制
+    """
+    limits = {}
+    for entry in value.split(";"):
+        if "=" not in entry:
+            continue
+        name, budget = entry.rsplit("=", 1)
+        parts = [int(part) if part.strip() else 0 for part in budget.split(",")]
+        limits[name.strip()] = (parts[0], parts[1] if len(parts) > 1 else 0)
+    return limits
+
+# 速率限制配置（每个上游一个令牌桶，在发送请求前获取）
+RATE_LIMIT_CONFIG = {
+    "default_rpm": int(os.getenv("RATE_LIMIT_DEFAULT_RPM", "0")),  # 未单独配置的上游的每分钟请求数（0为不限制）
+    "default_tpm": int(os.getenv("RATE_LIMIT_DEFAULT_TPM", "0")),  # 未单独配置的上游的每分钟token数（0为不限制）
+    "limits": _parse_rate_limits(os.getenv("RATE_LIMITS", "")),  # 按模型/系统的预算
+    "burst_seconds": float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10")),  # 令牌桶容量（按多少秒的配额计算）
+}
+
+# 缓存配置
+CACHE_CONFIG = {
+    # 聊天模型评分缓存（按模型、提示词模板版本和输入内容哈希）
+    "judge_cache_enabled": os.getenv("JUDGE_CACHE_ENABLED", "true").lower() == "true",
+    "judge_cache_path": os.getenv("JUDGE_CACHE_PATH", ".cache/judge_cache.sqlite3"),
+    "judge_cache_max_entries": int(os.getenv("JUDGE_CACHE_MAX_ENTRIES", "50000")),  # 最大条目数（LRU淘汰）
+    "judge_cache_ttl": int(os.getenv("JUDGE_CACHE_TTL", str(30 * 24 * 3600))),  # 有效期（秒），0表示永不过期
+    
+    # 嵌入向量存储（按嵌入模型和文本哈希，内存映射float32文件）
+    "embedding_cache_enabled": os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true",
+    "embedding_cache_dir": os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings"),
+}
+
+# 结果输出配置
+OUTPUT_CONFIG = {
+    "parquet_enabled": os.getenv("RESULT_PARQUET_ENABLED", "false").lower() == "true",  # 是否同时输出长表Parquet（需要pyarrow）
+    "parquet_row_group_size": int(os.getenv("RESULT_PARQUET_ROW_GROUP_SIZE", "50000")),  # Parquet每个行组的行数（长表行）
+    "run_store_path": os.getenv("RUN_STORE_PATH", "results/run_history.db"),  # 运行历史SQLite文件（为空时不记录）
+    "run_store_batch_size": int(os.getenv("RUN_STORE_BATCH_SIZE", "200")),  # 每个写入事务包含的用例数
+    "bootstrap_resamples": int(os.getenv("SUMMARY_BOOTSTRAP_RESAMPLES", "2000")),  # 汇总置信区间的bootstrap重采样次数（0为不计算）
+    "confidence": float(os.getenv("SUMMARY_CONFIDENCE", "0.95")),  # 置信区间的置信水平
+}
+
+# 运行比较和回退门禁配置
+COMPARE_CONFIG = {
+    "test": os.getenv("COMPARE_TEST", "permutation"),  # 配对检验方法: permutation或wilcoxon
+    "alpha": float(os.getenv("COMPARE_ALPHA", "0.05")),  # 显著性水平
+    "regression_threshold": float(os.getenv("COMPARE_REGRESSION_THRESHOLD", "0.1")),  # 单个用例下降超过该值记为回退
+    "gate_metrics": [m.strip() for m in os.getenv("COMPARE_GATE_METRICS", "").split(",") if m.strip()],  # 门禁指标（为空时全部）
+    "permutations": int(os.getenv("COMPARE_PERMUTATIONS", "10000")),  # 置换检验次数
+}
+
+# 运行指标导出配置（Prometheus文本格式，长时间运行时供监控系统抓取）
+METRICS_CONFIG = {
+    "port": int(os.getenv("METRICS_PORT", "0")),  # 内置HTTP端点 /metrics 的端口（0为不启动）
+    "host": os.getenv("METRICS_HOST", "0.0.0.0"),  # 内置HTTP端点的监听地址
+    "textfile": os.getenv("METRICS_TEXTFILE", ""),  # node_exporter textfile collector的输出文件（.prom，为空时不写入）
+    "textfile_interval": float(os.getenv("METRICS_TEXTFILE_INTERVAL", "15")),  # 写入textfile的间隔（秒）
+}
+
 # RAG系统配置 - 支持的RAG系统
 RAG_SYSTEMS = {
     "ragflow": {
@@ -75,6 +169,7 @@ RAG_SYSTEMS = {
         "api_key": os.getenv("RAGFLOW_API_KEY"),
         "base_url": os.getenv("RAGFLOW_BASE_URL"),
         "chat_id": os.getenv("RAGFLOW_CHAT_ID"),  # 可选，自动检测
+        "streaming": os.getenv("RAGFLOW_STREAMING", "false").lower() == "true",  # SSE流式模式（记录首字延迟）
     },
     "dify": {
         "enabled": os.getenv("DIFY_ENABLED", "true").lower() == "true",
@@ -82,6 +177,7 @@ RAG_SYSTEMS = {
         "base_url": os.getenv("DIFY_BASE_URL"),
         "app_id": os.getenv("DIFY_APP_ID"),
         "user_id": os.getenv("DIFY_USER_ID", "rag-evaluator"),
+        "streaming": os.getenv("DIFY_STREAMING", "false").lower() == "true",  # SSE流式模式（记录首字延迟）
     }
 }
 
@@ -91,17 +187,27 @@ def get_enabled_rag_systems():
     return {name: config for name, config in RAG_SYSTEMS.items() if config.get("enabled", False)}
 
 # 验证配置完整性
-def validate_config():
-    """验证必要的配置是否完整"""
+def validate_config(require_evaluators: bool = True, require_rag_systems: bool = True):
+    """
+    验证必要的配置是否完整
+    
+    Args:
+        require_evaluators: 是否检查评估模型配置（只收集回答时不需要）
+        require_rag_systems: 是否检查RAG系统配置（只评估已有回答时不需要）
+    """
     errors = []
     
-    # 检查聊天模型配置
-    if not CHAT_CONFIG.get("api_key"):
-        errors.append("CHAT_API_KEY is required")
+    if require_evaluators:
+        # 检查聊天模型配置
+        if not CHAT_CONFIG.get("api_key"):
+            errors.append("CHAT_API_KEY is required")
+        
+        # 检查嵌入模型配置
+        if not EMBEDDING_CONFIG.get("base_url"):
+            errors.append("EMBEDDING_BASE_URL is required")
     
-    # 检查嵌入模型配置
-    if not EMBEDDING_CONFIG.get("base_url"):
-        errors.append("EMBEDDING_BASE_URL is required")
+    if not require_rag_systems:
+        return errors
     
     # 检查启用的RAG系统
     enabled_systems = get_enabled_rag_systems()
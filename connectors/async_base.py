@@ -1,6 +1,7 @@
 # 异步连接器基类 - 为RAG系统提供异步接口
 
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from typing import Dict, Any, Optional, List
 import asyncio
 import logging
@@ -10,6 +11,9 @@ logger = logging.getLogger(__name__)
 class AsyncBaseRAGConnector(ABC):
     """异步连接器基类"""
     
+    # 错误信息中的API名称
+    API_NAME = "RAG"
+    
     def __init__(self, system_name: str, config: Dict[str, Any]):
         """
         初始化异步连接器
@@ -101,6 +105,52 @@ class AsyncBaseRAGConnector(ABC):
             logger.error(f"{self.system_name} 连接测试失败: {str(e)}")
             return False
     
+    async def _check_response_status(self, response, bucket, request_bytes: int):
+        """
+        记录响应状态，非200时读取错误内容并抛出（阻塞和流式请求共用）
+        
+        429时按Retry-After暂停该系统的所有请求并抛出RateLimitError（重试时至少等待该时间），
+        429/5xx同时通知该系统的自适应并发限制器降低并发。
+        
+        Args:
+            response: aiohttp响应
+            bucket: 该系统的速率限制器
+            request_bytes: 请求体字节数
+        """
+        from utils.adaptive_limiter import note_http_status
+        from utils.rate_limiter import RateLimitError
+        from utils.telemetry import note_response
+        
+        note_response(response.status, request_bytes)
+        if response.status == 200:
+            return
+        
+        note_http_status(response.status)
+        retry_after = bucket.on_rate_limited(response.headers) if response.status == 429 else None
+        error_text = await response.text()
+        note_response(response.status, response_bytes=len(error_text.encode("utf-8")))
+        if response.status == 429:
+            raise RateLimitError(f"{self.API_NAME} API error: 429 - {error_text}", retry_after)
+        raise Exception(f"{self.API_NAME} API error: {response.status} - {error_text}")
+    
+    @contextmanager
+    def _request_errors(self):
+        """统一请求异常：RateLimitError原样抛出，超时通知并发限制器，其他异常加上API名称"""
+        from utils.adaptive_limiter import report_overload
+        from utils.rate_limiter import RateLimitError
+        from utils.telemetry import note_response
+        
+        try:
+            yield
+        except RateLimitError:
+            raise
+        except asyncio.TimeoutError:
+            report_overload("timeout")
+            note_response("timeout")
+            raise Exception(f"{self.API_NAME} API请求超时")
+        except Exception as e:
+            raise Exception(f"{self.API_NAME} API请求失败: {str(e)}")
+    
     @abstractmethod
     def validate_config(self) -> List[str]:
         """
@@ -1,9 +1,9 @@
 # Dify RAG连接器实现
 
-import aiohttp
-import asyncio
+import json
 import logging
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Tuple
 from .async_base import AsyncBaseRAGConnector
 
 logger = logging.getLogger(__name__)
@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 class DifyConnector(AsyncBaseRAGConnector):
     """Dify RAG系统连接器"""
     
+    API_NAME = "Dify"
+    
     def validate_config(self) -> List[str]:
         """验证Dify配置"""
         errors = []
@@ -37,7 +39,7 @@ class DifyConnector(AsyncBaseRAGConnector):
                     "instruction": "Please help with software development questions"
                 },
                 "query": question,
-                "response_mode": "blocking",
+                "response_mode": "streaming" if self.config.get("streaming") else "blocking",
                 "conversation_id": None,
                 "user": user_id,
                 "files": []
@@ -50,18 +52,74 @@ class DifyConnector(AsyncBaseRAGConnector):
         url = request_data["url"]
         body = request_data["body"]
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=body) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"Dify API error: {response.status} - {error_text}")
-        except asyncio.TimeoutError:
-            raise Exception("Dify API请求超时")
-        except Exception as e:
-            raise Exception(f"Dify API请求失败: {str(e)}")
+        from utils.http_session import get_session_manager
+        from utils.rate_limiter import get_rate_limiter
+        from utils.telemetry import note_response
+        
+        bucket = get_rate_limiter(f"rag:{self.system_name}")
+        # 请求体只序列化一次，同时得到遥测用的请求大小
+        request_body = json.dumps(body).encode("utf-8")
+        with self._request_errors():
+            await bucket.acquire()
+            # 复用按主机共享的连接池会话，避免每次请求重新建立TCP/TLS连接
+            session = get_session_manager().get_session(url)
+            async with session.post(url, headers=headers, data=request_body) as response:
+                await self._check_response_status(response, bucket, len(request_body))
+                raw = await response.read()
+                note_response(response.status, response_bytes=len(raw))
+                return json.loads(raw)
+
+    async def send_streaming_request_async(self, request_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        异步发送流式请求到Dify API，边接收SSE事件边拼接回答
+        
+        message/agent_message事件携带回答片段，message_end事件携带检索到的资源，error事件表示生成失败。
+        
+        Args:
+            request_data: build_request构建的请求（response_mode为streaming）
+            
+        Returns:
+            (与阻塞模式结构相同的响应数据, 计时)
+        """
+        headers = request_data["headers"]
+        url = request_data["url"]
+        body = request_data["body"]
+        
+        from utils.http_session import get_session_manager
+        from utils.rate_limiter import get_rate_limiter
+        from utils.telemetry import note_response
+        from utils.sse import StreamTimer, iter_sse_events
+        
+        bucket = get_rate_limiter(f"rag:{self.system_name}")
+        # 请求体只序列化一次，同时得到遥测用的请求大小
+        request_body = json.dumps(body).encode("utf-8")
+        with self._request_errors():
+            await bucket.acquire()
+            timer = StreamTimer()
+            session = get_session_manager().get_session(url)
+            async with session.post(url, headers=headers, data=request_body) as response:
+                await self._check_response_status(response, bucket, len(request_body))
+                
+                answer_parts = []
+                metadata = {}
+                async for event_type, data in iter_sse_events(response.content):
+                    try:
+                        payload = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    event = payload.get("event", event_type)
+                    if event in ("message", "agent_message"):
+                        chunk = payload.get("answer", "")
+                        if chunk:
+                            timer.token()
+                            answer_parts.append(chunk)
+                    elif event == "message_end":
+                        metadata = payload.get("metadata") or {}
+                    elif event == "error":
+                        raise Exception(f"Dify stream error: {payload.get('code')} - {payload.get('message')}")
+                note_response(response.status, response_bytes=response.content.total_bytes)
+            
+            return {"answer": "".join(answer_parts), "metadata": metadata}, timer.result()
 
     async def query_async(self, question: str, max_retries: int = 2, **kwargs) -> Dict[str, Any]:
         """异步查询Dify系统"""
@@ -69,6 +127,8 @@ class DifyConnector(AsyncBaseRAGConnector):
         import os
         sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         from utils.async_utils import AsyncUtils
+        from utils.circuit_breaker import CircuitOpenError, raise_if_open
+        from utils.sse import blocking_timing
         
         # 创建AsyncUtils实例
         async_utils = AsyncUtils()
@@ -76,8 +136,17 @@ class DifyConnector(AsyncBaseRAGConnector):
         request_data = self.build_request(question, **kwargs)
         
         async def make_request():
-            response_data = await self.send_request_async(request_data)
-            return self.parse_response(response_data)
+            # 其他请求已经触发熔断时不再重试
+            raise_if_open(f"rag:{self.system_name}")
+            if self.config.get("streaming"):
+                response_data, timing = await self.send_streaming_request_async(request_data)
+            else:
+                started = time.perf_counter()
+                response_data = await self.send_request_async(request_data)
+                timing = blocking_timing(started)
+            result = self.parse_response(response_data)
+            result["timing"] = timing
+            return result
         
         # 使用异步重试机制
         try:
@@ -85,7 +154,8 @@ class DifyConnector(AsyncBaseRAGConnector):
                 make_request,
                 max_retries=max_retries,
                 delay=1.0,
-                exceptions=(Exception,)
+                exceptions=(Exception,),
+                no_retry=(CircuitOpenError,)
             )
             return result
         except Exception as e:
@@ -1,9 +1,9 @@
 # RagFlow RAG连接器实现
 
-import aiohttp
-import asyncio
+import json
 import logging
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Tuple
 from .async_base import AsyncBaseRAGConnector
 
 logger = logging.getLogger(__name__)
@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 class RagFlowConnector(AsyncBaseRAGConnector):
     """RagFlow RAG系统连接器"""
     
+    API_NAME = "RagFlow"
+    
     def validate_config(self) -> List[str]:
         """验证RagFlow配置"""
         errors = []
@@ -31,7 +33,7 @@ class RagFlowConnector(AsyncBaseRAGConnector):
             },
             "body": {
                 "question": question,
-                "streaming": False
+                "streaming": bool(self.config.get("streaming"))
             }
         }
     
@@ -41,18 +43,81 @@ class RagFlowConnector(AsyncBaseRAGConnector):
         url = request_data["url"]
         body = request_data["body"]
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=body) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"RagFlow API error: {response.status} - {error_text}")
-        except asyncio.TimeoutError:
-            raise Exception("RagFlow API请求超时")
-        except Exception as e:
-            raise Exception(f"RagFlow API请求失败: {str(e)}")
+        from utils.http_session import get_session_manager
+        from utils.rate_limiter import get_rate_limiter
+        from utils.telemetry import note_response
+        
+        bucket = get_rate_limiter(f"rag:{self.system_name}")
+        # 请求体只序列化一次，同时得到遥测用的请求大小
+        request_body = json.dumps(body).encode("utf-8")
+        with self._request_errors():
+            await bucket.acquire()
+            # 复用按主机共享的连接池会话，避免每次请求重新建立TCP/TLS连接
+            session = get_session_manager().get_session(url)
+            async with session.post(url, headers=headers, data=request_body) as response:
+                await self._check_response_status(response, bucket, len(request_body))
+                raw = await response.read()
+                note_response(response.status, response_bytes=len(raw))
+                return json.loads(raw)
+
+    async def send_streaming_request_async(self, request_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        异步发送流式请求到RagFlow API，边接收SSE事件边拼接回答
+        
+        每个事件的data为{"code", "message", "data"}：data.answer为累积的回答（兼容只发送增量的版本），
+        data.reference.chunks为检索片段，data为true表示结束，code非0表示生成失败。
+        
+        Args:
+            request_data: build_request构建的请求（streaming为True）
+            
+        Returns:
+            (与阻塞模式结构相同的响应数据, 计时)
+        """
+        headers = request_data["headers"]
+        url = request_data["url"]
+        body = request_data["body"]
+        
+        from utils.http_session import get_session_manager
+        from utils.rate_limiter import get_rate_limiter
+        from utils.telemetry import note_response
+        from utils.sse import StreamTimer, iter_sse_events
+        
+        bucket = get_rate_limiter(f"rag:{self.system_name}")
+        # 请求体只序列化一次，同时得到遥测用的请求大小
+        request_body = json.dumps(body).encode("utf-8")
+        with self._request_errors():
+            await bucket.acquire()
+            timer = StreamTimer()
+            session = get_session_manager().get_session(url)
+            async with session.post(url, headers=headers, data=request_body) as response:
+                await self._check_response_status(response, bucket, len(request_body))
+                
+                answer = ""
+                chunks = []
+                async for _, data in iter_sse_events(response.content):
+                    try:
+                        payload = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    if payload.get("code", 0) != 0:
+                        raise Exception(f"RagFlow stream error: {payload.get('code')} - {payload.get('message')}")
+                    event_data = payload.get("data")
+                    if not isinstance(event_data, dict):
+                        continue
+                    
+                    text = event_data.get("answer") or ""
+                    if text.startswith(answer):
+                        # 累积回答：只有变长时才算收到新内容
+                        if len(text) > len(answer):
+                            timer.token()
+                            answer = text
+                    elif text:
+                        timer.token()
+                        answer += text
+                    chunks = event_data.get("chunks") or (event_data.get("reference") or {}).get("chunks") or chunks
+                note_response(response.status, response_bytes=response.content.total_bytes)
+            
+            return {"data": {"answer": answer, "chunks": chunks}}, timer.result()
 
     async def query_async(self, question: str, max_retries: int = 2, **kwargs) -> Dict[str, Any]:
         """异步查询RagFlow系统"""
@@ -60,6 +125,8 @@ class RagFlowConnector(AsyncBaseRAGConnector):
         import os
         sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         from utils.async_utils import AsyncUtils
+        from utils.circuit_breaker import CircuitOpenError, raise_if_open
+        from utils.sse import blocking_timing
         
         # 创建AsyncUtils实例
         async_utils = AsyncUtils()
@@ -67,8 +134,17 @@ class RagFlowConnector(AsyncBaseRAGConnector):
         request_data = self.build_request(question, **kwargs)
         
         async def make_request():
-            response_data = await self.send_request_async(request_data)
-            return self.parse_response(response_data)
+            # 其他请求已经触发熔断时不再重试
+            raise_if_open(f"rag:{self.system_name}")
+            if self.config.get("streaming"):
+                response_data, timing = await self.send_streaming_request_async(request_data)
+            else:
+                started = time.perf_counter()
+                response_data = await self.send_request_async(request_data)
+                timing = blocking_timing(started)
+            result = self.parse_response(response_data)
+            result["timing"] = timing
+            return result
         
         # 使用异步重试机制
         try:
@@ -76,7 +152,8 @@ class RagFlowConnector(AsyncBaseRAGConnector):
                 make_request,
                 max_retries=max_retries,
                 delay=1.0,
-                exceptions=(Exception,)
+                exceptions=(Exception,),
+                no_retry=(CircuitOpenError,)
             )
             return result
         except Exception as e:
@@ -5,6 +5,9 @@ import re
 import asyncio
 from typing import Dict, Any
 from .factory import RAGConnectorFactory
+from utils.adaptive_limiter import get_limiter, report_overload
+from utils.circuit_breaker import CircuitOpenError, guard
+from utils.telemetry import note_error, note_response, track
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,10 @@ class UniversalRAGConnector:
         # 使用工厂模式创建具体的连接器
         self.connector = RAGConnectorFactory.create_connector(system_name, config)
         
+        # 该系统的自适应并发限制器（初始值为MAX_CONCURRENCY）
+        from config import ASYNC_CONFIG
+        self.limiter = get_limiter(f"rag:{system_name}", ASYNC_CONFIG["max_concurrency"])
+        
         logger.info(f"Universal connector initialized for {system_name}")
     
     def _extract_answer_from_think_tags(self, raw_answer: str) -> str:
@@ -86,23 +93,42 @@ class UniversalRAGConnector:
         """
         带超时的异步查询RAG系统
 
+        在该系统的自适应并发限制内执行，等待槽位的时间不计入超时；超时和429/5xx会降低并发上限。
+        连续失败触发熔断后直接返回错误结果，不再等待超时。
+        耗时、排队时间、重试次数、HTTP状态码和负载大小记录到遥测直方图，并随结果返回。
+
         Args:
             question: 要查询的问题
             timeout: 超时时间（秒）
             **kwargs: 额外参数
 
         Returns:
-            {"answer": str, "contexts": list, "error": str}
+            {"answer": str, "contexts": list, "error": str, "telemetry": dict}
         """
-        try:
-            result = await asyncio.wait_for(
-                self.query_async(question, **kwargs),
-                timeout=timeout
-            )
-            return result
-        except asyncio.TimeoutError:
-            logger.error(f"RAG查询超时（{timeout}秒）: {question[:100]}...")
-            return {"answer": "", "contexts": [], "error": f"查询超时（{timeout}秒）"}
+        with track("rag", self.system_name) as telemetry:
+            try:
+                with guard(f"rag:{self.system_name}") as call:
+                    async with self.limiter.slot():
+                        try:
+                            result = await asyncio.wait_for(
+                                self.query_async(question, **kwargs),
+                                timeout=timeout
+                            )
+                        except asyncio.TimeoutError:
+                            report_overload("timeout")
+                            note_response("timeout")
+                            logger.error(f"RAG查询超时（{timeout}秒）: {question[:100]}...")
+                            result = {"answer": "", "contexts": [], "error": f"查询超时（{timeout}秒）"}
+                    if result.get("error"):
+                        call.fail(result["error"][:200])
+            except CircuitOpenError as e:
+                note_response("circuit_open")
+                result = {"answer": "", "contexts": [], "error": str(e)}
+            if result.get("error"):
+                note_error()
+        # 本次查询的遥测记录随结果保存到逐题明细
+        result["telemetry"] = telemetry
+        return result
 
     def query(self, question: str, max_retries: int = 2, **kwargs) -> Dict[str, Any]:
         """
@@ -161,6 +187,18 @@ class UniversalRAGConnector:
     def get_system_info(self) -> Dict[str, Any]:
         """获取系统信息"""
         return self.connector.get_system_info()
+    
+    def get_fingerprint_config(self) -> Dict[str, Any]:
+        """
+        获取影响回答内容的配置（用于增量评估判断回答能否复用）
+        
+        Returns:
+            去除密钥、开关和响应模式后的系统配置（流式和阻塞模式的回答相同）
+        """
+        return {
+            "system": self.system_name,
+            **{k: v for k, v in self.config.items() if k not in ("api_key", "enabled", "streaming")}
+        }
 
     async def batch_query_async(self, questions: list, timeout: int = 30, concurrency: int = 3) -> list:
         """
@@ -179,13 +217,15 @@ class UniversalRAGConnector:
         sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         from utils.async_utils import AsyncUtils
         
-        # 创建查询任务
-        tasks = []
-        for question in questions:
-            task = asyncio.create_task(self.query_with_timeout(question, timeout))
-            tasks.append(task)
-        
-        # 并发执行查询
-        results = await AsyncUtils.gather_with_concurrency(tasks, concurrency)
+        # 惰性创建查询协程，由有界工作池保持concurrency个在途请求
+        factories = [
+            lambda question=question: self.query_with_timeout(question, timeout)
+            for question in questions
+        ]
+        results = await AsyncUtils.run_bounded(factories, concurrency)
         
-        return results
+        # 将单个查询的异常转换为统一的错误结果
+        return [
+            {"answer": "", "contexts": [], "error": f"查询失败: {result}"} if isinstance(result, Exception) else result
+            for result in results
+        ]
\ No newline at end of file
@@ -1,23 +1,69 @@
 # 增强异步学术评估器 - 合并学术和混合模型优势
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from .async_base import AsyncBaseEvaluator
 from .base import BaseEvaluator
+from utils.http_session import get_session_manager
+from utils.adaptive_limiter import note_http_status, report_overload
+from utils.rate_limiter import RateLimitError, estimate_tokens, get_rate_limiter
+from utils.telemetry import note_error, note_response, track
+from utils.async_utils import AsyncUtils
+from utils.circuit_breaker import CircuitOpenError, guard
+from utils.judge_cache import JudgeCache
+from utils.embedding_store import get_embedding_store
+from utils.embedding_client import OllamaEmbeddingBatcher
+from utils.similarity import as_matrix, cosine_matrix, cosine_to_references, max_cosine_by_owner
 import json
 import re
+import time
+import numpy as np
 import asyncio
 import aiohttp
 import logging
 
 logger = logging.getLogger(__name__)
 
+class ChatCompletionError(Exception):
+    """聊天模型返回非200、非429的响应，status为HTTP状态码"""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """是否为聊天模型的上游故障（熔断、5xx、429重试耗尽），这类失败换一种请求方式重试也不会成功"""
+    if isinstance(error, (CircuitOpenError, RateLimitError)):
+        return True
+    return isinstance(error, ChatCompletionError) and error.status >= 500
+
 class AsyncAcademicEvaluator(AsyncBaseEvaluator):
     """增强异步学术评估器 - 支持可选的嵌入模型辅助评估"""
     
+    # 提示词模板版本（修改提示词或解析规则时递增，使旧的缓存评分失效）
+    # pure_chat/quality v2: 解析失败不再以0分写入缓存；batch v2: 提示词包含各回答的上下文
+    PURE_CHAT_PROMPT_VERSION = "pure_chat-v2"
+    QUALITY_PROMPT_VERSION = "quality-v2"
+    BATCH_PROMPT_VERSION = "batch-v2"
+    
+    # 聊天模型评估的指标说明（批量评分提示词使用）
+    METRIC_DESCRIPTIONS = {
+        "relevancy": "回答与问题的相关程度，是否直接回答了问题",
+        "correctness": "事实准确性，与标准答案的一致程度",
+        "completeness": "是否涵盖了标准答案中的关键信息",
+        "clarity": "表达是否清晰、逻辑是否连贯",
+        "coherence": "结构是否合理，思路是否流畅",
+        "helpfulness": "对用户的实际帮助程度"
+    }
+    
     def __init__(self, config: Dict[str, Any]):
         """初始化增强异步学术评估器"""
         super().__init__("AsyncAcademic", config)
+        self.judge_cache = None
+        self.embedding_store = None
+        self.embedding_batcher = None
+        # (回答, 标准答案) -> 批量预计算的语义相似度
+        self._similarity_cache: Dict[Tuple[str, str], float] = {}
         
         try:
             # 初始化聊天模型（主要评估模型）
@@ -35,9 +81,28 @@ class AsyncAcademicEvaluator(AsyncBaseEvaluator):
                 "model": config.get("embedding_model", "nomic-embed-text:latest")
             }
             
+            # 批量嵌入客户端：并发评估中的嵌入请求合并为 /api/embed 批量请求
+            self.embedding_batcher = OllamaEmbeddingBatcher(
+                self.embedding_config["base_url"] or "http://localhost:11434",
+                self.embedding_config["model"],
+                api_key=self.embedding_config["api_key"],
+                max_batch_size=config.get("embedding_batch_size", 32),
+                flush_interval=config.get("embedding_batch_interval", 0.005)
+            )
+            
             # 评估模式：pure_chat（纯聊天模型）或 hybrid（混合模式）
             self.evaluation_mode = config.get("evaluation_mode", "pure_chat")
             
+            # 批量评分：每次请求打包K个问题下所有系统的回答（0表示逐项评分）
+            self.judge_batch_questions = int(config.get("judge_batch_questions", 1))
+            self.judge_batch_max_answers = max(1, int(config.get("judge_batch_max_answers", 8)))
+            
+            # 可选：持久化评分缓存（相同模型、模板和输入不再重复请求聊天模型）
+            self.judge_cache = JudgeCache.from_config(config.get("judge_cache"))
+            
+            # 可选：嵌入向量存储（标准答案等文本的向量只计算一次）
+            self.embedding_store = get_embedding_store(config.get("embedding_cache"))
+            
             self._available = True
             print(f"✅ {self.name}增强异步评估器初始化成功 (模式: {self.evaluation_mode})")
         except Exception as e:
@@ -53,90 +118,402 @@ class AsyncAcademicEvaluator(AsyncBaseEvaluator):
                    "completeness": [None] * len(answers),
                    "clarity": [None] * len(answers)}
         
-        # 并发评估所有回答
-        tasks = []
-        for question, answer, ground_truth in zip(questions, answers, ground_truths):
-            if answer and answer.strip():
-                task = self.evaluate_single_answer_async(question, answer, ground_truth)
-                tasks.append(task)
-            else:
-                # 为空回答创建默认结果
-                tasks.append(asyncio.create_task(self._get_default_result()))
-        
-        # 等待所有评估完成
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 处理结果
-        relevancy_scores = []
-        correctness_scores = []
-        completeness_scores = []
-        clarity_scores = []
-        
-        for result in results:
-            if isinstance(result, Exception):
-                print(f"评估异常: {result}")
-                relevancy_scores.append(0.0)
-                correctness_scores.append(0.0)
-                completeness_scores.append(0.0)
-                clarity_scores.append(0.0)
-            else:
-                relevancy_scores.append(result["relevancy"])
-                correctness_scores.append(result["correctness"])
-                completeness_scores.append(result["completeness"])
-                clarity_scores.append(result["clarity"])
-        
-        return {
-            "relevancy": relevancy_scores,
-            "correctness": correctness_scores,
-            "completeness": completeness_scores,
-            "clarity": clarity_scores
-        }
+        # 有界并发逐项评估，超时的项目记为None（学术评估的提示词不包含检索上下文）
+        return await self._evaluate_items_bounded(
+            questions, answers, ground_truths, None,
+            metrics=["relevancy", "correctness", "completeness", "clarity"]
+        )
     
-    async def evaluate_single_answer_async(self, question: str, answer: str, 
-                                         ground_truth: str, context: List[str] = None) -> Dict[str, float]:
-        """异步评估单个回答 - 支持多种评估模式和质量指标"""
+    async def evaluate_items_async(self, items: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Optional[float]], Optional[str]]]:
+        """
+        逐项评估 - 混合模式下先一次性向量化计算所有回答的语义相似度
+        
+        Args:
+            items: 评价项列表，每项包含question、answer、ground_truth和可选的contexts
+            
+        Returns:
+            与输入顺序一致的(评价指标字典, 错误原因)列表
+        """
+        if not self._uses_embeddings():
+            # 学术评估的提示词不包含检索上下文
+            return await self._judge_items([{**item, "contexts": None} for item in items])
         
         try:
-            if self.evaluation_mode == "hybrid" and self.embedding_config["api_key"]:
-                # 混合模式：使用嵌入模型计算相关性，聊天模型计算质量指标
-                return await self._evaluate_hybrid_mode(question, answer, ground_truth, context)
-            else:
-                # 纯聊天模式：使用聊天模型评估所有指标
-                return await self._evaluate_pure_chat_mode(question, answer, ground_truth, context)
-                        
+            context_scores = await self._precompute_similarities(items)
         except Exception as e:
-            print(f"异步评估错误: {e}")
-            return self._get_enhanced_default_scores()
-    
-    async def _evaluate_hybrid_mode(self, question: str, answer: str, ground_truth: str, context: List[str] = None) -> Dict[str, float]:
-        """混合模式评估：嵌入模型 + 聊天模型"""
+            # 批量计算失败时退回逐项计算
+            print(f"批量语义相似度计算失败: {e}")
+            context_scores = [None] * len(items)
         
         try:
-            # 并发执行两种评估
-            relevancy_task = self._calculate_semantic_similarity(answer, ground_truth)
-            quality_task = self._assess_enhanced_quality_with_chat_model(question, answer, ground_truth, context)
-            
-            # 等待两种评估完成
-            relevancy_score, quality_scores = await asyncio.gather(relevancy_task, quality_task, return_exceptions=True)
+            results = await self._judge_items([{**item, "contexts": None} for item in items])
+        finally:
+            # 只移除本批次写入的预计算结果，其他并发批次的结果保留
+            for item in items:
+                self._similarity_cache.pop((item["answer"], item["ground_truth"]), None)
+        
+        # 回答与检索上下文的相似度并入评分
+        for (scores, _), context_score in zip(results, context_scores):
+            scores["context_similarity"] = context_score
+        return results
+    
+    async def _judge_items(self, items: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Optional[float]], Optional[str]]]:
+        """按配置选择批量评分或逐项评分"""
+        if self.judge_batch_questions > 0:
+            return await self._evaluate_items_batched(items)
+        return await super().evaluate_items_async(items)
+    
+    async def _evaluate_items_batched(self, items: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Optional[float]], Optional[str]]]:
+        """
+        批量评分 - 同一问题下所有系统的回答（最多judge_batch_questions个问题）合并为一次请求
+        
+        问题和标准答案在提示词中只出现一次；响应解析失败或超时的批次退回逐项评分。
+        
+        Args:
+            items: 评价项列表
             
-            # 处理异常情况
-            if isinstance(relevancy_score, Exception):
-                print(f"语义相似度计算失败: {relevancy_score}")
-                relevancy_score = 0.0
+        Returns:
+            与输入顺序一致的(评价指标字典, 错误原因)列表
+        """
+        results: List[Optional[Tuple[Dict[str, Optional[float]], Optional[str]]]] = [None] * len(items)
+        
+        # 先查缓存，再按问题分组
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        single_indexes = []
+        for i, item in enumerate(items):
+            if not item["answer"] or not item["answer"].strip():
+                single_indexes.append(i)
+                continue
+            cached_scores = self._get_cached_scores(self._batch_cache_key(item))
+            if cached_scores is not None:
+                results[i] = (await self._complete_batched_scores(item, cached_scores), None)
+                continue
+            groups.setdefault((item["question"], item["ground_truth"]), []).append(i)
+        
+        # 组装请求：每次最多judge_batch_questions个问题、judge_batch_max_answers个回答
+        calls, current, question_count = [], [], 0
+        for indexes in groups.values():
+            for start in range(0, len(indexes), self.judge_batch_max_answers):
+                chunk = indexes[start:start + self.judge_batch_max_answers]
+                if current and (question_count >= self.judge_batch_questions
+                                or len(current) + len(chunk) > self.judge_batch_max_answers):
+                    calls.append(current)
+                    current, question_count = [], 0
+                current.extend(chunk)
+                question_count += 1
+        if current:
+            calls.append(current)
+        
+        # 只有一个回答的请求没有合并收益，直接逐项评分（可复用逐项评分的缓存）
+        single_indexes.extend(call[0] for call in calls if len(call) == 1)
+        calls = [call for call in calls if len(call) > 1]
+        
+        async def evaluate_single(i: int):
+            item = items[i]
+            results[i] = await self.evaluate_item_with_limits(
+                item["question"], item["answer"], item["ground_truth"], item.get("contexts")
+            )
+        
+        async def evaluate_call(call: List[int]):
+            try:
+                batch_scores, error = await self._judge_batch_with_limits([items[i] for i in call])
+            except Exception as e:
+                # 上游故障时退回逐项评分只会重复失败，整批记为缺失评分
+                print(f"⚠️  批量评分失败 ({len(call)} 个回答): {e}")
+                for i in call:
+                    results[i] = (self._get_missing_single_score(), f"批量评分失败: {e}")
+                return
+            if batch_scores is None:
+                print(f"⚠️  批量评分失败，退回逐项评分 ({len(call)} 个回答): {error}")
+                await asyncio.gather(*(evaluate_single(i) for i in call))
+                return
+            for i, scores in zip(call, batch_scores):
+                results[i] = (await self._complete_batched_scores(items[i], scores), None)
+        
+        await asyncio.gather(
+            *(evaluate_call(call) for call in calls),
+            *(evaluate_single(i) for i in single_indexes)
+        )
+        return results
+    
+    async def _judge_batch_with_limits(self, call_items: List[Dict[str, Any]]) -> Tuple[Optional[List[Dict[str, float]]], Optional[str]]:
+        """在并发限制和超时内执行一次批量评分，失败时返回(None, 错误原因)，上游故障时直接抛出"""
+        # 批量请求的输出更长，按回答数放宽超时
+        timeout = self._current_item_timeout() * len(call_items)
+        
+        with track("judge", self.name):
+            try:
+                # 熔断器在超时之外，与逐项评分相同
+                with guard(self._circuit_breaker_name()) as call:
+                    async with self._limiter.slot():
+                        try:
+                            return await asyncio.wait_for(self._judge_batch(call_items), timeout=timeout), None
+                        except asyncio.TimeoutError:
+                            call.fail("timeout")
+                            report_overload("timeout")
+                            note_response("timeout")
+                            note_error()
+                            return None, f"批量评分超时（{timeout}秒）"
+                        except Exception as e:
+                            if self._is_breaker_failure(e):
+                                call.fail(str(e)[:200])
+                            note_error()
+                            if _is_upstream_failure(e):
+                                raise
+                            return None, str(e)
+            except CircuitOpenError:
+                note_response("circuit_open")
+                raise
+    
+    async def _judge_batch(self, call_items: List[Dict[str, Any]]) -> List[Dict[str, float]]:
+        """发送批量评分请求并解析每个回答的评分"""
+        metrics = self._judged_metrics()
+        prompt = self._build_batch_prompt(call_items, metrics)
+        
+        started = time.perf_counter()
+        logger.debug(f"批量评分请求发送中 ({len(call_items)} 个回答)")
+        result = await self._post_chat_completion(prompt, self.timeout * len(call_items))
+        result_text = result["choices"][0]["message"]["content"].strip()
+        logger.debug(f"批量评分响应接收: {result_text[:100]}")
+        
+        batch_scores = self._parse_batch_scores(result_text, len(call_items), metrics)
+        
+        # 按回答平均分摊耗时和token，写入缓存
+        elapsed = (time.perf_counter() - started) / len(call_items)
+        tokens = ((result.get("usage") or {}).get("total_tokens") or 0) // len(call_items)
+        for item, scores in zip(call_items, batch_scores):
+            self._put_cached_scores(self._batch_cache_key(item), scores, elapsed, {"usage": {"total_tokens": tokens}})
+        
+        return batch_scores
+    
+    def _build_batch_prompt(self, call_items: List[Dict[str, Any]], metrics: List[str]) -> str:
+        """构建批量评分提示词（同一问题的回答归为一组，问题和标准答案只出现一次，上下文随各自的回答给出）"""
+        sections = []
+        grouped: Dict[Tuple[str, str], List[Tuple[int, str, Any]]] = {}
+        for answer_id, item in enumerate(call_items, start=1):
+            grouped.setdefault((item["question"], item["ground_truth"]), []).append(
+                (answer_id, item["answer"], item.get("contexts"))
+            )
+        
+        for question_no, ((question, ground_truth), answers) in enumerate(grouped.items(), start=1):
+            # 上下文的写法与逐项评分的提示词一致，评分模型看到的信息不因批量而变化
+            answer_lines = "\n\n".join(
+                f"[回答 id={answer_id}]\n{answer}\n上下文: {contexts if contexts else '无特定上下文'}"
+                for answer_id, answer, contexts in answers
+            )
+            sections.append(f"### 问题{question_no}\n问题: {question}\n标准答案: {ground_truth}\n\n{answer_lines}")
+        
+        metric_lines = "\n".join(
+            f"{n}. **{metric}**: {self.METRIC_DESCRIPTIONS[metric]}" for n, metric in enumerate(metrics, start=1)
+        )
+        example = ", ".join(f'"{metric}": 分数' for metric in metrics)
+        questions_text = "\n\n".join(sections)
+        
+        return f"""
+请分别评估以下{len(call_items)}个回答的质量。每个回答有唯一的id并附带其上下文，请对照其所属问题的标准答案独立评分。
+
+{questions_text}
+
+请从以下{len(metrics)}个维度评估每个回答，每个维度给出0.0到1.0的分数：
+
+{metric_lines}
+
+请只返回一个JSON数组，每个回答对应一个对象，必须包含全部{len(call_items)}个id：
+[
+  {{"id": 1, {example}}},
+  ...
+]
+"""
+    
+    def _parse_batch_scores(self, result_text: str, count: int, metrics: List[str]) -> List[Dict[str, float]]:
+        """解析批量评分结果，id缺失或格式不正确时抛出异常"""
+        # 推理模型的think内容中可能包含方括号
+        result_text = re.sub(r'<think>.*?</think>', '', result_text, flags=re.DOTALL)
+        
+        json_match = re.search(r'\[.*\]', result_text, re.DOTALL)
+        if not json_match:
+            raise ValueError("批量评分响应中没有JSON数组")
+        
+        entries = json.loads(json_match.group())
+        if not isinstance(entries, list):
+            raise ValueError("批量评分响应不是JSON数组")
+        by_id = {int(entry["id"]): entry for entry in entries if isinstance(entry, dict) and "id" in entry}
+        
+        batch_scores = []
+        for answer_id in range(1, count + 1):
+            if answer_id not in by_id:
+                raise ValueError(f"批量评分响应缺少id={answer_id}")
+            entry = by_id[answer_id]
+            try:
+                batch_scores.append({metric: max(0.0, min(1.0, float(entry[metric]))) for metric in metrics})
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"批量评分响应id={answer_id}的评分无法解析: {e}")
+        
+        return batch_scores
+    
+    async def _complete_batched_scores(self, item: Dict[str, Any], scores: Dict[str, float]) -> Dict[str, float]:
+        """补全批量评分结果（混合模式下相关性由嵌入模型计算）"""
+        if self._uses_embeddings():
+            relevancy = await self._calculate_semantic_similarity(item["answer"], item["ground_truth"])
+            return {"relevancy": relevancy, **scores}
+        return dict(scores)
+    
+    def _judged_metrics(self) -> List[str]:
+        """由聊天模型评估的指标"""
+        if self._uses_embeddings():
+            return ["correctness", "completeness", "clarity", "coherence", "helpfulness"]
+        return ["relevancy", "correctness", "completeness", "clarity", "coherence", "helpfulness"]
+    
+    def _batch_cache_key(self, item: Dict[str, Any]) -> str:
+        """生成批量评分的缓存键（与逐项评分使用不同的模板版本）"""
+        mode = "hybrid" if self._uses_embeddings() else "pure_chat"
+        return self._judge_cache_key(
+            f"{self.BATCH_PROMPT_VERSION}:{mode}", item["question"], item["answer"], item["ground_truth"], item.get("contexts")
+        )
+    
+    async def _precompute_similarities(self, items: List[Dict[str, Any]]) -> List[Optional[float]]:
+        """
+        批量计算回答-标准答案和回答-上下文的余弦相似度
+        
+        所有系统的回答、去重后的标准答案和上下文片段的向量分别堆叠为float32矩阵，
+        在一次向量化运算中得到全部分数。回答-标准答案的结果写入_similarity_cache，
+        供_calculate_semantic_similarity直接使用。
+        
+        Args:
+            items: 评价项列表
             
-            if isinstance(quality_scores, Exception):
-                print(f"质量评估失败: {quality_scores}")
-                quality_scores = self._get_default_quality_scores()
+        Returns:
+            每项的回答-上下文最大相似度（无上下文或空回答时为None）
+        """
+        context_scores: List[Optional[float]] = [None] * len(items)
+        
+        answered = [i for i, item in enumerate(items) if item["answer"] and item["answer"].strip()]
+        context_texts = {i: self._context_texts(items[i].get("contexts")) for i in answered}
+        
+        texts = list(dict.fromkeys(
+            [items[i]["answer"] for i in answered]
+            + [items[i]["ground_truth"] for i in answered]
+            + [text for i in answered for text in context_texts[i]]
+        ))
+        if not texts:
+            return context_scores
+        
+        vectors = dict(zip(texts, await self._get_embeddings_many(texts)))
+        
+        # 只保留回答和标准答案向量都可用且维度一致的项
+        usable = [
+            i for i in answered
+            if vectors.get(items[i]["answer"]) is not None
+            and vectors.get(items[i]["ground_truth"]) is not None
+            and len(vectors[items[i]["answer"]]) == len(vectors[items[i]["ground_truth"]])
+        ]
+        if not usable:
+            return context_scores
+        
+        dim = len(vectors[items[usable[0]]["answer"]])
+        usable = [i for i in usable if len(vectors[items[i]["answer"]]) == dim]
+        
+        answer_matrix = as_matrix([vectors[items[i]["answer"]] for i in usable])
+        
+        # 同一问题的多个系统回答共享一行标准答案向量
+        ground_truth_rows = {}
+        reference_index = np.array(
+            [ground_truth_rows.setdefault(items[i]["ground_truth"], len(ground_truth_rows)) for i in usable],
+            dtype=np.int64
+        )
+        reference_matrix = as_matrix([vectors[text] for text in ground_truth_rows])
+        
+        relevancy = cosine_to_references(answer_matrix, reference_matrix, reference_index)
+        for row, i in enumerate(usable):
+            self._similarity_cache[(items[i]["answer"], items[i]["ground_truth"])] = float(relevancy[row])
+        
+        # 回答与各自上下文片段的最大相似度
+        context_vectors, owner = [], []
+        for row, i in enumerate(usable):
+            for text in context_texts[i]:
+                vector = vectors.get(text)
+                if vector is not None and len(vector) == dim:
+                    context_vectors.append(vector)
+                    owner.append(row)
+        
+        if context_vectors:
+            best = max_cosine_by_owner(answer_matrix, as_matrix(context_vectors), np.array(owner, dtype=np.int64))
+            for row, i in enumerate(usable):
+                if not np.isnan(best[row]):
+                    context_scores[i] = float(best[row])
+        
+        return context_scores
+    
+    async def _get_embeddings_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """批量获取嵌入向量（先查向量存储，未命中的合并请求），失败的位置为None"""
+        model = self.embedding_config["model"]
+        vectors = self.embedding_store.get_many(model, texts) if self.embedding_store is not None else [None] * len(texts)
+        
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fetched = await asyncio.gather(
+                *(self._fetch_embedding(texts[i]) for i in missing), return_exceptions=True
+            )
             
-            # 合并结果
-            return {
-                "relevancy": relevancy_score,
-                **quality_scores
-            }
+            computed_texts, computed_vectors = [], []
+            for i, vector in zip(missing, fetched):
+                if isinstance(vector, Exception) or len(vector) == 0:
+                    print(f"❌ 嵌入向量获取失败: {vector if isinstance(vector, Exception) else '空向量'}")
+                    continue
+                vectors[i] = vector
+                computed_texts.append(texts[i])
+                computed_vectors.append(vector)
             
-        except Exception as e:
-            print(f"混合评估错误: {e}")
-            return self._get_enhanced_default_scores()
+            if self.embedding_store is not None and computed_texts:
+                self.embedding_store.put_many(model, computed_texts, computed_vectors)
+        
+        return vectors
+    
+    @staticmethod
+    def _context_texts(contexts: Optional[List[Any]]) -> List[str]:
+        """提取上下文片段文本（RagFlow的chunks为字典）"""
+        texts = []
+        for context in contexts or []:
+            if isinstance(context, dict):
+                context = context.get("content") or context.get("content_with_weight") or ""
+            if isinstance(context, str) and context.strip():
+                texts.append(context)
+        return texts
+    
+    def _uses_embeddings(self) -> bool:
+        """是否使用嵌入模型计算相关性（混合模式）"""
+        return self.evaluation_mode == "hybrid" and bool(self.embedding_config["api_key"])
+    
+    async def evaluate_single_answer_async(self, question: str, answer: str, 
+                                         ground_truth: str, context: List[str] = None) -> Dict[str, float]:
+        """异步评估单个回答 - 支持多种评估模式和质量指标"""
+        
+        # 为空回答返回默认结果
+        if not answer or not answer.strip():
+            return await self._get_default_result()
+        
+        # 评分请求失败时直接抛出，由evaluate_item_with_limits记为缺失评分和错误原因
+        if self._uses_embeddings():
+            # 混合模式：使用嵌入模型计算相关性，聊天模型计算质量指标
+            return await self._evaluate_hybrid_mode(question, answer, ground_truth, context)
+        else:
+            # 纯聊天模式：使用聊天模型评估所有指标
+            return await self._evaluate_pure_chat_mode(question, answer, ground_truth, context)
+    
+    async def _evaluate_hybrid_mode(self, question: str, answer: str, ground_truth: str, context: List[str] = None) -> Dict[str, float]:
+        """混合模式评估：嵌入模型 + 聊天模型（任一评估失败时抛出异常）"""
+        
+        # 并发执行两种评估（语义相似度在嵌入模型不可用时已退回文本相似度）
+        relevancy_score, quality_scores = await asyncio.gather(
+            self._calculate_semantic_similarity(answer, ground_truth),
+            self._assess_enhanced_quality_with_chat_model(question, answer, ground_truth, context)
+        )
+        
+        # 合并结果
+        return {
+            "relevancy": relevancy_score,
+            **quality_scores
+        }
     
     async def _evaluate_pure_chat_mode(self, question: str, answer: str, ground_truth: str, context: List[str] = None) -> Dict[str, float]:
         """纯聊天模式评估：使用聊天模型评估所有指标"""
@@ -176,121 +553,79 @@ class AsyncAcademicEvaluator(AsyncBaseEvaluator):
 - 0.0-0.4: 很差 (Very Poor)
 """
         
-        try:
-            # 使用异步HTTP请求
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                headers = {
-                    "Authorization": f"Bearer {self.config.get('chat_api_key', self.config.get('api_key'))}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": self.config.get("chat_model", self.config.get("model", "gpt-3.5-turbo")),
-                    "messages": [
-                        {"role": "user", "content": enhanced_prompt}
-                    ],
-                    "temperature": 0
-                }
-                
-                print(f"🔍 增强异步评估请求发送中...")
-                async with session.post(
-                    f"{self.config.get('chat_base_url', self.config.get('base_url')).rstrip('/')}/chat/completions",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        result_text = result["choices"][0]["message"]["content"].strip()
-                        print(f"🔍 增强异步评估响应接收: {result_text[:100]}...")
-                        
-                        # 解析增强评分
-                        return self._parse_enhanced_scores(result_text)
-                    else:
-                        error_text = await response.text()
-                        print(f"❌ API请求失败: {response.status} - {error_text}")
-                        return self._get_enhanced_default_scores()
-                        
-        except Exception as e:
-            print(f"纯聊天模式评估错误: {e}")
-            return self._get_enhanced_default_scores()
+        cache_key = self._judge_cache_key(self.PURE_CHAT_PROMPT_VERSION, question, answer, ground_truth, context)
+        cached_scores = self._get_cached_scores(cache_key)
+        if cached_scores is not None:
+            return cached_scores
+        
+        started = time.perf_counter()
+        print(f"🔍 增强异步评估请求发送中...")
+        result = await self._post_chat_completion(enhanced_prompt, self.timeout)
+        result_text = result["choices"][0]["message"]["content"].strip()
+        print(f"🔍 增强异步评估响应接收: {result_text[:100]}...")
+        
+        # 解析增强评分
+        scores = self._parse_enhanced_scores(result_text)
+        self._put_cached_scores(cache_key, scores, time.perf_counter() - started, result)
+        return scores
     
     async def _calculate_semantic_similarity(self, answer: str, ground_truth: str) -> float:
         """使用嵌入模型计算语义相似度（混合模式用）"""
         
+        # 优先使用批量预计算的结果
+        precomputed = self._similarity_cache.get((answer, ground_truth))
+        if precomputed is not None:
+            return precomputed
+        
         try:
-            # 并发获取两个文本的嵌入向量
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-                headers = {
-                    "Authorization": f"Bearer {self.embedding_config['api_key']}",
-                    "Content-Type": "application/json"
-                }
-                
-                # 获取回答的嵌入向量
-                answer_payload = {
-                    "model": self.embedding_config["model"],
-                    "prompt": answer
-                }
-                
-                # 获取标准答案的嵌入向量
-                ground_truth_payload = {
-                    "model": self.embedding_config["model"],
-                    "prompt": ground_truth
-                }
-                
-                # 并发请求两个嵌入向量
-                answer_task = session.post(
-                    f"{self.embedding_config['base_url'].rstrip('/')}/api/embeddings",
-                    headers=headers,
-                    json=answer_payload
-                )
-                
-                ground_truth_task = session.post(
-                    f"{self.embedding_config['base_url'].rstrip('/')}/api/embeddings",
-                    headers=headers,
-                    json=ground_truth_payload
-                )
-                
-                answer_response, ground_truth_response = await asyncio.gather(
-                    answer_task, ground_truth_task, return_exceptions=True
-                )
-                
-                # 处理回答嵌入向量
-                if isinstance(answer_response, Exception):
-                    print(f"❌ 回答嵌入向量获取失败: {answer_response}")
-                    return self._calculate_text_similarity(answer, ground_truth)
-                
-                if answer_response.status != 200:
-                    print(f"❌ 回答嵌入向量请求失败: {answer_response.status}")
-                    return self._calculate_text_similarity(answer, ground_truth)
-                
-                answer_result = await answer_response.json()
-                answer_embedding = answer_result.get("embedding", [])
-                
-                # 处理标准答案嵌入向量
-                if isinstance(ground_truth_response, Exception):
-                    print(f"❌ 标准答案嵌入向量获取失败: {ground_truth_response}")
-                    return self._calculate_text_similarity(answer, ground_truth)
-                
-                if ground_truth_response.status != 200:
-                    print(f"❌ 标准答案嵌入向量请求失败: {ground_truth_response.status}")
-                    return self._calculate_text_similarity(answer, ground_truth)
-                
-                ground_truth_result = await ground_truth_response.json()
-                ground_truth_embedding = ground_truth_result.get("embedding", [])
-                
-                # 计算余弦相似度
-                if len(answer_embedding) > 0 and len(ground_truth_embedding) > 0:
-                    similarity = self._calculate_cosine_similarity(answer_embedding, ground_truth_embedding)
-                    print(f"🔍 嵌入向量语义相似度: {similarity}")
-                    return similarity
-                else:
-                    print(f"❌ 嵌入向量为空")
-                    return self._calculate_text_similarity(answer, ground_truth)
+            # 并发获取两个文本的嵌入向量（优先读取向量存储）
+            answer_embedding, ground_truth_embedding = await asyncio.gather(
+                self._get_embedding(answer),
+                self._get_embedding(ground_truth),
+                return_exceptions=True
+            )
+            
+            # 处理回答嵌入向量
+            if isinstance(answer_embedding, Exception):
+                print(f"❌ 回答嵌入向量获取失败: {answer_embedding}")
+                return self._calculate_text_similarity(answer, ground_truth)
+            
+            # 处理标准答案嵌入向量
+            if isinstance(ground_truth_embedding, Exception):
+                print(f"❌ 标准答案嵌入向量获取失败: {ground_truth_embedding}")
+                return self._calculate_text_similarity(answer, ground_truth)
+            
+            # 计算余弦相似度
+            if len(answer_embedding) > 0 and len(ground_truth_embedding) > 0:
+                similarity = self._calculate_cosine_similarity(answer_embedding, ground_truth_embedding)
+                print(f"🔍 嵌入向量语义相似度: {similarity}")
+                return similarity
+            else:
+                print(f"❌ 嵌入向量为空")
+                return self._calculate_text_similarity(answer, ground_truth)
                         
         except Exception as e:
             print(f"嵌入模型调用失败: {e}")
             return self._calculate_text_similarity(answer, ground_truth)
     
+    async def _get_embedding(self, text: str) -> List[float]:
+        """获取文本的嵌入向量，优先读取向量存储，未命中时请求嵌入模型并写回"""
+        if self.embedding_store is not None:
+            cached = self.embedding_store.get(self.embedding_config["model"], text)
+            if cached is not None:
+                return cached
+        
+        embedding = await self._fetch_embedding(text)
+        
+        if self.embedding_store is not None and len(embedding) > 0:
+            self.embedding_store.put(self.embedding_config["model"], text, embedding)
+        
+        return embedding
+    
+    async def _fetch_embedding(self, text: str) -> List[float]:
+        """请求单个文本的嵌入向量（与其他并发评估的请求合并为批量请求）"""
+        return await self.embedding_batcher.embed(text)
+    
     async def _assess_enhanced_quality_with_chat_model(self, question: str, answer: str, ground_truth: str, context: List[str] = None) -> Dict[str, float]:
         """使用聊天模型进行增强质量评估（混合模式用）"""
         
@@ -320,119 +655,210 @@ class AsyncAcademicEvaluator(AsyncBaseEvaluator):
 }}
 """
         
+        cache_key = self._judge_cache_key(self.QUALITY_PROMPT_VERSION, question, answer, ground_truth, context)
+        cached_scores = self._get_cached_scores(cache_key)
+        if cached_scores is not None:
+            return cached_scores
+        
+        started = time.perf_counter()
+        result = await self._post_chat_completion(quality_prompt, 45)
+        result_text = result["choices"][0]["message"]["content"].strip()
+        print(f"🔍 质量评估响应: {result_text[:100]}...")
+        
+        scores = self._parse_quality_scores(result_text)
+        self._put_cached_scores(cache_key, scores, time.perf_counter() - started, result)
+        return scores
+    
+    async def _post_chat_completion(self, prompt: str, timeout: float) -> Dict[str, Any]:
+        """
+        发送聊天补全请求（共享连接池）
+        
+        发送前从该模型的令牌桶获取配额（按提示词估计token数，收到响应后按实际用量修正）；
+        429时按Retry-After暂停该模型的所有请求并带抖动重试。熔断由调用方在单项超时之外处理
+        （evaluate_item_with_limits、_judge_batch_with_limits），超时、连接错误和5xx计为失败。
+        
+        Args:
+            prompt: 用户提示词
+            timeout: 请求超时时间（秒）
+            
+        Returns:
+            聊天补全响应JSON，非200响应时抛出异常
+        """
+        url = f"{self.config.get('chat_base_url', self.config.get('base_url')).rstrip('/')}/chat/completions"
+        session = get_session_manager().get_session(url)
+        
+        headers = {
+            "Authorization": f"Bearer {self.config.get('chat_api_key', self.config.get('api_key'))}",
+            "Content-Type": "application/json"
+        }
+        
+        model = self.config.get("chat_model", self.config.get("model", "gpt-3.5-turbo"))
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0
+        }
+        
+        bucket = get_rate_limiter(f"chat:{model}")
+        estimated_tokens = estimate_tokens(prompt)
+        request_body = json.dumps(payload).encode("utf-8")
+        
+        async def send() -> Dict[str, Any]:
+            await bucket.acquire(estimated_tokens)
+            async with session.post(
+                url,
+                headers=headers,
+                data=request_body,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                raw = await response.read()
+                note_response(response.status, len(request_body), len(raw))
+                if response.status == 429:
+                    note_http_status(response.status)
+                    retry_after = bucket.on_rate_limited(response.headers)
+                    error_text = raw.decode("utf-8", errors="replace")
+                    raise RateLimitError(f"聊天模型请求失败: 429 - {error_text}", retry_after)
+                if response.status != 200:
+                    note_http_status(response.status)
+                    error_text = raw.decode("utf-8", errors="replace")
+                    raise ChatCompletionError(f"聊天模型请求失败: {response.status} - {error_text}", response.status)
+                result = json.loads(raw)
+            
+            total_tokens = (result.get("usage") or {}).get("total_tokens")
+            if total_tokens:
+                bucket.record_usage(total_tokens, estimated_tokens)
+            return result
+        
+        return await AsyncUtils().retry_async(send, exceptions=(RateLimitError,))
+    
+    def _circuit_breaker_name(self) -> Optional[str]:
+        """评分请求所用聊天模型的熔断器"""
+        return f"chat:{self.config.get('chat_model', self.config.get('model', 'gpt-3.5-turbo'))}"
+    
+    def _is_breaker_failure(self, error: Exception) -> bool:
+        """超时、连接错误和聊天模型的5xx响应计为上游故障"""
+        return super()._is_breaker_failure(error) or (isinstance(error, ChatCompletionError) and error.status >= 500)
+    
+    def _judge_cache_key(self, template_version: str, question: str, answer: str,
+                         ground_truth: str, context: List[str] = None) -> str:
+        """生成评分缓存键"""
+        return JudgeCache.make_key(
+            self.config.get("chat_model", self.config.get("model", "gpt-3.5-turbo")),
+            template_version,
+            question=question,
+            answer=answer,
+            ground_truth=ground_truth,
+            context=context
+        )
+    
+    def _get_cached_scores(self, cache_key: str) -> Optional[Dict[str, float]]:
+        """读取缓存的评分"""
+        if self.judge_cache is None:
+            return None
+        
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=45)) as session:
-                headers = {
-                    "Authorization": f"Bearer {self.config.get('chat_api_key', self.config.get('api_key'))}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": self.config.get("chat_model", self.config.get("model", "gpt-3.5-turbo")),
-                    "messages": [
-                        {"role": "user", "content": quality_prompt}
-                    ],
-                    "temperature": 0
-                }
-                
-                async with session.post(
-                    f"{self.config.get('chat_base_url', self.config.get('base_url')).rstrip('/')}/chat/completions",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        result_text = result["choices"][0]["message"]["content"].strip()
-                        print(f"🔍 质量评估响应: {result_text[:100]}...")
-                        
-                        return self._parse_quality_scores(result_text)
-                    else:
-                        error_text = await response.text()
-                        print(f"❌ 聊天模型请求失败: {response.status} - {error_text}")
-                        return self._get_default_quality_scores()
-                        
+            return self.judge_cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"评分缓存读取失败: {e}")
+            return None
+    
+    def _put_cached_scores(self, cache_key: str, scores: Dict[str, float], latency: float, response: Dict[str, Any]):
+        """写入评分缓存（只缓存成功的评分）"""
+        if self.judge_cache is None:
+            return
+        
+        try:
+            tokens = (response.get("usage") or {}).get("total_tokens", 0)
+            self.judge_cache.put(cache_key, scores, latency=latency, tokens=tokens or 0)
+        except Exception as e:
+            logger.warning(f"评分缓存写入失败: {e}")
+    
+    def get_fingerprint_config(self) -> Dict[str, Any]:
+        """获取影响评分结果的配置（包含提示词版本和实际生效的评估模式）"""
+        return {
+            **super().get_fingerprint_config(),
+            "uses_embeddings": self._uses_embeddings(),
+            "prompt_versions": [self.PURE_CHAT_PROMPT_VERSION, self.QUALITY_PROMPT_VERSION, self.BATCH_PROMPT_VERSION]
+        }
+    
+    def get_run_stats(self) -> Dict[str, Any]:
+        """获取运行统计（评分缓存、向量存储和批量嵌入情况）"""
+        stats = {}
+        if self.judge_cache is not None:
+            stats["judge_cache"] = self.judge_cache.get_stats()
+        if self.embedding_store is not None:
+            stats["embedding_store"] = self.embedding_store.get_stats()
+        if self.embedding_batcher is not None:
+            stats["embedding_client"] = self.embedding_batcher.get_stats()
+        return stats
+    
+    def close(self):
+        """关闭评分缓存：写入积累的访问时间并执行淘汰"""
+        if self.judge_cache is None:
+            return
+        
+        try:
+            self.judge_cache.close()
         except Exception as e:
-            print(f"聊天模型质量评估失败: {e}")
-            return self._get_default_quality_scores()
+            logger.warning(f"评分缓存关闭失败: {e}")
+        self.judge_cache = None
     
     def _parse_scores(self, result_text: str) -> Dict[str, float]:
         """解析基本评分结果（向后兼容）"""
         return self._parse_enhanced_scores(result_text)
     
     def _parse_enhanced_scores(self, result_text: str) -> Dict[str, float]:
-        """解析增强评分结果"""
-        scores = {
-            "relevancy": 0.0, "correctness": 0.0, "completeness": 0.0, 
-            "clarity": 0.0, "coherence": 0.0, "helpfulness": 0.0
-        }
-        
-        # 方法1: JSON形式を探す
-        json_match = re.search(r'\{[^}]*"relevancy"[^}]*\}', result_text, re.DOTALL)
-        if json_match:
-            try:
-                scores_dict = json.loads(json_match.group())
-                for metric in ["relevancy", "correctness", "completeness", "clarity", "coherence", "helpfulness"]:
-                    score = scores_dict.get(metric, 0.0)
-                    scores[metric] = max(0.0, min(1.0, float(score)))
-                return scores
-            except:
-                pass
-        
-        # 方法2: テキストからスコアを抽出
-        patterns = {
-            "relevancy": r"relevancy[^0-9]*([0-9.]+)",
-            "correctness": r"correctness[^0-9]*([0-9.]+)", 
-            "completeness": r"completeness[^0-9]*([0-9.]+)",
-            "clarity": r"clarity[^0-9]*([0-9.]+)",
-            "coherence": r"coherence[^0-9]*([0-9.]+)",
-            "helpfulness": r"helpfulness[^0-9]*([0-9.]+)"
-        }
-        
-        for metric, pattern in patterns.items():
-            match = re.search(pattern, result_text, re.IGNORECASE)
-            if match:
-                try:
-                    scores[metric] = max(0.0, min(1.0, float(match.group(1))))
-                except:
-                    scores[metric] = 0.5
-        
+        """解析增强评分结果，无法解析出全部指标时抛出ValueError"""
+        scores = self._parse_metric_scores(
+            result_text, ["relevancy", "correctness", "completeness", "clarity", "coherence", "helpfulness"]
+        )
         print(f"解析的增强评分: {scores}")
         return scores
     
     def _parse_quality_scores(self, result_text: str) -> Dict[str, float]:
-        """解析质量评分结果（混合模式用）"""
-        scores = {"correctness": 0.0, "completeness": 0.0, "clarity": 0.0, "coherence": 0.0, "helpfulness": 0.0}
+        """解析质量评分结果（混合模式用），无法解析出全部指标时抛出ValueError"""
+        scores = self._parse_metric_scores(
+            result_text, ["correctness", "completeness", "clarity", "coherence", "helpfulness"]
+        )
+        print(f"解析的质量评分: {scores}")
+        return scores
+    
+    def _parse_metric_scores(self, result_text: str, metrics: List[str]) -> Dict[str, float]:
+        """
+        从聊天模型的响应中解析各指标分数
         
+        优先解析JSON对象，失败时逐个指标从文本中提取。任一指标缺失或无法转换为数值时抛出ValueError，
+        不用默认分数补齐（解析失败的评分不写入缓存，由调用方记为缺失评分）。
+        
+        Args:
+            result_text: 响应文本
+            metrics: 需要的指标
+            
+        Returns:
+            指标 -> 0.0到1.0的分数
+        """
         # 方法1: JSON形式を探す
-        json_match = re.search(r'\{[^}]*"correctness"[^}]*\}', result_text, re.DOTALL)
+        json_match = re.search(r'\{[^}]*"' + metrics[0] + r'"[^}]*\}', result_text, re.DOTALL)
         if json_match:
             try:
                 scores_dict = json.loads(json_match.group())
-                for metric in ["correctness", "completeness", "clarity", "coherence", "helpfulness"]:
-                    score = scores_dict.get(metric, 0.0)
-                    scores[metric] = max(0.0, min(1.0, float(score)))
-                return scores
-            except:
+                return {metric: max(0.0, min(1.0, float(scores_dict[metric]))) for metric in metrics}
+            except (ValueError, KeyError, TypeError):
                 pass
         
         # 方法2: テキストからスコアを抽出
-        patterns = {
-            "correctness": r"correctness[^0-9]*([0-9.]+)",
-            "completeness": r"completeness[^0-9]*([0-9.]+)",
-            "clarity": r"clarity[^0-9]*([0-9.]+)",
-            "coherence": r"coherence[^0-9]*([0-9.]+)",
-            "helpfulness": r"helpfulness[^0-9]*([0-9.]+)"
-        }
-        
-        for metric, pattern in patterns.items():
-            match = re.search(pattern, result_text, re.IGNORECASE)
-            if match:
-                try:
-                    scores[metric] = max(0.0, min(1.0, float(match.group(1))))
-                except:
-                    scores[metric] = 0.5
+        scores = {}
+        for metric in metrics:
+            match = re.search(metric + r"[^0-9]*([0-9.]+)", result_text, re.IGNORECASE)
+            if not match:
+                raise ValueError(f"评分响应中缺少{metric}: {result_text[:100]}")
+            try:
+                scores[metric] = max(0.0, min(1.0, float(match.group(1))))
+            except ValueError:
+                raise ValueError(f"评分响应中{metric}不是数值: {match.group(1)}")
         
-        print(f"解析的质量评分: {scores}")
         return scores
     
     async def _get_default_result(self) -> Dict[str, float]:
@@ -449,27 +875,12 @@ class AsyncAcademicEvaluator(AsyncBaseEvaluator):
     def _calculate_cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """计算余弦相似度"""
         try:
-            import math
-            
             if len(vec1) != len(vec2):
                 print(f"❌ 向量维度不匹配: {len(vec1)} vs {len(vec2)}")
                 return 0.0
             
-            # 计算点积
-            dot_product = sum(a * b for a, b in zip(vec1, vec2))
-            
-            # 计算向量长度
-            magnitude1 = math.sqrt(sum(a * a for a in vec1))
-            magnitude2 = math.sqrt(sum(b * b for b in vec2))
-            
-            if magnitude1 == 0 or magnitude2 == 0:
-                return 0.0
-            
-            # 计算余弦相似度
-            cosine_similarity = dot_product / (magnitude1 * magnitude2)
-            
             # 确保结果在[0, 1]范围内
-            return max(0.0, min(1.0, cosine_similarity))
+            return float(cosine_matrix(as_matrix([vec1]), as_matrix([vec2]))[0, 0])
             
         except Exception as e:
             print(f"余弦相似度计算失败: {e}")
@@ -500,15 +911,11 @@ class AsyncAcademicEvaluator(AsyncBaseEvaluator):
             print(f"文本相似度计算失败: {e}")
             return 0.0
     
-    def _get_default_quality_scores(self) -> Dict[str, float]:
-        """获取默认质量评分"""
-        return {"correctness": 0.0, "completeness": 0.0, "clarity": 0.0, "coherence": 0.0, "helpfulness": 0.0}
-    
     def get_supported_metrics(self) -> List[str]:
         """获取支持的评价指标"""
         # 根据评估模式返回不同的指标
         if self.evaluation_mode == "hybrid":
-            return ["relevancy", "correctness", "completeness", "clarity", "coherence", "helpfulness"]
+            return ["relevancy", "correctness", "completeness", "clarity", "coherence", "helpfulness", "context_similarity"]
         else:
             return ["relevancy", "correctness", "completeness", "clarity", "coherence", "helpfulness"]
     
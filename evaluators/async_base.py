@@ -1,12 +1,23 @@
 # 异步评价器基类 - 为评价系统提供异步接口
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from contextvars import ContextVar
+from typing import Dict, List, Any, Optional, Tuple
 import asyncio
 import logging
 
+from utils.adaptive_limiter import get_limiter, report_overload
+from utils.circuit_breaker import FAILURE_EXCEPTIONS, CircuitOpenError, guard
+from utils.telemetry import note_error, note_response, track
+
 logger = logging.getLogger(__name__)
 
+# 评价结果中记录单项错误原因的键（与指标列表并列，不计入统计）
+ERROR_KEY = "_errors"
+
+# evaluate_with_timeout传入的单项超时覆盖值
+_item_timeout_override: ContextVar[Optional[float]] = ContextVar("item_timeout_override", default=None)
+
 class AsyncBaseEvaluator(ABC):
     """异步评价器基类"""
     
@@ -21,6 +32,11 @@ class AsyncBaseEvaluator(ABC):
         self.name = name
         self.config = config
         self.timeout = config.get('timeout', 45)
+        # 单个评价器的最大并发数和单项超时
+        self.max_concurrency = max(1, int(config.get('max_concurrency', 3)))
+        self.item_timeout = config.get('item_timeout', self.timeout)
+        # 评分模型的自适应并发限制器（初始值为max_concurrency，429/5xx/超时时降低）
+        self._limiter = get_limiter(f"judge:{name}", self.max_concurrency)
         self._available = False
         
         logger.info(f"Async evaluator initialized: {name}")
@@ -65,33 +81,171 @@ class AsyncBaseEvaluator(ABC):
         """
         带超时的异步评价
         
+        超时按单项计算：超时的项目记为None并在ERROR_KEY中记录原因，已完成的项目保留评分。
+        
         Args:
             questions: 问题列表
             answers: 回答列表
             ground_truths: 标准答案列表
             contexts: 上下文列表（可选）
-            timeout: 超时时间（秒）
+            timeout: 单项超时时间（秒），默认使用item_timeout
             
         Returns:
             评价指标字典
         """
-        timeout = timeout or self.timeout
+        token = _item_timeout_override.set(timeout)
         
         try:
-            result = await asyncio.wait_for(
-                self.evaluate_answers_async(questions, answers, ground_truths, contexts),
-                timeout=timeout
-            )
-            return result
-        except asyncio.TimeoutError:
-            error_msg = f"评价超时（{timeout}秒）"
-            logger.warning(f"{self.name} {error_msg}")
-            # 返回默认值
-            return self._get_default_scores(len(answers))
+            return await self.evaluate_answers_async(questions, answers, ground_truths, contexts)
         except Exception as e:
             error_msg = f"评价失败: {str(e)}"
             logger.error(f"{self.name} {error_msg}")
-            return self._get_default_scores(len(answers))
+            return self._get_failed_scores(len(answers), error_msg)
+        finally:
+            _item_timeout_override.reset(token)
+    
+    async def evaluate_item_with_limits(self, question: str, answer: str, ground_truth: str,
+                                        context: List[str] = None) -> Tuple[Dict[str, Optional[float]], Optional[str]]:
+        """
+        在并发限制和单项超时内评价单个回答
+        
+        Args:
+            question: 问题
+            answer: 回答
+            ground_truth: 标准答案
+            context: 上下文（可选）
+            
+        Returns:
+            (评价指标字典, 错误原因)，成功时错误原因为None
+        """
+        timeout = self._current_item_timeout()
+        
+        # 等待并发槽位的时间不计入单项超时（但计入遥测的排队时间）
+        with track("judge", self.name):
+            try:
+                # 熔断器在单项超时之外，超时取消的请求也能计为评分上游的失败
+                with guard(self._circuit_breaker_name()) as call:
+                    async with self._limiter.slot():
+                        try:
+                            scores = await asyncio.wait_for(
+                                self.evaluate_single_answer_async(question, answer, ground_truth, context),
+                                timeout=timeout
+                            )
+                            return scores, None
+                        except asyncio.TimeoutError:
+                            call.fail("timeout")
+                            report_overload("timeout")
+                            note_response("timeout")
+                            note_error()
+                            error_msg = f"单个评价超时（{timeout}秒）"
+                            logger.warning(f"{self.name} {error_msg}")
+                            return self._get_missing_single_score(), error_msg
+                        except Exception as e:
+                            if self._is_breaker_failure(e):
+                                call.fail(str(e)[:200])
+                            note_error()
+                            error_msg = f"单个评价失败: {str(e)}"
+                            logger.error(f"{self.name} {error_msg}")
+                            return self._get_missing_single_score(), error_msg
+            except CircuitOpenError as e:
+                note_response("circuit_open")
+                note_error()
+                error_msg = f"单个评价失败: {str(e)}"
+                logger.error(f"{self.name} {error_msg}")
+                return self._get_missing_single_score(), error_msg
+    
+    def _circuit_breaker_name(self) -> Optional[str]:
+        """
+        评分上游的熔断器名称，单项超时和上游故障计入该熔断器
+        
+        Returns:
+            熔断器名称，None表示不使用熔断
+        """
+        return None
+    
+    def _is_breaker_failure(self, error: Exception) -> bool:
+        """
+        单项评价抛出的异常是否计为评分上游的故障（默认为超时、连接错误等）
+        
+        Args:
+            error: 评价时抛出的异常
+            
+        Returns:
+            是否计入熔断
+        """
+        return isinstance(error, FAILURE_EXCEPTIONS)
+    
+    def _current_item_timeout(self) -> float:
+        """当前生效的单项超时（evaluate_with_timeout传入的值优先）"""
+        return _item_timeout_override.get() or self.item_timeout
+    
+    async def evaluate_items_async(self, items: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Optional[float]], Optional[str]]]:
+        """
+        在并发限制内逐项评价（评价项可以来自不同的RAG系统和问题）
+        
+        Args:
+            items: 评价项列表，每项包含question、answer、ground_truth和可选的contexts
+            
+        Returns:
+            与输入顺序一致的(评价指标字典, 错误原因)列表
+        """
+        # 信号量限制实际在途的评价数量
+        return list(await asyncio.gather(*(
+            self.evaluate_item_with_limits(item["question"], item["answer"], item["ground_truth"], item.get("contexts"))
+            for item in items
+        )))
+    
+    async def _evaluate_items_bounded(self, questions: List[str], answers: List[str],
+                                      ground_truths: List[str], contexts: List[List[str]] = None,
+                                      metrics: Optional[List[str]] = None) -> Dict[str, List[Optional[float]]]:
+        """
+        以有界并发逐项评价并汇总为指标列表
+        
+        Args:
+            questions: 问题列表
+            answers: 回答列表
+            ground_truths: 标准答案列表
+            contexts: 上下文列表（可选）
+            metrics: 要汇总的指标，默认使用get_supported_metrics()
+            
+        Returns:
+            评价指标字典，附带ERROR_KEY错误原因列表
+        """
+        items = [
+            {
+                "question": question,
+                "answer": answer,
+                "ground_truth": ground_truth,
+                "contexts": contexts[i] if contexts and i < len(contexts) else None
+            }
+            for i, (question, answer, ground_truth) in enumerate(zip(questions, answers, ground_truths))
+        ]
+        
+        results = await self.evaluate_items_async(items)
+        return self.collect_metric_lists(results, metrics)
+    
+    def collect_metric_lists(self, results: List[Tuple[Dict[str, Optional[float]], Optional[str]]],
+                             metrics: Optional[List[str]] = None) -> Dict[str, List[Optional[float]]]:
+        """
+        把逐项评价结果汇总为 {指标: [分数]} 形式
+        
+        Args:
+            results: (评价指标字典, 错误原因)列表
+            metrics: 要汇总的指标，默认使用get_supported_metrics()
+            
+        Returns:
+            评价指标字典，附带ERROR_KEY错误原因列表
+        """
+        metrics = metrics or self.get_supported_metrics()
+        
+        collected = {metric: [] for metric in metrics}
+        collected[ERROR_KEY] = []
+        for scores, error in results:
+            for metric in metrics:
+                collected[metric].append(scores.get(metric))
+            collected[ERROR_KEY].append(error)
+        
+        return collected
     
     async def evaluate_single_with_timeout(self, question: str, answer: str, 
                                          ground_truth: str, context: List[str] = None,
@@ -149,6 +303,30 @@ class AsyncBaseEvaluator(ABC):
         metrics = self.get_supported_metrics()
         return {metric: 0.0 for metric in metrics}
     
+    def _get_failed_scores(self, count: int, reason: str) -> Dict[str, List[Optional[float]]]:
+        """
+        获取整体失败时的评分（指标记为None并附带错误原因）
+        
+        Args:
+            count: 评分数量
+            reason: 错误原因
+            
+        Returns:
+            失败评分字典
+        """
+        failed = {metric: [None] * count for metric in self.get_supported_metrics()}
+        failed[ERROR_KEY] = [reason] * count
+        return failed
+    
+    def _get_missing_single_score(self) -> Dict[str, Optional[float]]:
+        """
+        获取缺失的单个评分（超时或失败的项目）
+        
+        Returns:
+            所有指标为None的评分字典
+        """
+        return {metric: None for metric in self.get_supported_metrics()}
+    
     @abstractmethod
     def get_supported_metrics(self) -> List[str]:
         """
@@ -159,6 +337,42 @@ class AsyncBaseEvaluator(ABC):
         """
         pass
     
+    def get_run_stats(self) -> Dict[str, Any]:
+        """
+        获取本次运行的统计信息（缓存命中等），写入结果摘要
+        
+        Returns:
+            统计信息字典
+        """
+        return {}
+    
+    def close(self):
+        """
+        释放评价器持有的资源（评分缓存连接等），运行结束时调用
+        """
+        pass
+    
+    # 不影响评分结果的配置项（密钥、缓存、并发和超时）
+    FINGERPRINT_EXCLUDED_KEYS = (
+        "judge_cache", "embedding_cache", "max_concurrency", "item_timeout", "timeout",
+        "embedding_batch_size", "embedding_batch_interval"
+    )
+    
+    def get_fingerprint_config(self) -> Dict[str, Any]:
+        """
+        获取影响评分结果的配置（用于增量评估判断评分能否复用）
+        
+        Returns:
+            评价器名称和去除密钥、缓存、并发、超时后的配置
+        """
+        return {
+            "evaluator": self.name,
+            "config": {
+                k: v for k, v in self.config.items()
+                if "api_key" not in k and k not in self.FINGERPRINT_EXCLUDED_KEYS
+            }
+        }
+    
     def is_available(self) -> bool:
         """
         检查评价器是否可用
@@ -178,6 +392,8 @@ class AsyncBaseEvaluator(ABC):
         return {
             "name": self.name,
             "timeout": self.timeout,
+            "max_concurrency": self.max_concurrency,
+            "item_timeout": self.item_timeout,
             "available": self._available,
             "supported_metrics": self.get_supported_metrics(),
             "config": {k: v for k, v in self.config.items() if k != 'api_key'}
@@ -1,9 +1,10 @@
 # 异步评估器工厂 - 异步评估器的创建和管理
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from .async_base import AsyncBaseEvaluator
 from .async_academic_evaluator import AsyncAcademicEvaluator
 from .async_ragas_evaluator import AsyncRagasEvaluator
+from utils.async_utils import AsyncUtils
 import asyncio
 import logging
 
@@ -107,17 +108,26 @@ class AsyncEvaluatorFactory:
 class AsyncEvaluatorManager:
     """异步评估器管理器"""
     
-    def __init__(self, chat_config: Dict[str, Any], embedding_config: Dict[str, Any]):
+    def __init__(self, chat_config: Dict[str, Any], embedding_config: Dict[str, Any],
+                 async_config: Optional[Dict[str, Any]] = None,
+                 cache_config: Optional[Dict[str, Any]] = None):
         """初始化异步评估器管理器"""
         # 为混合模型评估器准备两种配置
         self.chat_config = chat_config.copy()
         self.embedding_config = embedding_config.copy()
+        self.async_config = (async_config or {}).copy()
+        self.cache_config = (cache_config or {}).copy()
         self.evaluators = {}  # 将在初始化时异步创建
         
         print(f"🔧 异步评估器管理器初始化完成")
     
-    async def initialize_async(self):
-        """异步初始化所有评估器"""
+    async def initialize_async(self, types: Optional[List[str]] = None):
+        """
+        异步初始化评估器
+        
+        Args:
+            types: 要启用的评估器类型（AsyncEvaluatorFactory.EVALUATOR_TYPES中的键），默认全部
+        """
         # 为增强学术评估器合并配置
         enhanced_config = {
             **self.chat_config,
@@ -127,39 +137,123 @@ class AsyncEvaluatorManager:
             "embedding_api_key": self.embedding_config.get("api_key"),
             "embedding_base_url": self.embedding_config.get("base_url"),
             "embedding_model": self.embedding_config.get("model"),
-            "evaluation_mode": "hybrid"  # 使用混合模式：embedding计算相关性，聊天模型评估质量
+            "embedding_batch_size": self.embedding_config.get("batch_size", 32),
+            "embedding_batch_interval": self.embedding_config.get("batch_interval_ms", 5) / 1000,
+            "evaluation_mode": "hybrid",  # 使用混合模式：embedding计算相关性，聊天模型评估质量
+            # 每个评价器的并发上限和单项超时
+            "max_concurrency": self.async_config.get("evaluator_max_concurrency", 3),
+            "item_timeout": self.async_config.get("evaluator_timeout", self.chat_config.get("timeout", 45)),
+            "judge_cache": self.cache_config,
+            "embedding_cache": self.cache_config
         }
         
-        self.evaluators = await AsyncEvaluatorFactory.create_all_evaluators_async(enhanced_config)
+        self.evaluators = await AsyncEvaluatorFactory.create_all_evaluators_async(enhanced_config, types)
         
         if not self.evaluators:
             raise ValueError("没有可用的异步评估器")
         
         print(f"🔧 可用的异步评估器: {list(self.evaluators.keys())}")
     
-    async def evaluate_all_async(self, questions: List[str], answers: List[str], 
-                               ground_truths: List[str], contexts: List[List[str]] = None) -> Dict[str, Dict[str, List[float]]]:
-        """异步执行所有评估器评估"""
-        all_results = {}
+    async def _run_evaluator(self, evaluator_name: str, items: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Optional[float]], Optional[str]]]:
+        """用单个评估器评价一批评价项，整体失败时所有项记为失败"""
+        evaluator = self.evaluators[evaluator_name]
+        try:
+            results = await evaluator.evaluate_items_async(items)
+        except Exception as e:
+            print(f"    ❌ {evaluator_name} 失败: {e}")
+            results = [(evaluator._get_missing_single_score(), f"评价失败: {e}")] * len(items)
+        return results
+    
+    async def evaluate_stream_async(self, group_queue: asyncio.Queue, workers: int,
+                                    groups_per_call: int = 1,
+                                    reuse: Optional[Callable[[str, Dict[str, Any]], Optional[Tuple[Dict[str, Optional[float]], Optional[str]]]]] = None,
+                                    on_scored: Optional[Callable[[str, List[Dict[str, Any]], List[Any]], Any]] = None,
+                                    on_completed: Optional[Callable[[List[Dict[str, Any]], Dict[str, List[Any]]], Any]] = None,
+                                    total: Optional[int] = None) -> int:
+        """
+        流式评价 - 从队列中持续取出已就绪的评价项组并评分
+        
+        每组是同一问题下各RAG系统的评价项；队列中的None表示生产者已结束。
+        worker取到一组后会顺带取走队列中已就绪的其他组（最多groups_per_call组），
+        让批量评分可以把多个问题合并为一次请求。结果通过回调交给调用方，不在内存中累积。
         
-        for evaluator_name, evaluator in self.evaluators.items():
-            print(f"\n📊 使用{evaluator_name}异步评估器评估中...")
+        Args:
+            group_queue: 评价项组队列
+            workers: 评分worker数（评分阶段的并发预算）
+            groups_per_call: 每次评价最多合并的组数
+            reuse: 查找可复用评价结果的回调(评估器名, 评价项)，返回None时才实际评价
+            on_scored: 每个评估器实际完成一批评价后的回调，参数为(评估器名, 评价项列表, 结果列表)
+            on_completed: 一批评价项的所有评估器都有结果后的回调，参数为(评价项列表, {评估器名: 结果列表})
+            total: 问题总数（用于输出进度，未知时为None）
             
-            try:
-                # 使用带超时的异步评估
-                metrics = await evaluator.evaluate_with_timeout(
-                    questions, answers, ground_truths, contexts
+        Returns:
+            完成评价的组数
+        """
+        groups_per_call = max(1, groups_per_call)
+        progress = {"groups": 0}
+        
+        async def evaluate_group_items(evaluator_name: str, items: List[Dict[str, Any]]) -> List[Any]:
+            # 先复用已有结果，只评价剩下的项
+            results = [reuse(evaluator_name, item) if reuse is not None else None for item in items]
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                return results
+            
+            pending_items = [items[i] for i in pending]
+            pending_results = await self._run_evaluator(evaluator_name, pending_items)
+            for i, result in zip(pending, pending_results):
+                results[i] = result
+            
+            if on_scored is not None:
+                on_scored(evaluator_name, pending_items, pending_results)
+            return results
+        
+        async def worker():
+            finished = False
+            while not finished:
+                group = await group_queue.get()
+                if group is None:
+                    return
+                
+                items = list(group)
+                groups = 1
+                # 顺带取出已就绪的问题组，凑满一次批量评分
+                while groups < groups_per_call and not group_queue.empty():
+                    extra = group_queue.get_nowait()
+                    if extra is None:
+                        finished = True
+                        break
+                    items.extend(extra)
+                    groups += 1
+                
+                evaluator_results = await AsyncUtils.run_all(
+                    *(evaluate_group_items(name, items) for name in self.evaluators)
                 )
-                all_results[evaluator_name] = metrics
-                print(f"    ✅ 完成")
-            except Exception as e:
-                print(f"    ❌ 失败: {e}")
-                # 使用默认值填充
-                default_metrics = {metric: [None] * len(answers) 
-                                 for metric in evaluator.get_supported_metrics()}
-                all_results[evaluator_name] = default_metrics
+                if on_completed is not None:
+                    on_completed(items, dict(zip(self.evaluators.keys(), evaluator_results)))
+                
+                progress["groups"] += groups
+                print(f"  📊 评分完成 {progress['groups']}" + (f"/{total}" if total else ""))
         
-        return all_results
+        # 任一worker失败（回调出错等）时取消其他worker
+        await AsyncUtils.run_all(*(worker() for _ in range(max(1, workers))))
+        return progress["groups"]
+    
+    def get_run_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有评估器的运行统计（缓存命中等）"""
+        return {
+            name: stats
+            for name, stats in ((name, evaluator.get_run_stats()) for name, evaluator in self.evaluators.items())
+            if stats
+        }
+    
+    def close(self):
+        """关闭所有评估器持有的资源（评分缓存等）"""
+        for name, evaluator in self.evaluators.items():
+            try:
+                evaluator.close()
+            except Exception as e:
+                print(f"⚠️  关闭评估器 {name} 失败: {e}")
     
     def get_evaluator_summary(self) -> Dict[str, Any]:
         """获取评估器概要"""
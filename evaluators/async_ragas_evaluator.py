@@ -14,6 +14,8 @@ from ragas.llms import LangchainLLMWrapper
 from langchain_openai import ChatOpenAI
 from langchain_community.embeddings import OllamaEmbeddings
 from .async_base import AsyncBaseEvaluator
+from .cached_embeddings import CachedEmbeddings
+from utils.embedding_store import get_embedding_store
 import asyncio
 import aiohttp
 import math
@@ -25,6 +27,7 @@ class AsyncRagasEvaluator(AsyncBaseEvaluator):
     def __init__(self, config: Dict[str, Any]):
         """异步Ragas + Ollama评估器初始化"""
         super().__init__("AsyncRagas", config)
+        self.embedding_store = None
         
         try:
             # Chat LLM初始化 (支持任何OpenAI兼容的API)
@@ -50,6 +53,12 @@ class AsyncRagasEvaluator(AsyncBaseEvaluator):
                     model=ollama_model
                 )
                 embedding_name = f"{ollama_model} (Ollama)"
+                
+                # 可选：通过向量存储复用已计算的嵌入向量
+                self.embedding_store = get_embedding_store(config.get("embedding_cache"))
+                if self.embedding_store is not None:
+                    self.embeddings = CachedEmbeddings(self.embeddings, self.embedding_store, ollama_model)
+                    embedding_name += " + 向量存储"
             else:
                 # 支持其他嵌入模型
                 from langchain_openai import OpenAIEmbeddings
@@ -168,45 +177,12 @@ class AsyncRagasEvaluator(AsyncBaseEvaluator):
         if not self._available:
             return {"relevancy": [None] * len(answers), "correctness": [None] * len(answers), "faithfulness": [None] * len(answers), "context_precision": [None] * len(answers), "context_recall": [None] * len(answers)}
         
-        # 并发评估所有答案
-        tasks = []
-        for i, (question, answer, ground_truth) in enumerate(zip(questions, answers, ground_truths)):
-            context = contexts[i] if contexts and i < len(contexts) else None
-            task = self.evaluate_single_answer_async(question, answer, ground_truth, context)
-            tasks.append(task)
-        
-        # 等待所有评估完成
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 处理结果
-        relevancy_scores = []
-        correctness_scores = []
-        faithfulness_scores = []
-        context_precision_scores = []
-        context_recall_scores = []
-        
-        for result in results:
-            if isinstance(result, Exception):
-                print(f"❌ 评估异常: {result}")
-                relevancy_scores.append(None)
-                correctness_scores.append(None)
-                faithfulness_scores.append(None)
-                context_precision_scores.append(None)
-                context_recall_scores.append(None)
-            else:
-                relevancy_scores.append(result.get('relevancy'))
-                correctness_scores.append(result.get('correctness'))
-                faithfulness_scores.append(result.get('faithfulness'))
-                context_precision_scores.append(result.get('context_precision'))
-                context_recall_scores.append(result.get('context_recall'))
-        
-        return {
-            "relevancy": relevancy_scores,
-            "correctness": correctness_scores,
-            "faithfulness": faithfulness_scores,
-            "context_precision": context_precision_scores,
-            "context_recall": context_recall_scores
-        }
+        # 有界并发逐项评估，超时的项目记为None
+        return await self._evaluate_items_bounded(questions, answers, ground_truths, contexts)
+    
+    def get_run_stats(self) -> Dict[str, Any]:
+        """获取运行统计（向量存储命中情况）"""
+        return {"embedding_store": self.embedding_store.get_stats()} if self.embedding_store else {}
     
     def get_supported_metrics(self) -> List[str]:
         """获取支持的评估指标"""
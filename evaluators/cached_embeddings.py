@@ -0,0 +1,40 @@
+# 带向量存储的嵌入模型包装器 - 供Ragas评估器使用
+
+from typing import List
+from langchain_core.embeddings import Embeddings
+from utils.embedding_store import EmbeddingStore
+
+class CachedEmbeddings(Embeddings):
+    """先查询向量存储、只为未命中的文本调用底层嵌入模型的LangChain嵌入包装器"""
+    
+    def __init__(self, embeddings: Embeddings, store: EmbeddingStore, model: str):
+        """
+        初始化包装器
+        
+        Args:
+            embeddings: 底层嵌入模型（如OllamaEmbeddings）
+            store: 向量存储
+            model: 嵌入模型名称（作为存储键的一部分）
+        """
+        self.embeddings = embeddings
+        self.store = store
+        self.model = model
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量获取文档嵌入向量"""
+        cached = self.store.get_many(self.model, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        
+        if missing:
+            # 同一批次中的重复文本只计算一次
+            missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(missing_texts, self.embeddings.embed_documents(missing_texts)))
+            self.store.put_many(self.model, missing_texts, [computed[text] for text in missing_texts])
+            for i in missing:
+                cached[i] = computed[texts[i]]
+        
+        return [[float(x) for x in vector] for vector in cached]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """获取查询文本嵌入向量"""
+        return self.embed_documents([text])[0]
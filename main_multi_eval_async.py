@@ -5,27 +5,68 @@ import argparse
 import asyncio
 import sys
 import json
-import pandas as pd
+import time
+from contextlib import aclosing
 from pathlib import Path
-from typing import Dict, Any, List
-from config import CHAT_CONFIG, EMBEDDING_CONFIG, ASYNC_CONFIG, get_enabled_rag_systems, validate_config
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator, Iterable, Iterator, Callable, Awaitable
+from config import CHAT_CONFIG, EMBEDDING_CONFIG, ASYNC_CONFIG, CACHE_CONFIG, OUTPUT_CONFIG, COMPARE_CONFIG, get_enabled_rag_systems, validate_config
 from connectors.universal import UniversalRAGConnector
 from evaluators.factory import EvaluatorManager
-from evaluators.async_factory import AsyncEvaluatorManager
+from evaluators.async_factory import AsyncEvaluatorManager, AsyncEvaluatorFactory
+from utils.http_session import get_session_manager
+from utils.async_config import get_async_config
+from utils.async_utils import AsyncUtils
+from utils.run_journal import RunJournal, JournalState
+from utils.answers_artifact import AnswersArtifactWriter, count_answers_artifact, iter_answers_artifact
+from utils.result_writers import StreamingResultWriter
+from utils.run_store import RunStore
+from utils.run_compare import load_run_scores, compare_runs
+from utils.statistics import PAIRED_TESTS
+from utils.adaptive_limiter import get_all_limiter_stats
+from utils.rate_limiter import get_all_rate_limiter_stats
+from utils.circuit_breaker import get_all_breaker_stats
+from utils.telemetry import get_telemetry
+from utils.metrics_exporter import note_cases_completed, start_metrics_exporter, stop_metrics_exporter
+from utils.test_case_loader import count_test_cases, iter_test_cases
+
+# 默认测试用例文件
+DEFAULT_TEST_CASES = "data/test_cases_jp.json"
+
+def _worker_count(fixed: int) -> int:
+    """
+    流水线阶段的worker数
+    
+    启用自适应并发时按并发上限创建worker，实际在途请求数由各上游的限制器控制。
+    
+    Args:
+        fixed: 配置的固定并发数
+        
+    Returns:
+        worker数
+    """
+    if ASYNC_CONFIG["adaptive_concurrency"]:
+        return max(fixed, get_async_config().get_adaptive_config()["max_concurrency"])
+    return fixed
 
 class AsyncMultiEvaluatorRAGSystem:
     """异步多评估器RAG评估系统"""
     
-    def __init__(self):
-        """系统初始化"""
+    def __init__(self, require_evaluators: bool = True, require_rag_systems: bool = True):
+        """
+        系统初始化
+        
+        Args:
+            require_evaluators: 是否需要评估模型（collect阶段不需要）
+            require_rag_systems: 是否需要RAG系统连接器（evaluate阶段不需要）
+        """
         # 验证配置
-        config_errors = validate_config()
+        config_errors = validate_config(require_evaluators, require_rag_systems)
         if config_errors:
             raise ValueError(f"配置错误: {config_errors}")
         
         # 初始化RAG连接器
         self.connectors = {}
-        enabled_systems = get_enabled_rag_systems()
+        enabled_systems = get_enabled_rag_systems() if require_rag_systems else {}
         
         for system_name, config in enabled_systems.items():
             try:
@@ -35,19 +76,15 @@ class AsyncMultiEvaluatorRAGSystem:
             except Exception as e:
                 print(f"❌ {system_name} RAG系统初始化错误: {e}")
         
-        if not self.connectors:
+        if require_rag_systems and not self.connectors:
             raise ValueError("没有可用的RAG系统")
         
         # 初始化异步评估器管理器
-        self.async_evaluator_manager = AsyncEvaluatorManager(CHAT_CONFIG, EMBEDDING_CONFIG)
+        self.async_evaluator_manager = AsyncEvaluatorManager(CHAT_CONFIG, EMBEDDING_CONFIG, ASYNC_CONFIG, CACHE_CONFIG)
     
-    async def load_test_cases(self, file_path: str) -> list:
-        """加载测试用例"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            raise ValueError(f"测试用例加载失败 {file_path}: {e}")
+    def load_test_cases(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """按需逐条读取测试用例（JSONL、CSV、Parquet或JSON数组）"""
+        return iter_test_cases(file_path)
     
     async def test_connections(self) -> Dict[str, bool]:
         """测试所有连接"""
@@ -64,202 +101,848 @@ class AsyncMultiEvaluatorRAGSystem:
         
         return results
     
-    async def query_rag_systems(self, question: str) -> Dict[str, Dict[str, Any]]:
-        """查询所有RAG系统"""
-        results = {}
+    async def query_rag_system(self, system_name: str, question: str, label: str = "") -> Dict[str, Any]:
+        """查询单个RAG系统"""
+        connector = self.connectors[system_name]
+        prefix = f"  [{label}] " if label else "  "
+        started = time.perf_counter()
         
-        for system_name, connector in self.connectors.items():
+        try:
+            result = await connector.query_with_timeout(
+                question, 
+                timeout=ASYNC_CONFIG["rag_query_timeout"]
+            )
+            
+            if result.get("error"):
+                print(f"{prefix}{system_name} 错误: {result['error']}")
+            else:
+                print(f"{prefix}{system_name} 成功获取回答 ({len(result.get('answer', ''))} 字符)")
+                
+        except Exception as e:
+            result = {"answer": "", "contexts": [], "error": str(e)}
+            print(f"{prefix}{system_name} 查询失败: {e}")
+        
+        result.setdefault("latency", round(time.perf_counter() - started, 3))
+        return result
+    
+    async def iter_answers(self, cases: Iterable[Tuple[int, Dict[str, Any]]], system_names: List[str],
+                           query: Optional[Callable[[str, int, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None
+                           ) -> AsyncIterator[Tuple[str, int, Dict[str, Any]]]:
+        """
+        查询阶段 - 按完成顺序产出各系统的回答
+        
+        测试用例按需从cases中读取并分发给每个RAG系统；每个系统保持最多max_concurrency个在途请求，
+        待查询缓冲最多pipeline_queue_size个用例。最慢的系统或消费者跟不上时暂停读取新用例，
+        内存占用与测试用例总数无关。
+        
+        Args:
+            cases: (用例索引, 测试用例)的迭代器
+            system_names: 要查询的RAG系统
+            query: 查询函数(系统名, 用例索引, 测试用例)，默认直接查询RAG系统
+            
+        Yields:
+            (系统名, 用例索引, 查询结果)
+        """
+        concurrency = _worker_count(ASYNC_CONFIG["max_concurrency"])
+        if query is None:
+            query = lambda system_name, i, case: self.query_rag_system(system_name, case["question"], label=str(i + 1))
+        
+        case_queues = {name: asyncio.Queue(maxsize=ASYNC_CONFIG["pipeline_queue_size"]) for name in system_names}
+        answers_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * max(1, len(system_names)))
+        
+        async def dispatch():
+            for i, case in cases:
+                for system_name in system_names:
+                    await case_queues[system_name].put((i, case))
+            for system_name in system_names:
+                for _ in range(concurrency):
+                    await case_queues[system_name].put(None)
+        
+        async def worker(system_name: str):
+            while (entry := await case_queues[system_name].get()) is not None:
+                i, case = entry
+                try:
+                    result = await query(system_name, i, case)
+                except Exception as e:
+                    result = {"answer": "", "contexts": [], "error": str(e)}
+                await answers_queue.put((system_name, i, result))
+        
+        async def produce():
             try:
-                result = await connector.query_with_timeout(
-                    question, 
-                    timeout=ASYNC_CONFIG["rag_query_timeout"]
+                await asyncio.gather(
+                    dispatch(),
+                    *(worker(system_name) for system_name in system_names for _ in range(concurrency))
                 )
-                results[system_name] = result
-                
-                if result.get("error"):
-                    print(f"  {system_name} 错误: {result['error']}")
-                else:
-                    print(f"  {system_name} 成功获取回答")
-                    
-            except Exception as e:
-                results[system_name] = {"answer": "", "contexts": [], "error": str(e)}
-                print(f"  {system_name} 查询失败: {e}")
+            finally:
+                # 被取消时消费者已经不再读取，不需要结束标记
+                if not asyncio.current_task().cancelling():
+                    await answers_queue.put(None)
         
-        return results
+        producer = asyncio.create_task(produce())
+        try:
+            while (entry := await answers_queue.get()) is not None:
+                yield entry
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
     
-    async def run_evaluation(self, test_cases: list, connection_results: Dict[str, bool]) -> Dict[str, Any]:
-        """运行评估"""
-        evaluation_results = {}
+    async def run_evaluation(self, cases: Iterable[Dict[str, Any]], connection_results: Dict[str, bool],
+                             output_dir: str,
+                             test_cases_file: str = "",
+                             journal: Optional[RunJournal] = None,
+                             state: Optional[JournalState] = None,
+                             copy_reused: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        运行评估（流式流水线）
         
+        测试用例按需读取；某个用例的所有系统回答到齐后立即放入待评分队列，
+        由judge_concurrency个评分worker并行评分。队列满时查询暂停（背压），
+        总耗时约为max(查询, 评分)而不是两者之和。用例评分完成后立即写入结果文件。
+        
+        Args:
+            cases: 测试用例迭代器
+            connection_results: 各系统连接测试结果
+            output_dir: 结果输出目录
+            test_cases_file: 测试用例文件路径（记录到运行历史）
+            journal: 运行日志，每个回答和评价完成时写入
+            state: 已有运行的日志状态，指纹一致的回答和评价直接复用
+            copy_reused: 是否把复用的记录写入本次运行日志（增量评估时为True）
+            
+        Returns:
+            结果汇总，没有可用的RAG系统时返回None
+        """
         # 只评估连接成功的系统
         successful_systems = [name for name, success in connection_results.items() if success]
         
         if not successful_systems:
             print("❌ 没有可用的RAG系统进行评估")
-            return evaluation_results
+            return None
         
-        print(f"\n🔍 开始评估，测试用例数量: {len(test_cases)}")
+        judge_concurrency = _worker_count(ASYNC_CONFIG["judge_concurrency"])
         
-        # 准备评估数据
-        all_questions = []
-        all_answers = {}
-        all_ground_truths = []
-        all_contexts = {}
+        # 指纹：回答取决于用例和系统配置，评价还取决于回答内容和评估器配置
+        system_fingerprints = {
+            name: RunJournal.fingerprint(self.connectors[name].get_fingerprint_config()) for name in successful_systems
+        }
+        evaluator_fingerprints = {
+            name: RunJournal.fingerprint(evaluator.get_fingerprint_config())
+            for name, evaluator in self.async_evaluator_manager.evaluators.items()
+        }
         
-        # 初始化数据结构
-        for system_name in successful_systems:
-            all_answers[system_name] = []
-            all_contexts[system_name] = []
+        def answer_fingerprint(system_name: str, case_key: str) -> str:
+            return RunJournal.fingerprint(case_key, system_fingerprints[system_name])
         
-        # 收集所有问题和标准答案
-        for test_case in test_cases:
-            question = test_case["question"]
-            ground_truth = test_case["ground_truth"]
-            
-            all_questions.append(question)
-            all_ground_truths.append(ground_truth)
+        def score_fingerprint(evaluator_name: str, item: Dict[str, Any]) -> str:
+            return RunJournal.fingerprint(
+                item["case_key"], evaluator_fingerprints[evaluator_name], item["answer"], item["contexts"]
+            )
+        
+        # 在途用例（已读取但还没有全部系统回答），完成后移出
+        inflight: Dict[int, Dict[str, Any]] = {}
+        reused = {"answers": 0, "scores": 0}
+        
+        def feed() -> Iterator[Tuple[int, Dict[str, Any]]]:
+            for i, case in enumerate(cases):
+                inflight[i] = {
+                    "case": case,
+                    "case_key": RunJournal.case_key(case["question"], case["ground_truth"]),
+                    "items": {}
+                }
+                yield i, case
         
-        # 查询所有RAG系统
-        print("\n📡 查询RAG系统...")
-        for i, question in enumerate(all_questions):
-            print(f"\n问题 {i+1}/{len(all_questions)}: {question[:50]}...")
+        async def query_or_reuse(system_name: str, i: int, case: Dict[str, Any]) -> Dict[str, Any]:
+            """复用指纹一致的已有回答，否则查询RAG系统"""
+            case_key = inflight[i]["case_key"]
+            fingerprint = answer_fingerprint(system_name, case_key)
             
-            rag_results = await self.query_rag_systems(question)
+            record = state.get_answer(system_name, case_key, fingerprint) if state else None
+            if record is not None:
+                reused["answers"] += 1
+                if copy_reused and journal is not None:
+                    journal.record_answer(system_name, i, case_key, record, fingerprint)
+                return record
             
-            for system_name in successful_systems:
-                result = rag_results.get(system_name, {})
-                answer = result.get("answer", "")
-                contexts = result.get("contexts", [])
-                
-                all_answers[system_name].append(answer)
-                all_contexts[system_name].append(contexts)
-                
-                # 在测试用例中添加RAG回答
-                if i < len(test_cases):
-                    test_cases[i][f"{system_name}_answer"] = answer
-                
-                print(f"  {system_name} 回答长度: {len(answer)} 字符")
+            result = await self.query_rag_system(system_name, case["question"], label=str(i + 1))
+            if journal is not None:
+                journal.record_answer(system_name, i, case_key, result, fingerprint)
+            return result
+        
+        def reuse_score(evaluator_name: str, item: Dict[str, Any]):
+            """复用指纹一致的已有评价"""
+            if state is None:
+                return None
+            fingerprint = score_fingerprint(evaluator_name, item)
+            result = state.get_score(evaluator_name, item["system"], item["case_key"], fingerprint)
+            if result is not None:
+                reused["scores"] += 1
+                if copy_reused and journal is not None:
+                    journal.record_scores(evaluator_name, [item], [result], [fingerprint])
+            return result
+        
+        def on_scored(evaluator_name: str, items: List[Dict[str, Any]], results: List[Any]):
+            if journal is not None:
+                fingerprints = [score_fingerprint(evaluator_name, item) for item in items]
+                journal.record_scores(evaluator_name, items, results, fingerprints)
+        
+        print(f"\n📡 流式评估 {', '.join(successful_systems)} 系统 "
+              f"(查询并发: 每系统{ASYNC_CONFIG['max_concurrency']}, 评分worker: {judge_concurrency}, "
+              f"自适应并发: {'启用' if ASYNC_CONFIG['adaptive_concurrency'] else '禁用'}, "
+              f"队列容量: {ASYNC_CONFIG['pipeline_queue_size']})...")
+        
+        # 生产者：元素为同一用例下各系统的评价项列表，None表示查询结束
+        async def produce(judge_queue: asyncio.Queue):
+            async with aclosing(self.iter_answers(feed(), successful_systems, query_or_reuse)) as answers:
+                async for system_name, i, result in answers:
+                    entry = inflight[i]
+                    case = entry["case"]
+                    entry["items"][system_name] = {
+                        "system": system_name,
+                        "index": i,
+                        "case_key": entry["case_key"],
+                        "question": case["question"],
+                        "answer": result.get("answer", ""),
+                        "ground_truth": case["ground_truth"],
+                        "contexts": result.get("contexts", []),
+                        "latency": result.get("latency"),
+                        "timing": result.get("timing"),
+                        "telemetry": result.get("telemetry")
+                    }
+                    if len(entry["items"]) < len(successful_systems):
+                        continue
+                    
+                    # 该用例所有系统都已回答，交给评分阶段（队列满时在此等待）
+                    del inflight[i]
+                    await judge_queue.put([entry["items"][name] for name in successful_systems])
+            # 查询结束时通知每个worker退出（失败时由TaskGroup取消评分worker，不需要结束标记）
+            for _ in range(judge_concurrency):
+                await judge_queue.put(None)
+        
+        writer = self._open_result_writer(output_dir, successful_systems, "run", test_cases_file)
+        try:
+            count = await self._judge_stream(produce, writer, reuse=reuse_score, on_scored=on_scored)
+        except BaseException:
+            writer.close(status="failed")
+            raise
+        
+        if state:
+            print(f"♻️  复用已有结果: {reused['answers']}/{count * len(successful_systems)} 个回答, "
+                  f"{reused['scores']} 个评价结果")
+        print(f"  ✅ 异步评估完成，共 {count} 个测试用例")
+        
+        return self._finish_results(writer)
+    
+    def _open_result_writer(self, output_dir: str, system_names: List[str],
+                            command: str, source: str) -> StreamingResultWriter:
+        """
+        创建流式结果写入器（列由系统和已初始化评估器的指标决定）
+        
+        Args:
+            output_dir: 结果输出目录
+            system_names: RAG系统名列表
+            command: 子命令（记录到运行历史）
+            source: 输入文件（记录到运行历史）
+        """
+        evaluator_metrics = {
+            name: evaluator.get_supported_metrics()
+            for name, evaluator in self.async_evaluator_manager.evaluators.items()
+        }
+        
+        run_store, run_id = None, None
+        if OUTPUT_CONFIG["run_store_path"]:
+            run_store = RunStore(OUTPUT_CONFIG["run_store_path"], OUTPUT_CONFIG["run_store_batch_size"])
+            run_id = run_store.start_run(command, str(source), str(output_dir), system_names, evaluator_metrics)
+            print(f"🗄️  运行历史: {OUTPUT_CONFIG['run_store_path']} (run_id={run_id})")
+        
+        return StreamingResultWriter(
+            output_dir,
+            system_names,
+            evaluator_metrics,
+            parquet=OUTPUT_CONFIG["parquet_enabled"],
+            parquet_row_group_size=OUTPUT_CONFIG["parquet_row_group_size"],
+            run_store=run_store,
+            run_id=run_id,
+            bootstrap_resamples=OUTPUT_CONFIG["bootstrap_resamples"],
+            confidence=OUTPUT_CONFIG["confidence"]
+        )
+    
+    async def _judge_stream(self, produce: Callable[[asyncio.Queue], Awaitable[None]], writer: StreamingResultWriter,
+                            reuse=None, on_scored=None) -> int:
+        """
+        评分阶段 - 评分完成的用例立即写入结果文件
         
-        # 对每个系统进行评估
-        for system_name in successful_systems:
-            print(f"\n📊 评估 {system_name} 系统...")
+        Args:
+            produce: 生产者协程函数，向待评分队列放入评价项组，结束时为每个worker放入None
+            writer: 结果写入器
+            reuse: 查找可复用评价结果的回调
+            on_scored: 每批评价完成后的回调
             
-            try:
-                metrics = await self.async_evaluator_manager.evaluate_all_async(
-                    all_questions,
-                    all_answers[system_name],
-                    all_ground_truths,
-                    all_contexts[system_name]
+        Returns:
+            完成评价的用例数
+        """
+        judge_concurrency = _worker_count(ASYNC_CONFIG["judge_concurrency"])
+        judge_queue: asyncio.Queue = asyncio.Queue(maxsize=ASYNC_CONFIG["pipeline_queue_size"])
+        
+        def on_completed(items: List[Dict[str, Any]], results: Dict[str, List[Any]]):
+            # 一批评价项可能包含多个用例，按用例分组写入
+            cases: Dict[int, Dict[str, Any]] = {}
+            for position, item in enumerate(items):
+                entry = cases.setdefault(
+                    item["index"], {"case": item, "answers": {}, "latencies": {}, "timings": {}, "telemetry": {}, "scores": {}}
                 )
-                evaluation_results[system_name] = metrics
-                print(f"  ✅ {system_name} 异步评估完成")
-            except Exception as e:
-                print(f"  ❌ {system_name} 异步评估失败: {e}")
-                evaluation_results[system_name] = {}
+                entry["answers"][item["system"]] = item["answer"]
+                entry["latencies"][item["system"]] = item.get("latency")
+                entry["timings"][item["system"]] = item.get("timing")
+                entry["telemetry"][item["system"]] = item.get("telemetry")
+                entry["scores"][item["system"]] = {
+                    evaluator_name: evaluator_results[position]
+                    for evaluator_name, evaluator_results in results.items()
+                }
+            for i, entry in cases.items():
+                writer.write_case(
+                    i, entry["case"], entry["answers"], entry["scores"], entry["latencies"], entry["timings"],
+                    entry["telemetry"]
+                )
+            note_cases_completed(len(cases))
         
-        return evaluation_results
+        # 任一阶段失败（写入结果出错、评估器异常等）时取消另一阶段，不再继续查询或写入已关闭的文件
+        _, count = await AsyncUtils.run_all(
+            produce(judge_queue),
+            self.async_evaluator_manager.evaluate_stream_async(
+                judge_queue,
+                workers=judge_concurrency,
+                groups_per_call=CHAT_CONFIG.get("judge_batch_questions", 1),
+                reuse=reuse,
+                on_scored=on_scored,
+                on_completed=on_completed
+            )
+        )
+        return count
     
-    async def save_results(self, evaluation_results: Dict[str, Any], test_cases: list, output_dir: str):
-        """保存评估结果"""
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-        
-        # 保存详细的JSON结果
-        detailed_results = {
-            "test_cases": test_cases,
-            "evaluation_results": evaluation_results,
-            "summary": {}
+    def _finish_results(self, writer: StreamingResultWriter) -> Dict[str, Any]:
+        """写入汇总文件并输出结果位置"""
+        run_stats = {
+            "evaluators": self.async_evaluator_manager.get_run_stats(),
+            "limiters": get_all_limiter_stats(),
+            "rate_limits": get_all_rate_limiter_stats(),
+            "circuit_breakers": get_all_breaker_stats(),
+            "telemetry": get_telemetry().summary()
         }
+        summary = writer.close(run_stats)
+        
+        # 输出评分缓存命中情况
+        for evaluator_name, stats in run_stats["evaluators"].items():
+            cache_stats = stats.get("judge_cache")
+            if cache_stats:
+                print(f"💾 {evaluator_name} 评分缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}, "
+                      f"节省 {cache_stats['saved_seconds']:.1f}秒, {cache_stats['saved_tokens']} tokens")
+        
+        # 输出各指标的均值和置信区间，以及系统间的配对差异
+        confidence = int(summary["confidence"] * 100)
+        print(f"\n📊 汇总 (均值 [{confidence}% CI], 中位数):")
+        for system_name, evaluators in summary["summary"].items():
+            for evaluator_name, metrics in evaluators.items():
+                for metric, stats in metrics.items():
+                    ci = f" [{stats['ci_low']:.3f}, {stats['ci_high']:.3f}]" if stats.get("ci_low") is not None else ""
+                    print(f"  {system_name} {evaluator_name} {metric}: {stats['mean']:.3f}{ci}, "
+                          f"{stats['median']:.3f} (n={stats['count']})")
+        for evaluator_name, metrics in summary["paired_differences"].items():
+            for metric, comparisons in metrics.items():
+                for pair, diff in comparisons.items():
+                    if not diff["count"]:
+                        continue
+                    ci = f" [{diff['ci_low']:+.3f}, {diff['ci_high']:+.3f}]" if diff.get("ci_low") is not None else ""
+                    print(f"  ⚖️  {pair} {evaluator_name} {metric}: {diff['mean_diff']:+.3f}{ci} "
+                          f"(胜 {diff['wins']} / 负 {diff['losses']} / 平 {diff['ties']})")
+        
+        # 输出各系统的延迟（流式模式下包含首字延迟和字间延迟）
+        latency_labels = {"latency": "端到端", "ttft": "首字", "inter_token_latency": "字间", "total_time": "请求"}
+        for system_name, metrics in summary["latency"].items():
+            parts = [
+                f"{latency_labels[metric]} {stats['mean']:.3f}s (中位数 {stats['median']:.3f}s)"
+                for metric, stats in metrics.items()
+            ]
+            if parts:
+                print(f"  ⏱️  {system_name} 延迟: {', '.join(parts)}")
+        
+        self._print_limiters(run_stats["limiters"])
+        self._print_rate_limits(run_stats["rate_limits"])
+        self._print_breakers(run_stats["circuit_breakers"])
+        self._print_telemetry(run_stats["telemetry"])
+        
+        files = writer.output_files()
+        print("\n✅ 结果已保存:")
+        print(f"  详细结果: {files['detail']}")
+        print(f"  CSV结果: {files['csv']}")
+        if "parquet" in files:
+            print(f"  Parquet结果: {files['parquet']}")
+        print(f"  汇总: {files['summary']}")
+        return summary
+    
+    def _print_limiters(self, limiters: Dict[str, Any]):
+        """输出各上游的并发上限变化"""
+        if not limiters:
+            return
+        print("\n🎚️  并发上限 (初始 → 最终, 范围):")
+        for name, stats in limiters.items():
+            overloads = ", ".join(f"{reason}×{count}" for reason, count in stats["overloads"].items())
+            print(f"  {name}: {stats['initial']} → {stats['final']} ({stats['lowest']}-{stats['highest']})"
+                  f"{f', 过载: {overloads}' if overloads else ''}")
+    
+    def _print_rate_limits(self, buckets: Dict[str, Any]):
+        """输出速率限制等待和429情况（只输出实际等待过或被限流的上游）"""
+        for name, stats in buckets.items():
+            if stats["waits"] or stats["rate_limited"]:
+                print(f"⏳ {name}: 等待配额 {stats['waits']} 次 / {stats['waited_seconds']:.1f}秒, "
+                      f"429 {stats['rate_limited']} 次 (Retry-After {stats['retry_after_seconds']:.1f}秒)")
+    
+    def _print_breakers(self, breakers: Dict[str, Any]):
+        """输出熔断器状态变化（只输出打开过的熔断器）"""
+        for name, stats in breakers.items():
+            if not stats["transitions"]:
+                continue
+            print(f"🔌 {name} 熔断 {stats['opened']} 次, 拒绝 {stats['rejected']} 个请求, 当前状态: {stats['state']}")
+            for transition in stats["transitions"]:
+                print(f"    {transition['at']} {transition['from']} → {transition['to']} ({transition['reason']})")
+    
+    def _print_telemetry(self, telemetry: Dict[str, Any]):
+        """输出各上游调用的耗时分位数、排队时间、重试次数和状态码分布"""
+        if not telemetry:
+            return
+        print("\n📡 调用遥测 (耗时 p50/p95/p99):")
+        for scope, names in telemetry.items():
+            for name, metrics in names.items():
+                wall_time = metrics.get("wall_time")
+                if not wall_time:
+                    continue
+                queue_wait = metrics.get("queue_wait") or {}
+                retries = metrics.get("retries") or {}
+                statuses = ", ".join(f"{status}×{count}" for status, count in metrics.get("status", {}).items())
+                print(f"  {scope}:{name}: {wall_time['p50']:.3f}s / {wall_time['p95']:.3f}s / {wall_time['p99']:.3f}s "
+                      f"(n={wall_time['count']}), 排队 p95 {queue_wait.get('p95', 0.0):.3f}s, "
+                      f"重试 {round(retries.get('mean', 0.0) * retries.get('count', 0))} 次, 状态: {statuses}")
+    
+    async def collect(self, test_cases_file: Optional[str], answers_path: str):
+        """
+        collect阶段 - 只查询RAG系统并保存回答文件，不做评估
+        
+        Args:
+            test_cases_file: 测试用例文件路径
+            answers_path: 回答文件输出路径
+        """
+        print("🚀 收集RAG系统回答...")
+        test_cases_file = test_cases_file or DEFAULT_TEST_CASES
         
-        # 计算摘要统计
-        for system_name, results in evaluation_results.items():
-            detailed_results["summary"][system_name] = {}
-            for evaluator_name, metrics in results.items():
-                detailed_results["summary"][system_name][evaluator_name] = {}
-                for metric_name, values in metrics.items():
-                    if values and any(v is not None for v in values):
-                        valid_values = [v for v in values if v is not None]
-                        detailed_results["summary"][system_name][evaluator_name][metric_name] = {
-                            "mean": sum(valid_values) / len(valid_values),
-                            "min": min(valid_values),
-                            "max": max(valid_values),
-                            "count": len(valid_values)
-                        }
-        
-        # 保存JSON文件
-        json_file = output_path / "detailed_evaluation_results.json"
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(detailed_results, f, ensure_ascii=False, indent=2)
-        
-        # 生成CSV格式结果
-        csv_data = []
-        
-        for i, test_case in enumerate(test_cases):
-            row = {
-                "question": test_case["question"],
-                "ground_truth": test_case["ground_truth"]
-            }
+        try:
+            test_cases = self.load_test_cases(test_cases_file)
+            print(f"📋 测试用例: {test_cases_file}（流式读取）")
+            await start_metrics_exporter("collect", lambda: count_test_cases(test_cases_file))
             
-            for system_name, system_results in evaluation_results.items():
-                # 添加RAG回答
-                if i < len(test_cases):  # 安全检查
-                    row[f"{system_name}_answer"] = test_case.get(f"{system_name}_answer", "")
-                
-                # 添加评估指标
-                for evaluator_name, metrics in system_results.items():
-                    for metric_name, values in metrics.items():
-                        if i < len(values) and values[i] is not None:
-                            row[f"{system_name}_{evaluator_name}_{metric_name}"] = values[i]
-                        else:
-                            row[f"{system_name}_{evaluator_name}_{metric_name}"] = None
+            connection_results = await self.test_connections()
+            systems = [name for name, success in connection_results.items() if success]
+            if not systems:
+                raise ValueError("没有可用的RAG系统")
+            
+            print(f"\n📡 查询 {', '.join(systems)} 系统 (每个系统最大并发: {ASYNC_CONFIG['max_concurrency']})...")
+            
+            writer = AnswersArtifactWriter(answers_path, test_cases_file, systems)
+            # 在途用例（已读取但还没有全部系统回答），写入后移出
+            inflight: Dict[int, Dict[str, Any]] = {}
+            
+            def feed() -> Iterator[Tuple[int, Dict[str, Any]]]:
+                for i, case in enumerate(test_cases):
+                    inflight[i] = {"case": case, "answers": {}}
+                    yield i, case
             
-            csv_data.append(row)
+            try:
+                async with aclosing(self.iter_answers(feed(), systems)) as answers:
+                    async for system_name, i, result in answers:
+                        entry = inflight[i]
+                        entry["answers"][system_name] = result
+                        # 所有系统都回答后写入一行，释放内存
+                        if len(entry["answers"]) == len(systems):
+                            del inflight[i]
+                            case = entry["case"]
+                            case_key = RunJournal.case_key(case["question"], case["ground_truth"])
+                            writer.write_case(i, case_key, case, {name: entry["answers"][name] for name in systems})
+                            note_cases_completed()
+            finally:
+                writer.close()
+            
+            self._print_limiters(get_all_limiter_stats())
+            self._print_rate_limits(get_all_rate_limiter_stats())
+            self._print_breakers(get_all_breaker_stats())
+            self._print_telemetry(get_telemetry().summary())
+            print(f"\n✅ 已保存 {writer.count} 个用例的回答: {answers_path}")
+        finally:
+            await stop_metrics_exporter()
+            self.async_evaluator_manager.close()
+            await get_session_manager().close_all()
+    
+    async def evaluate(self, answers_path: str, output_dir: str, evaluator_types: Optional[List[str]] = None):
+        """
+        evaluate阶段 - 读取回答文件并用指定的评估器评估，不访问RAG系统
         
-        # 保存CSV文件
-        csv_file = output_path / "multi_evaluation_results.csv"
-        df = pd.DataFrame(csv_data)
-        df.to_csv(csv_file, index=False, encoding='utf-8')
+        Args:
+            answers_path: collect阶段生成的回答文件
+            output_dir: 结果输出目录
+            evaluator_types: 要使用的评估器类型，默认全部
+        """
+        print("🚀 评估已收集的回答...")
         
-        print(f"\n✅ 结果已保存:")
-        print(f"  详细结果: {json_file}")
-        print(f"  CSV结果: {csv_file}")
+        try:
+            meta, cases = iter_answers_artifact(answers_path)
+            systems = meta.get("systems") or []
+            if not systems:
+                raise ValueError(f"回答文件缺少系统列表: {answers_path}")
+            print(f"📋 回答文件: {answers_path}（流式读取，系统: {', '.join(systems)}）")
+            
+            await self.async_evaluator_manager.initialize_async(evaluator_types)
+            await start_metrics_exporter(
+                "evaluate", lambda: count_answers_artifact(answers_path), self.async_evaluator_manager.get_run_stats
+            )
+            
+            async def produce(judge_queue: asyncio.Queue):
+                for case in cases:
+                    items = []
+                    for system_name in systems:
+                        result = case["answers"].get(system_name) or {}
+                        items.append({
+                            "system": system_name,
+                            "index": case["index"],
+                            "case_key": case["case_key"],
+                            "question": case["question"],
+                            "answer": result.get("answer", ""),
+                            "ground_truth": case["ground_truth"],
+                            "contexts": result.get("contexts", []),
+                            "latency": result.get("latency"),
+                            "timing": result.get("timing"),
+                            "telemetry": result.get("telemetry")
+                        })
+                    await judge_queue.put(items)
+                for _ in range(_worker_count(ASYNC_CONFIG["judge_concurrency"])):
+                    await judge_queue.put(None)
+            
+            writer = self._open_result_writer(output_dir, systems, "evaluate", answers_path)
+            try:
+                count = await self._judge_stream(produce, writer)
+            except BaseException:
+                writer.close(status="failed")
+                raise
+            print(f"  ✅ 评估完成，共 {count} 个用例")
+            self._finish_results(writer)
+            print("\n🎉 评估完成！")
+            print(f"📊 结果目录: {output_dir}")
+        finally:
+            await stop_metrics_exporter()
+            self.async_evaluator_manager.close()
+            await get_session_manager().close_all()
     
-    async def run(self, test_cases_file: str, output_dir: str):
-        """运行完整的评估流程"""
+    async def run(self, test_cases_file: Optional[str], output_dir: str, resume: bool = False,
+                  incremental_from: Optional[str] = None):
+        """
+        运行完整的评估流程
+        
+        Args:
+            test_cases_file: 测试用例文件路径（恢复运行时默认使用日志中记录的文件）
+            output_dir: 结果输出目录
+            resume: 是否从output_dir中的运行日志恢复
+            incremental_from: 上一次运行的目录，未变化的用例复用其回答和评价
+        """
         print("🚀 启动异步多评估器RAG评估系统...")
         
-        # 加载测试用例
-        test_cases = await self.load_test_cases(test_cases_file)
-        print(f"📋 加载了 {len(test_cases)} 个测试用例")
+        state = None
+        if resume:
+            if not RunJournal.exists(output_dir):
+                raise ValueError(f"未找到运行日志: {Path(output_dir) / RunJournal.FILE_NAME}")
+            state = RunJournal.load(output_dir)
+            test_cases_file = test_cases_file or state.run.get("test_cases")
+            print(f"♻️  从 {output_dir} 恢复运行")
+        elif incremental_from:
+            if not RunJournal.exists(incremental_from):
+                raise ValueError(f"未找到运行日志: {Path(incremental_from) / RunJournal.FILE_NAME}")
+            state = RunJournal.load(incremental_from)
+            print(f"♻️  增量评估，基于 {incremental_from}")
+        test_cases_file = test_cases_file or DEFAULT_TEST_CASES
         
-        # 测试连接
-        connection_results = await self.test_connections()
+        journal = RunJournal(output_dir, resume=resume)
         
-        # 初始化异步评估器
-        await self.async_evaluator_manager.initialize_async()
+        try:
+            # 加载测试用例（按需读取）
+            test_cases = self.load_test_cases(test_cases_file)
+            print(f"📋 测试用例: {test_cases_file}（流式读取）")
+            journal.record_run(
+                test_cases=str(test_cases_file),
+                systems=list(self.connectors.keys()),
+                resumed=resume,
+                incremental_from=incremental_from
+            )
+            await start_metrics_exporter(
+                "run", lambda: count_test_cases(test_cases_file), self.async_evaluator_manager.get_run_stats
+            )
+            
+            # 测试连接
+            connection_results = await self.test_connections()
+            
+            # 初始化异步评估器
+            await self.async_evaluator_manager.initialize_async()
+            
+            # 运行评估（结果边评分边写入）
+            await self.run_evaluation(
+                test_cases, connection_results, output_dir, str(test_cases_file),
+                journal, state, copy_reused=bool(incremental_from)
+            )
+            
+            print(f"\n🎉 异步多评估器RAG评估完成！")
+            print(f"📊 结果目录: {output_dir}")
+        finally:
+            journal.close()
+            await stop_metrics_exporter()
+            # 关闭评分缓存（写入访问时间并淘汰）和共享HTTP连接池
+            self.async_evaluator_manager.close()
+            await get_session_manager().close_all()
+
+def show_history(db_path: str, system_name: Optional[str] = None, metric: Optional[str] = None,
+                 evaluator_name: Optional[str] = None, regressions: Optional[int] = None,
+                 baseline: Optional[int] = None, threshold: float = 0.0, limit: int = 20):
+    """
+    查询运行历史
+    
+    不指定系统和指标时列出最近的运行；指定时输出该指标在各次运行中的均值；
+    同时指定regressions时逐用例比较该运行和基准运行，列出分数下降的用例。
+    
+    Args:
+        db_path: 运行历史数据库路径
+        system_name: 系统名
+        metric: 指标名
+        evaluator_name: 评估器名，默认不限
+        regressions: 要检查回退的运行ID（0表示最近一次运行）
+        baseline: 基准运行ID，默认为之前最近一次包含该指标的运行
+        threshold: 下降超过该值才算回退
+        limit: 最多输出的行数
+    """
+    if not Path(db_path).exists():
+        raise ValueError(f"运行历史不存在: {db_path}")
+    
+    store = RunStore(db_path)
+    try:
+        if not system_name or not metric:
+            if regressions is not None:
+                raise ValueError("检查回退需要指定 --system 和 --metric")
+            print(f"🗄️  最近的运行 ({db_path}):")
+            for run in store.list_runs(limit):
+                started = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["started_at"]))
+                print(f"  #{run['run_id']} {started} {run['command']} [{run['status']}] "
+                      f"{run['case_count'] or 0}个用例, 系统: {', '.join(run['systems'])}, "
+                      f"评估器: {', '.join(run['evaluators'])}, 输入: {run['source']}")
+            return
         
-        # 运行评估
-        evaluation_results = await self.run_evaluation(test_cases, connection_results)
+        if regressions is None:
+            print(f"📈 {system_name} {metric} 趋势:")
+            for point in store.metric_trend(system_name, metric, evaluator_name, limit):
+                started = time.strftime("%Y-%m-%d %H:%M", time.localtime(point["started_at"]))
+                mean = f"{point['mean']:.4f}" if point["mean"] is not None else "-"
+                print(f"  #{point['run_id']} {started} {point['evaluator']}: 平均 {mean} "
+                      f"({point['count']}个, 错误 {point['errors']})")
+            return
         
-        # 保存结果
-        await self.save_results(evaluation_results, test_cases, output_dir)
+        run_id = regressions or store.latest_run()
+        if run_id is None:
+            raise ValueError("运行历史为空")
+        baseline = baseline or store.previous_run(run_id, system_name, metric)
+        if baseline is None:
+            raise ValueError(f"运行 #{run_id} 之前没有包含 {system_name} {metric} 的运行")
         
-        print(f"\n🎉 异步多评估器RAG评估完成！")
-        print(f"📊 结果目录: {output_dir}")
+        rows = store.case_regressions(run_id, baseline, system_name, metric, evaluator_name, threshold, limit)
+        print(f"📉 {system_name} {metric}: 运行 #{run_id} 相比 #{baseline} 下降的用例 ({len(rows)}):")
+        for row in rows:
+            print(f"  [{row['case_key']}] {row['evaluator']} {row['baseline']:.4f} → {row['current']:.4f} "
+                  f"({row['delta']:+.4f}) {row['question'][:60]}")
+    finally:
+        store.close()
+
+def compare_command(baseline_source: str, candidate_source: Optional[str] = None,
+                    systems: Optional[List[str]] = None, db_path: Optional[str] = None,
+                    metrics: Optional[List[str]] = None, test: str = "permutation", alpha: float = 0.05,
+                    threshold: float = 0.1, gate_metrics: Optional[List[str]] = None,
+                    report_path: Optional[str] = None) -> int:
+    """
+    比较两次运行（或同一运行中的两个系统），门禁指标显著回退或没有可比较的分数时返回非零
+    
+    Args:
+        baseline_source: 基准运行（结果目录或运行历史中的运行ID）
+        candidate_source: 候选运行，不指定时比较baseline中的两个系统
+        systems: [基准系统, 候选系统]，比较两次运行时默认比较所有共同的系统
+        db_path: 运行历史数据库路径
+        metrics: 只比较这些指标
+        test: 检验方法
+        alpha: 显著性水平
+        threshold: 单个用例下降超过该值记为回退
+        gate_metrics: 参与门禁的指标（为空时全部）
+        report_path: 比较报告JSON的输出路径
+        
+    Returns:
+        退出码：0为通过，2为门禁指标显著回退或没有可比较的分数
+    """
+    baseline = load_run_scores(baseline_source, db_path)
+    candidate = load_run_scores(candidate_source, db_path) if candidate_source else baseline
+    
+    if systems:
+        if len(systems) != 2:
+            raise ValueError("--systems 需要两个系统名: 基准系统 候选系统")
+        system_pairs = [(systems[0], systems[1])]
+    elif candidate_source:
+        system_pairs = [(name, name) for name in baseline.systems if name in candidate.systems]
+    else:
+        raise ValueError("只给出一次运行时需要用 --systems 指定要比较的两个系统")
+    if not system_pairs:
+        raise ValueError("两次运行没有共同的系统")
+    
+    report = compare_runs(
+        baseline, candidate, system_pairs,
+        metrics=metrics, test=test, alpha=alpha, threshold=threshold,
+        gate_metrics=gate_metrics, n_resamples=COMPARE_CONFIG["permutations"]
+    )
+    
+    print(f"⚖️  比较 {candidate.label} 相对 {baseline.label} ({test}检验, α={alpha})")
+    for comparison in report["comparisons"]:
+        label = (comparison["candidate_system"] if comparison["baseline_system"] == comparison["candidate_system"]
+                 else f"{comparison['candidate_system']} - {comparison['baseline_system']}")
+        gate = " [门禁]" if comparison["gated"] else ""
+        if not comparison["count"]:
+            print(f"  ⚠️  {label} {comparison['evaluator']}.{comparison['metric']}{gate}: 没有共同的用例")
+            continue
+        p_value = comparison["p_value"]
+        status = "🔻" if comparison["regressed"] else ("🔺" if comparison["significant"] else "➖")
+        p_text = f"{p_value:.4f}" if p_value is not None else "-"
+        print(f"  {status} {label} {comparison['evaluator']}.{comparison['metric']}{gate}: "
+              f"{comparison['mean_diff']:+.4f} (p={p_text}, n={comparison['count']}, "
+              f"用例回退 {comparison['case_regressions']})")
+        for row in comparison["regressions"][:5]:
+            print(f"      [{row['case_key']}] {row['baseline']:.3f} → {row['candidate']:.3f} "
+                  f"({row['delta']:+.3f}) {row['question'][:60]}")
+    
+    if report_path:
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 比较报告: {report_path}")
+    
+    if report["failed"]:
+        print(f"❌ 门禁未通过，显著回退或没有可比较的分数: {', '.join(report['failed'])}")
+        return 2
+    print("✅ 门禁通过")
+    return 0
+
+# 子命令（未指定时默认为run）
+COMMANDS = ("run", "collect", "evaluate", "history", "compare")
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行解析器"""
+    parser = argparse.ArgumentParser(description="异步多评估器RAG评估系统")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    # run: 查询并评估
+    run_parser = subparsers.add_parser("run", help="查询RAG系统并评估（默认）")
+    run_parser.add_argument("--test-cases", default=None, 
+                           help=f"测试用例文件路径 (默认: {DEFAULT_TEST_CASES})")
+    run_parser.add_argument("--output", default="results", 
+                           help="结果输出目录 (默认: results)")
+    run_mode = run_parser.add_mutually_exclusive_group()
+    run_mode.add_argument("--resume", metavar="RUN_DIR", default=None,
+                          help="从运行目录中的运行日志恢复中断的评估，只补充缺失的查询和评价")
+    run_mode.add_argument("--incremental", metavar="PREVIOUS_RUN", default=None,
+                          help="增量评估：复用上一次运行中未变化用例的回答和评价，结果写入--output")
+    
+    # collect: 只收集回答
+    collect_parser = subparsers.add_parser("collect", help="只查询RAG系统，保存回答文件")
+    collect_parser.add_argument("--test-cases", default=None,
+                               help=f"测试用例文件路径 (默认: {DEFAULT_TEST_CASES})")
+    collect_parser.add_argument("--output", default="results/answers.jsonl",
+                               help="回答文件路径，.gz结尾时压缩 (默认: results/answers.jsonl)")
+    
+    # evaluate: 只评估已收集的回答
+    evaluate_parser = subparsers.add_parser("evaluate", help="评估collect保存的回答文件，不访问RAG系统")
+    evaluate_parser.add_argument("--answers", default="results/answers.jsonl",
+                                help="回答文件路径 (默认: results/answers.jsonl)")
+    evaluate_parser.add_argument("--evaluators", nargs="+", default=None,
+                                choices=list(AsyncEvaluatorFactory.EVALUATOR_TYPES.keys()),
+                                help="要使用的评估器 (默认: 全部)")
+    evaluate_parser.add_argument("--output", default="results",
+                                help="结果输出目录 (默认: results)")
+    
+    # history: 查询运行历史
+    history_parser = subparsers.add_parser("history", help="查询运行历史（趋势和逐用例回退）")
+    history_parser.add_argument("--db", default=OUTPUT_CONFIG["run_store_path"] or "results/run_history.db",
+                               help="运行历史数据库 (默认: RUN_STORE_PATH)")
+    history_parser.add_argument("--system", default=None, help="系统名")
+    history_parser.add_argument("--metric", default=None, help="指标名")
+    history_parser.add_argument("--evaluator", default=None, help="评估器名 (默认: 不限)")
+    history_parser.add_argument("--regressions", metavar="RUN_ID", type=int, nargs="?", const=0, default=None,
+                               help="列出该运行中分数下降的用例 (不指定ID时为最近一次运行)")
+    history_parser.add_argument("--baseline", metavar="RUN_ID", type=int, default=None,
+                               help="回退比较的基准运行 (默认: 之前最近一次运行)")
+    history_parser.add_argument("--threshold", type=float, default=0.0,
+                               help="下降超过该值才算回退 (默认: 0)")
+    history_parser.add_argument("--limit", type=int, default=20,
+                               help="最多输出的行数 (默认: 20)")
+    
+    # compare: 比较两次运行或两个系统
+    compare_parser = subparsers.add_parser("compare", help="配对比较两次运行（或两个系统），显著回退时以非零状态退出")
+    compare_parser.add_argument("baseline", help="基准运行：结果目录或运行历史中的运行ID")
+    compare_parser.add_argument("candidate", nargs="?", default=None,
+                               help="候选运行：结果目录或运行ID（省略时用--systems比较基准运行中的两个系统）")
+    compare_parser.add_argument("--systems", nargs=2, metavar=("BASELINE_SYSTEM", "CANDIDATE_SYSTEM"), default=None,
+                               help="要比较的系统")
+    compare_parser.add_argument("--db", default=OUTPUT_CONFIG["run_store_path"] or "results/run_history.db",
+                               help="运行历史数据库 (默认: RUN_STORE_PATH)")
+    compare_parser.add_argument("--metrics", nargs="+", default=None,
+                               help="只比较这些指标（指标或评估器.指标）")
+    compare_parser.add_argument("--test", choices=PAIRED_TESTS, default=COMPARE_CONFIG["test"],
+                               help=f"配对检验方法 (默认: {COMPARE_CONFIG['test']})")
+    compare_parser.add_argument("--alpha", type=float, default=COMPARE_CONFIG["alpha"],
+                               help=f"显著性水平 (默认: {COMPARE_CONFIG['alpha']})")
+    compare_parser.add_argument("--threshold", type=float, default=COMPARE_CONFIG["regression_threshold"],
+                               help=f"单个用例下降超过该值记为回退 (默认: {COMPARE_CONFIG['regression_threshold']})")
+    compare_parser.add_argument("--gate", nargs="+", default=COMPARE_CONFIG["gate_metrics"] or None,
+                               help="门禁指标，显著回退时退出码为2 (默认: COMPARE_GATE_METRICS，为空时全部)")
+    compare_parser.add_argument("--report", default=None, help="比较报告JSON的输出路径")
+    
+    return parser
 
 async def main():
     """主函数"""
-    parser = argparse.ArgumentParser(description="异步多评估器RAG评估系统")
-    parser.add_argument("--test-cases", default="data/test_cases_jp.json", 
-                       help="测试用例文件路径 (默认: data/test_cases_jp.json)")
-    parser.add_argument("--output", default="results", 
-                       help="结果输出目录 (默认: results)")
+    # 兼容旧的调用方式: 不带子命令时等同于run
+    argv = sys.argv[1:]
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["run"] + argv
     
-    args = parser.parse_args()
+    args = build_parser().parse_args(argv)
     
     try:
-        evaluator = AsyncMultiEvaluatorRAGSystem()
-        await evaluator.run(args.test_cases, args.output)
+        if args.command == "history":
+            show_history(args.db, args.system, args.metric, args.evaluator,
+                         args.regressions, args.baseline, args.threshold, args.limit)
+        elif args.command == "compare":
+            exit_code = compare_command(
+                args.baseline, args.candidate, args.systems, args.db, args.metrics,
+                args.test, args.alpha, args.threshold, args.gate, args.report
+            )
+            if exit_code:
+                sys.exit(exit_code)
+        elif args.command == "collect":
+            evaluator = AsyncMultiEvaluatorRAGSystem(require_evaluators=False)
+            await evaluator.collect(args.test_cases, args.output)
+        elif args.command == "evaluate":
+            evaluator = AsyncMultiEvaluatorRAGSystem(require_rag_systems=False)
+            await evaluator.evaluate(args.answers, args.output, args.evaluators)
+        else:
+            evaluator = AsyncMultiEvaluatorRAGSystem()
+            if args.resume:
+                await evaluator.run(args.test_cases, args.resume, resume=True)
+            else:
+                await evaluator.run(args.test_cases, args.output, incremental_from=args.incremental)
     except Exception as e:
         print(f"❌ 评估失败: {e}")
         import traceback
@@ -267,4 +950,4 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
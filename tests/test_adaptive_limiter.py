@@ -0,0 +1,80 @@
+# 自适应并发限制器测试 - 加性增加和每次过载突发只缩减一次
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.adaptive_limiter import AdaptiveLimiter, report_overload
+
+async def run_burst(limiter, count, overload=None, delay=0.01):
+    """并发发出count个请求，overload不为空时每个请求都标记过载"""
+    async def request():
+        async with limiter.slot():
+            await asyncio.sleep(delay)
+            if overload:
+                report_overload(overload)
+
+    await asyncio.gather(*(request() for _ in range(count)))
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def test_increases_after_saturated_round(self):
+        limiter = AdaptiveLimiter("test", 2, max_limit=4)
+
+        async def main():
+            # 每轮发出与上限相同数量的并发请求，上限成为瓶颈且延迟稳定
+            for _ in range(3):
+                await run_burst(limiter, limiter.limit)
+
+        asyncio.run(main())
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.stats["increases"], 2)
+
+    def test_does_not_increase_when_not_saturated(self):
+        limiter = AdaptiveLimiter("test", 4, max_limit=8)
+
+        async def main():
+            for _ in range(8):
+                await run_burst(limiter, 1, delay=0)
+
+        asyncio.run(main())
+        self.assertEqual(limiter.limit, 4)
+
+    def test_one_decrease_per_overload_burst(self):
+        limiter = AdaptiveLimiter("test", 8)
+        asyncio.run(run_burst(limiter, 8, overload="429"))
+
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.stats["decreases"], 1)
+        self.assertEqual(limiter.stats["overloads"], {"429": 8})
+
+    def test_later_burst_decreases_again(self):
+        limiter = AdaptiveLimiter("test", 8, min_limit=3)
+
+        async def main():
+            await run_burst(limiter, 8, overload="5xx")
+            await run_burst(limiter, 4, overload="5xx")
+            await run_burst(limiter, 3, overload="5xx")
+
+        asyncio.run(main())
+        # 8 -> 4 -> 3（不低于下限）
+        self.assertEqual(limiter.limit, 3)
+        self.assertEqual(limiter.stats["decreases"], 2)
+
+    def test_timeout_counts_as_overload(self):
+        limiter = AdaptiveLimiter("test", 4)
+
+        async def main():
+            async with limiter.slot():
+                await asyncio.wait_for(asyncio.sleep(1), timeout=0.01)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(main())
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.stats["overloads"], {"timeout": 1})
+
+if __name__ == "__main__":
+    unittest.main()
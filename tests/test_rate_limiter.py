@@ -0,0 +1,133 @@
+# 速率限制测试 - Retry-After和x-ratelimit-reset解析、RPM/TPM令牌桶
+
+import asyncio
+import sys
+import time
+import unittest
+from email.utils import formatdate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.rate_limiter import TokenBucket, _parse_duration, parse_retry_after
+
+class ParseDurationTest(unittest.TestCase):
+
+    def test_plain_seconds(self):
+        self.assertEqual(_parse_duration("1.5"), 1.5)
+        self.assertEqual(_parse_duration(" 20 "), 20.0)
+
+    def test_openai_durations(self):
+        self.assertEqual(_parse_duration("1s"), 1.0)
+        self.assertEqual(_parse_duration("6m0s"), 360.0)
+        self.assertEqual(_parse_duration("1h2m3s"), 3723.0)
+        self.assertAlmostEqual(_parse_duration("20ms"), 0.02)
+        self.assertAlmostEqual(_parse_duration("1m30.5s"), 90.5)
+
+    def test_invalid(self):
+        self.assertIsNone(_parse_duration("soon"))
+        self.assertIsNone(_parse_duration("10x"))
+        self.assertIsNone(_parse_duration("5m3"))
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_no_headers(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after({}))
+        self.assertIsNone(parse_retry_after({"Content-Type": "application/json"}))
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(parse_retry_after({"Retry-After": "7"}), 7.0)
+
+    def test_retry_after_http_date(self):
+        wait = parse_retry_after({"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+        self.assertGreater(wait, 28)
+        self.assertLessEqual(wait, 30)
+
+    def test_retry_after_date_in_past(self):
+        self.assertEqual(parse_retry_after({"Retry-After": formatdate(time.time() - 60, usegmt=True)}), 0.0)
+
+    def test_openai_reset_headers_use_longest(self):
+        headers = {"x-ratelimit-reset-requests": "2s", "x-ratelimit-reset-tokens": "6m0s"}
+        self.assertEqual(parse_retry_after(headers), 360.0)
+
+    def test_retry_after_takes_precedence(self):
+        self.assertEqual(parse_retry_after({"Retry-After": "3", "x-ratelimit-reset-tokens": "6m0s"}), 3.0)
+
+    def test_reset_timestamp_milliseconds(self):
+        wait = parse_retry_after({"x-ratelimit-reset": str(int((time.time() + 10) * 1000))})
+        self.assertGreater(wait, 8)
+        self.assertLessEqual(wait, 10)
+
+    def test_reset_timestamp_seconds(self):
+        wait = parse_retry_after({"x-ratelimit-reset": str(int(time.time()) + 10)})
+        self.assertGreater(wait, 8)
+        self.assertLessEqual(wait, 10)
+
+    def test_reset_remaining_seconds(self):
+        self.assertEqual(parse_retry_after({"x-ratelimit-reset": "12"}), 12.0)
+
+    def test_invalid_reset(self):
+        self.assertIsNone(parse_retry_after({"x-ratelimit-reset": "later"}))
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_unlimited_does_not_wait(self):
+        bucket = TokenBucket("test")
+
+        async def main():
+            return [await bucket.acquire(1000) for _ in range(5)]
+
+        self.assertEqual(asyncio.run(main()), [0.0] * 5)
+        self.assertEqual(bucket.stats["tokens"], 5000)
+
+    def test_rpm_waits_after_burst(self):
+        # 每秒10个请求，容量1个
+        bucket = TokenBucket("test", rpm=600, burst_seconds=0.1)
+
+        async def main():
+            return [await bucket.acquire() for _ in range(3)]
+
+        waits = asyncio.run(main())
+        self.assertLess(waits[0], 0.01)
+        self.assertGreater(waits[1], 0.05)
+        self.assertGreater(waits[2], 0.05)
+        self.assertEqual(bucket.stats["waits"], 2)
+
+    def test_tpm_waits_for_tokens(self):
+        # 每秒1000个token，容量100个
+        bucket = TokenBucket("test", tpm=60000, burst_seconds=0.1)
+
+        async def main():
+            return await bucket.acquire(100), await bucket.acquire(50)
+
+        first, second = asyncio.run(main())
+        self.assertLess(first, 0.01)
+        self.assertGreater(second, 0.03)
+
+    def test_record_usage_corrects_estimate(self):
+        bucket = TokenBucket("test", tpm=60000, burst_seconds=0.1)
+
+        async def main():
+            await bucket.acquire(10)
+            # 实际用量比估计多90个token，桶中的额度随之扣除
+            bucket.record_usage(100, 10)
+            return await bucket.acquire(50)
+
+        self.assertGreater(asyncio.run(main()), 0.03)
+        self.assertEqual(bucket.stats["tokens"], 150)
+
+    def test_rate_limited_pauses_bucket(self):
+        bucket = TokenBucket("test")
+
+        async def main():
+            retry_after = bucket.on_rate_limited({"Retry-After": "0.1"})
+            return retry_after, await bucket.acquire()
+
+        retry_after, waited = asyncio.run(main())
+        self.assertEqual(retry_after, 0.1)
+        self.assertGreater(waited, 0.05)
+        self.assertEqual(bucket.stats["rate_limited"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
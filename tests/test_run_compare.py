@@ -0,0 +1,105 @@
+# 运行比较测试 - 回退门禁和配对显著性检验
+
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.run_compare import RunScores, compare_runs
+from utils.statistics import paired_test, permutation_test, wilcoxon_test
+
+CASES = [f"case{i}" for i in range(20)]
+
+def make_run(label, relevancy, correctness=None):
+    """一个系统dify、评估器academic的运行分数"""
+    run = RunScores(label, ["dify"])
+    for i, case_key in enumerate(CASES):
+        run.questions[case_key] = f"问题{i}"
+        run.add("dify", "academic", "relevancy", case_key, relevancy[i])
+        run.add("dify", "academic", "correctness", case_key, (correctness or relevancy)[i])
+    return run
+
+class CompareGateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.baseline = make_run("base", [0.8] * len(CASES))
+
+    def compare(self, candidate, **kwargs):
+        return compare_runs(self.baseline, candidate, [("dify", "dify")], n_resamples=2000, **kwargs)
+
+    def test_significant_regression_fails_gate(self):
+        report = self.compare(make_run("cand", [0.4] * len(CASES), [0.8] * len(CASES)), gate_metrics=["relevancy"])
+        self.assertEqual(report["failed"], ["dify academic.relevancy"])
+
+    def test_regression_outside_gate_passes(self):
+        report = self.compare(make_run("cand", [0.4] * len(CASES), [0.8] * len(CASES)),
+                              gate_metrics=["academic.correctness"])
+        self.assertEqual(report["failed"], [])
+
+    def test_unchanged_run_passes(self):
+        self.assertEqual(self.compare(make_run("cand", [0.8] * len(CASES)))["failed"], [])
+
+    def test_missing_candidate_scores_fail_gate(self):
+        # 候选运行中的评价全部失败，分数都为None
+        report = self.compare(make_run("cand", [None] * len(CASES)), gate_metrics=["relevancy"])
+        self.assertEqual(len(report["failed"]), 1)
+        self.assertIn("academic.relevancy", report["failed"][0])
+        relevancy = [c for c in report["comparisons"] if c["metric"] == "relevancy"][0]
+        self.assertEqual(relevancy["count"], 0)
+
+    def test_no_overlapping_cases_fail_gate(self):
+        candidate = RunScores("cand", ["dify"])
+        candidate.add("dify", "academic", "relevancy", "other-case", 0.9)
+        report = self.compare(candidate, gate_metrics=["relevancy"])
+        self.assertEqual(len(report["failed"]), 1)
+
+    def test_unknown_gate_metric_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.compare(make_run("cand", [0.4] * len(CASES)), gate_metrics=["relevance"])
+
+    def test_unknown_compared_metric_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.compare(make_run("cand", [0.8] * len(CASES)), metrics=["academic.relevance"])
+
+class PairedTestTest(unittest.TestCase):
+
+    def test_permutation_detects_consistent_shift(self):
+        diff = np.full(20, -0.3) + np.linspace(-0.05, 0.05, 20)
+        self.assertLess(permutation_test(diff, n_resamples=2000), 0.01)
+
+    def test_permutation_symmetric_differences_not_significant(self):
+        diff = np.array([0.1, -0.1] * 10)
+        self.assertGreater(permutation_test(diff, n_resamples=2000), 0.5)
+
+    def test_permutation_all_zero_has_no_p_value(self):
+        self.assertIsNone(permutation_test(np.zeros(5)))
+
+    def test_wilcoxon_matches_normal_approximation(self):
+        # 10个全为正的差异: W+=55, 均值27.5, 方差96.25, 连续性修正后z=27/sqrt(96.25)
+        p_value = wilcoxon_test(np.arange(1, 11, dtype=np.float64))
+        self.assertAlmostEqual(p_value, 0.005922, places=5)
+
+    def test_wilcoxon_ignores_zero_differences(self):
+        self.assertIsNone(wilcoxon_test([0.0, 0.0]))
+        self.assertAlmostEqual(wilcoxon_test([0.0, 1.0, 2.0]), wilcoxon_test([1.0, 2.0]))
+
+    def test_paired_test_skips_missing_pairs(self):
+        result = paired_test([0.5, None, 0.9, 0.7], [0.4, 0.3, None, 0.6], test="wilcoxon")
+        self.assertEqual(result["count"], 2)
+        self.assertAlmostEqual(result["mean_diff"], 0.1)
+        self.assertEqual(result["test"], "wilcoxon")
+
+    def test_paired_test_without_pairs(self):
+        result = paired_test([None], [0.5])
+        self.assertEqual(result["count"], 0)
+        self.assertIsNone(result["p_value"])
+
+    def test_paired_test_rejects_unknown_method(self):
+        with self.assertRaises(ValueError):
+            paired_test([0.1], [0.2], test="ttest")
+
+if __name__ == "__main__":
+    unittest.main()
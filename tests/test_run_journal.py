@@ -0,0 +1,91 @@
+# 运行日志测试 - 失败的评价在 --resume / --incremental 时不被复用
+
+import asyncio
+import importlib.util
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.run_journal import RunJournal
+
+HAS_EVALUATOR_DEPS = all(
+    importlib.util.find_spec(name) is not None for name in ("langchain_openai", "ragas", "datasets")
+)
+
+def make_items():
+    """两个系统对同一用例的评价项"""
+    case_key = RunJournal.case_key("问题", "标准答案")
+    return [
+        {"system": system, "index": 0, "case_key": case_key, "question": "问题",
+         "answer": f"{system}的回答", "ground_truth": "标准答案", "contexts": None}
+        for system in ("dify", "ragflow")
+    ]
+
+class RunJournalResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.run_dir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_failed_score_is_not_reused(self):
+        items = make_items()
+        journal = RunJournal(self.run_dir)
+        journal.record_scores("academic", items, [
+            ({"correctness": 0.8}, None),
+            ({"correctness": None}, "单个评价失败: 聊天模型请求失败: 503 - busy")
+        ], ["fp-dify", "fp-ragflow"])
+        journal.close()
+
+        state = RunJournal.load(self.run_dir)
+        self.assertEqual(state.get_score("academic", "dify", items[0]["case_key"], "fp-dify"),
+                         ({"correctness": 0.8}, None))
+        self.assertIsNone(state.get_score("academic", "ragflow", items[1]["case_key"], "fp-ragflow"))
+
+    def test_retried_score_replaces_failure_on_resume(self):
+        items = make_items()[:1]
+        journal = RunJournal(self.run_dir)
+        journal.record_scores("academic", items, [({"correctness": None}, "单个评价超时（60秒）")])
+        journal.close()
+
+        journal = RunJournal(self.run_dir, resume=True)
+        journal.record_scores("academic", items, [({"correctness": 0.6}, None)])
+        journal.close()
+
+        state = RunJournal.load(self.run_dir)
+        self.assertEqual(state.get_score("academic", "dify", items[0]["case_key"]), ({"correctness": 0.6}, None))
+
+    @unittest.skipUnless(HAS_EVALUATOR_DEPS, "需要langchain_openai、ragas和datasets")
+    def test_failing_judge_is_not_reused_on_resume(self):
+        from evaluators.async_academic_evaluator import AsyncAcademicEvaluator
+
+        evaluator = AsyncAcademicEvaluator({
+            "api_key": "test", "base_url": "http://127.0.0.1:9", "judge_batch_questions": 0
+        })
+
+        async def failing_judge(prompt, timeout):
+            raise Exception("聊天模型请求失败: 503 - busy")
+
+        evaluator._post_chat_completion = failing_judge
+        items = make_items()
+        results = asyncio.run(evaluator.evaluate_items_async(items))
+
+        for scores, error in results:
+            self.assertIsNotNone(error)
+            self.assertTrue(all(value is None for value in scores.values()))
+
+        journal = RunJournal(self.run_dir)
+        journal.record_scores(evaluator.name, items, results)
+        journal.close()
+
+        state = RunJournal.load(self.run_dir)
+        for item in items:
+            self.assertIsNone(state.get_score(evaluator.name, item["system"], item["case_key"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+# 流式响应测试 - SSE事件解析和计时
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.sse import StreamTimer, iter_sse_events
+
+async def lines(chunks):
+    """模拟aiohttp的response.content：按行产出bytes"""
+    for chunk in chunks:
+        yield chunk
+
+def parse(chunks):
+    async def collect():
+        return [event async for event in iter_sse_events(lines(chunks))]
+    return asyncio.run(collect())
+
+class IterSSEEventsTest(unittest.TestCase):
+
+    def test_single_data_events(self):
+        events = parse([b'data: {"answer": "a"}\n', b"\n", b'data: {"answer": "b"}\n', b"\n"])
+        self.assertEqual(events, [("message", '{"answer": "a"}'), ("message", '{"answer": "b"}')])
+
+    def test_multi_line_data_joined_with_newline(self):
+        events = parse([b"data: first\n", b"data: second\n", b"data:third\n", b"\n"])
+        self.assertEqual(events, [("message", "first\nsecond\nthird")])
+
+    def test_event_field_and_reset(self):
+        events = parse([
+            b"event: message_end\n", b'data: {"id": 1}\n', b"\n",
+            b"data: plain\n", b"\n"
+        ])
+        self.assertEqual(events, [("message_end", '{"id": 1}'), ("message", "plain")])
+
+    def test_comments_crlf_and_unknown_fields(self):
+        events = parse([b": keep-alive\r\n", b"id: 7\r\n", b"retry: 1000\r\n", b"data: x\r\n", b"\r\n"])
+        self.assertEqual(events, [("message", "x")])
+
+    def test_event_without_data_is_skipped(self):
+        self.assertEqual(parse([b"event: ping\n", b"\n"]), [])
+
+    def test_trailing_event_without_blank_line(self):
+        self.assertEqual(parse([b"event: done\n", b"data: [DONE]\n"]), [("done", "[DONE]")])
+
+    def test_str_lines_and_utf8(self):
+        events = parse(["data: 你好\n", "\n", "data: 世界\n".encode("utf-8"), b"\n"])
+        self.assertEqual(events, [("message", "你好"), ("message", "世界")])
+
+class StreamTimerTest(unittest.TestCase):
+
+    def test_no_tokens(self):
+        result = StreamTimer().result()
+        self.assertIsNone(result["ttft"])
+        self.assertIsNone(result["inter_token_latency"])
+        self.assertEqual(result["chunks"], 0)
+
+    def test_tokens(self):
+        timer = StreamTimer()
+        for _ in range(3):
+            timer.token()
+        result = timer.result()
+        self.assertIsNotNone(result["ttft"])
+        self.assertIsNotNone(result["inter_token_latency"])
+        self.assertEqual(result["chunks"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
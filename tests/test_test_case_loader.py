@@ -0,0 +1,78 @@
+# 测试用例加载测试 - JSON数组增量解析（元素跨分块边界）
+
+import io
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import test_case_loader
+from utils.test_case_loader import _iter_json_array, count_test_cases, iter_test_cases
+
+CASES = [
+    {"question": "什么是RAG？", "ground_truth": "检索增强生成", "score": 12345},
+    {"question": "含有 ] 和 , 的问题", "ground_truth": "转义 \" 和 \\ 以及 {\"嵌套\": [1, 2]}", "tags": ["a", "b"]},
+    {"question": "q3", "ground_truth": "g3", "weight": 0.125, "extra": None, "flag": True}
+]
+
+def parse(text, chunk_size):
+    with mock.patch.object(test_case_loader, "JSON_CHUNK_SIZE", chunk_size):
+        return list(_iter_json_array(io.StringIO(text)))
+
+class IterJsonArrayTest(unittest.TestCase):
+
+    def test_elements_straddling_every_chunk_boundary(self):
+        text = json.dumps(CASES, ensure_ascii=False, indent=2)
+        # 每种分块大小都会把元素、字符串和数字切在不同位置
+        for chunk_size in range(1, len(text) + 2):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(parse(text, chunk_size), CASES)
+
+    def test_scalars_cut_at_chunk_boundary(self):
+        text = "[12345, 67.5, -2.5e-3, true, null, \"x\"]"
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(parse(text, chunk_size), [12345, 67.5, -0.0025, True, None, "x"])
+
+    def test_empty_array_and_whitespace(self):
+        self.assertEqual(parse("  \n[ \n ]  ", 2), [])
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            parse('{"question": "q"}', 4)
+        with self.assertRaises(ValueError):
+            parse("", 4)
+
+    def test_truncated_array(self):
+        with self.assertRaises(ValueError):
+            parse('[{"question": "q", "ground_truth": "g"}', 5)
+        with self.assertRaises(ValueError):
+            parse('[{"question": "q", "ground_tr', 5)
+
+    def test_missing_comma(self):
+        with self.assertRaises(ValueError):
+            parse('[{"a": 1} {"b": 2}]', 3)
+
+class IterTestCasesTest(unittest.TestCase):
+
+    def test_json_file_with_small_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cases.json"
+            path.write_text(json.dumps(CASES, ensure_ascii=False), encoding="utf-8")
+            with mock.patch.object(test_case_loader, "JSON_CHUNK_SIZE", 7):
+                self.assertEqual(list(iter_test_cases(str(path))), CASES)
+                self.assertEqual(count_test_cases(str(path)), len(CASES))
+
+    def test_missing_required_field(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cases.json"
+            path.write_text('[{"question": "q"}]', encoding="utf-8")
+            with self.assertRaises(ValueError):
+                list(iter_test_cases(str(path)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,283 @@
+# 自适应并发控制 - 按上游（RAG系统、评分模型、嵌入服务）独立的AIMD并发上限
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from utils.telemetry import add_queue_wait
+
+logger = logging.getLogger(__name__)
+
+# 并发上限变化历史的最大记录数（超过后只更新最终值）
+MAX_HISTORY = 1000
+
+class _SlotState:
+    """一次请求在槽位内的状态（由上游调用处标记过载原因）"""
+
+    __slots__ = ("overload",)
+
+    def __init__(self):
+        self.overload: Optional[str] = None
+
+# 当前任务正在使用的槽位，连接器和评价器通过report_overload/note_http_status标记
+_current_slot: ContextVar[Optional[_SlotState]] = ContextVar("adaptive_limiter_slot", default=None)
+
+def report_overload(reason: str):
+    """
+    标记当前槽位内的请求遇到了上游过载（不在槽位内调用时忽略）
+
+    Args:
+        reason: 过载原因，例如"429"、"5xx"、"timeout"
+    """
+    state = _current_slot.get()
+    if state is not None and state.overload is None:
+        state.overload = reason
+
+def note_http_status(status: int):
+    """
+    根据上游HTTP状态码标记过载：429和5xx视为过载，其他状态码忽略
+
+    Args:
+        status: HTTP状态码
+    """
+    if status == 429:
+        report_overload("429")
+    elif status >= 500:
+        report_overload("5xx")
+
+class AdaptiveLimiter:
+    """AIMD并发限制器
+
+    每完成约limit个成功请求为一轮：本轮达到过并发上限且窗口p95延迟不超过基线的latency_tolerance倍时，
+    上限加increase_step；遇到429/5xx/超时时上限乘以decrease_factor。同一次缩减之前发出的请求
+    不会再次触发缩减，避免一批过载响应把上限连续减到下限。
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int = 1, max_limit: int = 32,
+                 increase_step: int = 1, decrease_factor: float = 0.5, latency_tolerance: float = 1.5,
+                 window: int = 50):
+        """
+        初始化限制器
+
+        Args:
+            name: 上游名称（写入运行摘要）
+            initial: 初始并发上限
+            min_limit: 并发下限
+            max_limit: 并发上限
+            increase_step: 每轮增加的并发数
+            decrease_factor: 过载时的缩减倍数
+            latency_tolerance: p95延迟相对基线的容忍倍数
+            window: 计算p95的最近成功请求数
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.initial = min(self.max_limit, max(self.min_limit, initial))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+
+        self._limit = self.initial
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        self._latencies: deque = deque(maxlen=window)
+        self._round_successes = 0
+        self._round_peak = 0
+        self._baseline_p95: Optional[float] = None
+        self._last_decrease = 0.0
+        self._started = time.monotonic()
+
+        self.history: List[Dict[str, Any]] = [{"t": 0.0, "limit": self._limit, "reason": "initial"}]
+        self.stats = {"requests": 0, "successes": 0, "increases": 0, "decreases": 0, "overloads": {}}
+        self._lowest = self._limit
+        self._highest = self._limit
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return self._limit
+
+    async def acquire(self):
+        """获取一个并发槽位（已满时按先来先到等待）"""
+        if self._in_flight < self._limit and not self._waiters:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配到槽位但等待者被取消，归还槽位
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self):
+        """归还一个并发槽位"""
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        """在上限允许的范围内唤醒等待者"""
+        while self._waiters and self._in_flight < self._limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        占用一个槽位执行一次上游请求，结束时根据耗时和过载标记调整上限
+
+        槽位内的代码可以调用report_overload/note_http_status标记过载；
+        抛出TimeoutError视为超时过载，其他异常不计入延迟样本。
+        """
+        queued = time.monotonic()
+        await self.acquire()
+        add_queue_wait(time.monotonic() - queued)
+        self._round_peak = max(self._round_peak, self._in_flight)
+        state = _SlotState()
+        token = _current_slot.set(state)
+        started = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        except asyncio.TimeoutError:
+            report_overload("timeout")
+            raise
+        finally:
+            _current_slot.reset(token)
+            self.release()
+            self.stats["requests"] += 1
+            if state.overload is not None:
+                self._on_overload(state.overload, started)
+            elif succeeded:
+                self._on_success(time.monotonic() - started)
+
+    def _on_success(self, latency: float):
+        """记录成功请求，一轮结束时按p95延迟决定是否加性增加"""
+        self.stats["successes"] += 1
+        self._latencies.append(latency)
+        self._round_successes += 1
+        if self._round_successes < self._limit:
+            return
+
+        saturated = self._round_peak >= self._limit
+        self._round_successes = 0
+        self._round_peak = self._in_flight
+
+        p95 = float(np.percentile(np.fromiter(self._latencies, dtype=np.float64), 95))
+        if self._baseline_p95 is None or p95 < self._baseline_p95:
+            self._baseline_p95 = p95
+
+        # 只有上限确实成为瓶颈、且延迟没有明显上升时才增加
+        if saturated and self._limit < self.max_limit and p95 <= self._baseline_p95 * self.latency_tolerance:
+            self._set_limit(min(self.max_limit, self._limit + self.increase_step), "increase")
+            self.stats["increases"] += 1
+            self._wake()
+
+    def _on_overload(self, reason: str, started: float):
+        """遇到过载时乘性缩减（只对上次缩减之后发出的请求生效）"""
+        overloads = self.stats["overloads"]
+        overloads[reason] = overloads.get(reason, 0) + 1
+        if started < self._last_decrease:
+            return
+
+        self._last_decrease = time.monotonic()
+        self._round_successes = 0
+        self._round_peak = self._in_flight
+        new_limit = max(self.min_limit, int(self._limit * self.decrease_factor))
+        if new_limit < self._limit:
+            self._set_limit(new_limit, reason)
+            self.stats["decreases"] += 1
+            logger.info(f"{self.name} 并发上限降至 {new_limit}（{reason}）")
+
+    def _set_limit(self, limit: int, reason: str):
+        """更新上限并记录历史"""
+        self._limit = limit
+        self._lowest = min(self._lowest, limit)
+        self._highest = max(self._highest, limit)
+        if len(self.history) < MAX_HISTORY:
+            self.history.append({"t": round(time.monotonic() - self._started, 3), "limit": limit, "reason": reason})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取限制器统计信息（写入运行摘要）
+
+        Returns:
+            {initial, final, lowest, highest, min, max, in_flight, waiting, p95_latency, baseline_p95,
+             requests, successes, increases, decreases, overloads, history}
+        """
+        p95 = float(np.percentile(np.fromiter(self._latencies, dtype=np.float64), 95)) if self._latencies else None
+        return {
+            "initial": self.initial,
+            "final": self._limit,
+            "lowest": self._lowest,
+            "highest": self._highest,
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "p95_latency": p95,
+            "baseline_p95": self._baseline_p95,
+            **self.stats,
+            "history": list(self.history)
+        }
+
+# 全局限制器注册表：上游名称 -> 限制器
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+def get_limiter(name: str, initial: int) -> AdaptiveLimiter:
+    """
+    获取（或按ASYNC_CONFIG创建）指定上游的限制器
+
+    禁用自适应并发时上下限都固定为initial，等同于固定大小的信号量。
+
+    Args:
+        name: 上游名称，例如"rag:dify"、"judge:academic"、"embedding"
+        initial: 初始并发上限
+
+    Returns:
+        该上游共享的限制器
+    """
+    limiter = _limiters.get(name)
+    if limiter is not None:
+        return limiter
+
+    from utils.async_config import get_async_config
+    adaptive = get_async_config().get_adaptive_config()
+    if adaptive["enabled"]:
+        limiter = AdaptiveLimiter(
+            name, initial,
+            min_limit=adaptive["min_concurrency"],
+            max_limit=adaptive["max_concurrency"],
+            decrease_factor=adaptive["decrease_factor"],
+            latency_tolerance=adaptive["latency_tolerance"]
+        )
+    else:
+        limiter = AdaptiveLimiter(name, initial, min_limit=initial, max_limit=initial)
+    _limiters[name] = limiter
+    return limiter
+
+def get_all_limiter_stats() -> Dict[str, Any]:
+    """
+    获取所有限制器的统计信息
+
+    Returns:
+        {上游名称: 统计信息}
+    """
+    return {name: limiter.get_stats() for name, limiter in _limiters.items()}
@@ -0,0 +1,127 @@
+# 回答文件 - collect阶段保存的RAG回答，evaluate阶段可以反复读取评估
+
+import gzip
+import json
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Iterator
+
+def _open_text(path: Path, mode: str):
+    """按扩展名打开文本文件（.gz自动压缩）"""
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+class AnswersArtifactWriter:
+    """回答文件写入器
+
+    JSONL格式，第一行为元数据，之后每个用例一行（按完成顺序写入）:
+        {"type": "meta", "test_cases": ..., "systems": [...], "created_at": ...}
+        {"type": "case", "index": 0, "case_key": ..., "question": ..., "ground_truth": ...,
+         "answers": {系统名: {"answer": ..., "contexts": [...], "latency": 秒, "timing": {...}, "telemetry": {...}, "error": ...}}}
+
+    文件名以.gz结尾时使用gzip压缩。
+    """
+
+    def __init__(self, path: str, test_cases_file: str, systems: List[str]):
+        """
+        初始化回答文件写入器
+
+        Args:
+            path: 回答文件路径
+            test_cases_file: 测试用例文件路径
+            systems: RAG系统名列表
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = _open_text(self.path, "w")
+        self.count = 0
+        self._write({
+            "type": "meta",
+            "test_cases": str(test_cases_file),
+            "systems": systems,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        })
+
+    def _write(self, record: Dict[str, Any]):
+        """写入一行记录"""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def write_case(self, index: int, case_key: str, test_case: Dict[str, Any], answers: Dict[str, Dict[str, Any]]):
+        """
+        写入一个用例所有系统的回答
+
+        Args:
+            index: 用例在测试文件中的位置
+            case_key: 用例键
+            test_case: 测试用例（question、ground_truth）
+            answers: {系统名: 查询结果}
+        """
+        self._write({
+            "type": "case",
+            "index": index,
+            "case_key": case_key,
+            "question": test_case["question"],
+            "ground_truth": test_case["ground_truth"],
+            "answers": {
+                system_name: {
+                    "answer": result.get("answer", ""),
+                    "contexts": result.get("contexts", []),
+                    "latency": result.get("latency"),
+                    "timing": result.get("timing"),
+                    "telemetry": result.get("telemetry"),
+                    "error": result.get("error")
+                }
+                for system_name, result in answers.items()
+            }
+        })
+        self.count += 1
+
+    def close(self):
+        """关闭文件"""
+        self._file.close()
+
+def iter_answers_artifact(path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    流式读取回答文件
+
+    Args:
+        path: 回答文件路径
+
+    Returns:
+        (元数据, 按文件顺序产出用例记录的迭代器)
+    """
+    try:
+        with _open_text(Path(path), "r") as f:
+            first_line = f.readline()
+        meta = json.loads(first_line) if first_line.strip() else {}
+    except Exception as e:
+        raise ValueError(f"回答文件加载失败 {path}: {e}")
+
+    if meta.get("type") != "meta":
+        raise ValueError(f"回答文件缺少元数据行: {path}")
+
+    def iter_cases() -> Iterator[Dict[str, Any]]:
+        with _open_text(Path(path), "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("type") == "case":
+                    yield record
+
+    return meta, iter_cases()
+
+def count_answers_artifact(path: str) -> int:
+    """
+    统计回答文件中的用例数（不解析JSON）
+
+    Args:
+        path: 回答文件路径
+
+    Returns:
+        用例数
+    """
+    with _open_text(Path(path), "r") as f:
+        return sum(1 for line in f if line.startswith('{"type": "case"'))
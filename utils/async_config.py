@@ -30,14 +30,40 @@ class AsyncConfigManager:
         """获取并发配置"""
         return {
             "max_concurrency": self.config["max_concurrency"],
-            "batch_size": self.config["batch_size"]
+            "evaluator_max_concurrency": self.config["evaluator_max_concurrency"],
+            "batch_size": self.config["batch_size"],
+            "judge_concurrency": self.config["judge_concurrency"],
+            "pipeline_queue_size": self.config["pipeline_queue_size"]
+        }
+    
+    def get_adaptive_config(self) -> Dict[str, Any]:
+        """获取自适应并发配置"""
+        return {
+            "enabled": self.config["adaptive_concurrency"],
+            "min_concurrency": self.config["adaptive_min_concurrency"],
+            # 上限不超过每个主机的连接池大小：超出的请求只会在连接池中排队，
+            # 排队时间被计入延迟，限制器会误判为上游变慢
+            "max_concurrency": min(self.config["adaptive_max_concurrency"], self.config["http_pool_size"]),
+            "decrease_factor": self.config["adaptive_decrease_factor"],
+            "latency_tolerance": self.config["adaptive_latency_tolerance"],
+            "embedding_concurrency": self.config["adaptive_embedding_concurrency"]
         }
     
     def get_retry_config(self) -> Dict[str, Any]:
         """获取重试配置"""
         return {
             "retry_attempts": self.config["retry_attempts"],
-            "retry_delay": self.config["retry_delay"]
+            "retry_delay": self.config["retry_delay"],
+            "retry_max_delay": self.config["retry_max_delay"]
+        }
+    
+    def get_circuit_breaker_config(self) -> Dict[str, Any]:
+        """获取熔断器配置"""
+        return {
+            "enabled": self.config["circuit_breaker_enabled"],
+            "failure_threshold": self.config["circuit_failure_threshold"],
+            "cooldown": self.config["circuit_cooldown"],
+            "half_open_probes": self.config["circuit_half_open_probes"]
         }
     
     def get_http_config(self) -> Dict[str, int]:
@@ -45,7 +71,9 @@ class AsyncConfigManager:
         return {
             "timeout": self.config["http_timeout"],
             "pool_size": self.config["http_pool_size"],
-            "max_connections": self.config["http_max_connections"]
+            "max_connections": self.config["http_max_connections"],
+            "dns_cache_ttl": self.config["http_dns_cache_ttl"],
+            "keepalive_timeout": self.config["http_keepalive_timeout"]
         }
     
     def get_progress_config(self) -> Dict[str, Any]:
@@ -80,9 +108,30 @@ class AsyncConfigManager:
             if self.config["max_concurrency"] <= 0:
                 raise ValueError("Max concurrency must be positive")
             
+            if self.config["evaluator_max_concurrency"] <= 0:
+                raise ValueError("Evaluator max concurrency must be positive")
+            
             if self.config["batch_size"] <= 0:
                 raise ValueError("Batch size must be positive")
             
+            if self.config["judge_concurrency"] <= 0:
+                raise ValueError("Judge concurrency must be positive")
+            
+            if self.config["pipeline_queue_size"] <= 0:
+                raise ValueError("Pipeline queue size must be positive")
+            
+            if not 1 <= self.config["adaptive_min_concurrency"] <= self.config["adaptive_max_concurrency"]:
+                raise ValueError("Adaptive concurrency bounds must satisfy 1 <= min <= max")
+            
+            if self.config["adaptive_min_concurrency"] > self.config["http_pool_size"]:
+                raise ValueError("Adaptive min concurrency must not exceed HTTP pool size")
+            
+            if not 0 < self.config["adaptive_decrease_factor"] < 1:
+                raise ValueError("Adaptive decrease factor must be between 0 and 1")
+            
+            if self.config["adaptive_latency_tolerance"] < 1:
+                raise ValueError("Adaptive latency tolerance must be at least 1")
+            
             # 检查重试配置
             if self.config["retry_attempts"] < 0:
                 raise ValueError("Retry attempts must be non-negative")
@@ -90,6 +139,19 @@ class AsyncConfigManager:
             if self.config["retry_delay"] < 0:
                 raise ValueError("Retry delay must be non-negative")
             
+            if self.config["retry_max_delay"] < self.config["retry_delay"]:
+                raise ValueError("Retry max delay must not be less than retry delay")
+            
+            # 检查熔断器配置
+            if self.config["circuit_failure_threshold"] <= 0:
+                raise ValueError("Circuit failure threshold must be positive")
+            
+            if self.config["circuit_cooldown"] < 0:
+                raise ValueError("Circuit cooldown must be non-negative")
+            
+            if self.config["circuit_half_open_probes"] <= 0:
+                raise ValueError("Circuit half-open probes must be positive")
+            
             # 检查HTTP配置
             if self.config["http_timeout"] <= 0:
                 raise ValueError("HTTP timeout must be positive")
@@ -100,6 +162,9 @@ class AsyncConfigManager:
             if self.config["http_max_connections"] <= 0:
                 raise ValueError("HTTP max connections must be positive")
             
+            if self.config["http_dns_cache_ttl"] < 0:
+                raise ValueError("HTTP DNS cache TTL must be non-negative")
+            
             # 检查进度配置
             if self.config["progress_update_interval"] <= 0:
                 raise ValueError("Progress update interval must be positive")
@@ -121,15 +186,26 @@ class AsyncConfigManager:
 
 并发配置:
   最大并发数: {self.config['max_concurrency']}
+  评价器最大并发数: {self.config['evaluator_max_concurrency']}
   批处理大小: {self.config['batch_size']}
+  评分阶段并发数: {self.config['judge_concurrency']}
+  流水线队列容量: {self.config['pipeline_queue_size']}
+  自适应并发: {'启用' if self.config['adaptive_concurrency'] else '禁用'} ({self.config['adaptive_min_concurrency']}-{self.get_adaptive_config()['max_concurrency']})
 
 重试配置:
   重试次数: {self.config['retry_attempts']}
-  重试延迟: {self.config['retry_delay']}秒
+  重试延迟: {self.config['retry_delay']}秒（上限 {self.config['retry_max_delay']}秒）
+
+熔断器配置:
+  启用状态: {'启用' if self.config['circuit_breaker_enabled'] else '禁用'}
+  连续失败阈值: {self.config['circuit_failure_threshold']}
+  冷却时间: {self.config['circuit_cooldown']}秒
 
 HTTP配置:
   连接池大小: {self.config['http_pool_size']}
   最大连接数: {self.config['http_max_connections']}
+  DNS缓存时间: {self.config['http_dns_cache_ttl']}秒
+  保活时间: {self.config['http_keepalive_timeout']}秒
 
 进度跟踪:
   启用状态: {'启用' if self.config['progress_enabled'] else '禁用'}
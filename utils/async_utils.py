@@ -1,18 +1,25 @@
 # 异步工具类 - 提供通用的异步操作工具
 
 import asyncio
+import random
 import time
 import sys
 import os
-from typing import Any, Dict, List, Optional, Callable
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional, Callable, Iterable, Awaitable, AsyncIterator, Tuple
 from concurrent.futures import ThreadPoolExecutor
 import logging
 
 # 添加路径以便导入配置管理器
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from utils.telemetry import note_retry, track
+
 logger = logging.getLogger(__name__)
 
+# 工作池中worker结束的标记
+_WORKER_DONE = object()
+
 class AsyncUtils:
     """异步工具类"""
     
@@ -28,7 +35,7 @@ class AsyncUtils:
             self.config = config_manager
         else:
             try:
-                from async_config import get_async_config
+                from utils.async_config import get_async_config
                 self.config = get_async_config()
             except ImportError:
                 self.config = None
@@ -52,56 +59,155 @@ class AsyncUtils:
             result = await loop.run_in_executor(executor, func, *args, **kwargs)
             return result
     
-    async def gather_with_concurrency(self, tasks: List[asyncio.Task], concurrency: int = None) -> List[Any]:
+    @staticmethod
+    def _default_concurrency() -> int:
+        """从异步配置中读取默认并发数"""
+        try:
+            from utils.async_config import get_async_config
+            return get_async_config().get_concurrency_config()["max_concurrency"]
+        except ImportError:
+            return 3  # 默认值
+    
+    @staticmethod
+    async def iter_bounded(
+        factories: Iterable[Callable[[], Awaitable[Any]]],
+        concurrency: int = 3
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        有界工作池 - 按完成顺序流式产出结果
+        
+        固定数量的worker从同一个迭代器中逐个取出协程工厂并执行，一个任务完成后立即开始下一个，
+        不存在批次屏障；协程只在轮到执行时才被创建。
+        
+        Args:
+            factories: 协程工厂（无参可调用对象，返回awaitable），可以是惰性迭代器
+            concurrency: 最大并发数
+            
+        Yields:
+            (索引, 结果)，任务抛出的异常作为结果返回
+        """
+        concurrency = max(1, concurrency)
+        pending = enumerate(factories)
+        # 有界队列：消费者处理慢时worker暂停取新任务，形成背压
+        results_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        
+        async def worker():
+            # 所有worker共享同一个迭代器，各自取下一个未处理的任务
+            for index, factory in pending:
+                try:
+                    result = await factory()
+                except Exception as e:
+                    result = e
+                await results_queue.put((index, result))
+            await results_queue.put(_WORKER_DONE)
+        
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        running = len(workers)
+        
+        try:
+            while running:
+                item = await results_queue.get()
+                if item is _WORKER_DONE:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            for task in workers:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    @staticmethod
+    async def run_bounded(
+        factories: Iterable[Callable[[], Awaitable[Any]]],
+        concurrency: int = 3,
+        return_exceptions: bool = True
+    ) -> List[Any]:
+        """
+        有界工作池 - 按输入顺序返回全部结果
+        
+        Args:
+            factories: 协程工厂（无参可调用对象，返回awaitable）
+            concurrency: 最大并发数
+            return_exceptions: 为True时异常作为对应位置的结果返回，否则遇到第一个异常即抛出
+            
+        Returns:
+            与输入顺序一致的结果列表
+        """
+        results: Dict[int, Any] = {}
+        
+        async with aclosing(AsyncUtils.iter_bounded(factories, concurrency)) as stream:
+            async for index, result in stream:
+                if not return_exceptions and isinstance(result, Exception):
+                    raise result
+                results[index] = result
+        
+        return [results[i] for i in range(len(results))]
+    
+    @staticmethod
+    async def run_all(*coros: Awaitable[Any]) -> List[Any]:
+        """
+        并发运行一组协程，任一协程失败时取消其他协程（asyncio.gather不会取消）
+        
+        Args:
+            *coros: 协程
+            
+        Returns:
+            与输入顺序一致的结果列表，失败时抛出第一个原始异常（不包装为ExceptionGroup）
+        """
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(coro) for coro in coros]
+        except BaseExceptionGroup as e:
+            error = e
+            while isinstance(error, BaseExceptionGroup):
+                error = error.exceptions[0]
+            raise error
+        return [task.result() for task in tasks]
+    
+    @staticmethod
+    async def gather_with_concurrency(tasks: List[Any], concurrency: int = None) -> List[Any]:
         """
         带并发控制的gather操作
         
         Args:
-            tasks: 任务列表
+            tasks: 协程工厂或协程对象列表（已创建的Task会立即开始运行，无法再限制其并发）
             concurrency: 并发数
             
         Returns:
-            结果列表
+            与输入顺序一致的结果列表，失败的任务以异常对象作为结果
         """
         # 如果没有指定并发数，使用配置中的默认值
         if concurrency is None:
-            if self.config:
-                concurrency = self.config.get_concurrency_config()["max_concurrency"]
-            else:
-                concurrency = 3  # 默认值
-        
-        results = []
-        
-        # 分批处理任务
-        for i in range(0, len(tasks), concurrency):
-            batch = tasks[i:i + concurrency]
-            try:
-                batch_results = await asyncio.gather(*batch, return_exceptions=True)
-                results.extend(batch_results)
-            except Exception as e:
-                logger.error(f"批量任务执行失败: {e}")
-                # 对于失败的任务，添加None作为结果
-                results.extend([None] * len(batch))
+            concurrency = AsyncUtils._default_concurrency()
         
-        return results
+        factories = [task if callable(task) else (lambda awaitable=task: awaitable) for task in tasks]
+        return await AsyncUtils.run_bounded(factories, concurrency)
     
     async def retry_async(
         self,
         func: Callable,
         max_retries: int = None,
         delay: float = None,
-        backoff: float = 2.0,
-        exceptions: tuple = (Exception,)
+        backoff: float = 3.0,
+        exceptions: tuple = (Exception,),
+        max_delay: float = None,
+        no_retry: tuple = ()
     ) -> Any:
         """
         异步重试机制
         
+        重试间隔使用去相关抖动（下一次等待在[delay, 上一次等待×backoff]内随机），
+        并发请求不会同时重试；异常带有retry_after（如RateLimitError）时至少等待该时间。
+        
         Args:
             func: 要重试的异步函数
             max_retries: 最大重试次数
             delay: 初始延迟（秒）
-            backoff: 延迟倍数
+            backoff: 上一次等待时间的最大倍数
             exceptions: 需要重试的异常类型
+            max_delay: 单次等待上限（秒）
+            no_retry: 不重试、直接抛出的异常类型（如熔断）
             
         Returns:
             函数结果
@@ -119,17 +225,30 @@ class AsyncUtils:
             else:
                 delay = 1.0
         
+        if max_delay is None:
+            if self.config:
+                max_delay = self.config.get_retry_config()["retry_max_delay"]
+            else:
+                max_delay = 30.0
+        
+        wait_time = delay
         for attempt in range(max_retries + 1):
             try:
                 return await func()
             except exceptions as e:
+                if no_retry and isinstance(e, no_retry):
+                    raise
                 if attempt == max_retries:
                     logger.error(f"异步重试失败（{max_retries}次）: {e}")
                     raise
                 
-                wait_time = delay * (backoff ** attempt)
-                logger.warning(f"第{attempt + 1}次重试失败，{wait_time}秒后重试: {e}")
-                await asyncio.sleep(wait_time)
+                wait_time = min(max_delay, random.uniform(delay, max(delay, wait_time * backoff)))
+                # 上游指定了等待时间时至少等待该时间，再加上抖动错开并发请求
+                retry_after = getattr(e, "retry_after", None)
+                sleep_time = retry_after + random.uniform(0, delay) if retry_after else wait_time
+                logger.warning(f"第{attempt + 1}次重试失败，{sleep_time:.2f}秒后重试: {e}")
+                note_retry()
+                await asyncio.sleep(sleep_time)
     
     @staticmethod
     def create_timeout_handler(timeout: int, operation_name: str = "操作"):
@@ -191,30 +310,16 @@ class AsyncUtils:
         Args:
             items: 要处理的项目列表
             process_func: 处理函数
-            batch_size: 批次大小
+            batch_size: 批次大小（已由有界工作池取代，保留以兼容旧调用）
             concurrency: 并发数
             **kwargs: 额外参数
             
         Returns:
             处理结果列表
         """
-        results = []
-        
-        # 分批次处理
-        for i in range(0, len(items), batch_size):
-            batch = items[i:i + batch_size]
-            
-            # 为每个批次创建任务
-            tasks = []
-            for item in batch:
-                task = asyncio.create_task(process_func(item, **kwargs))
-                tasks.append(task)
-            
-            # 并发执行批次任务
-            batch_results = await AsyncUtils.gather_with_concurrency(tasks, concurrency)
-            results.extend(batch_results)
-        
-        return results
+        # 惰性创建协程，由工作池保持concurrency个在途任务
+        factories = (lambda item=item: process_func(item, **kwargs) for item in items)
+        return await AsyncUtils.run_bounded(factories, concurrency)
     
     @staticmethod
     class ProgressTracker:
@@ -256,10 +361,10 @@ class AsyncUtils:
         Returns:
             (结果, 执行时间)
         """
-        start_time = time.time()
-        result = await coro
-        end_time = time.time()
-        execution_time = end_time - start_time
+        # 执行时间同时计入遥测直方图（operation类别）
+        with track("operation", operation_name) as record:
+            result = await coro
+        execution_time = record["wall_time"]
         
         logger.info(f"{operation_name}执行时间: {execution_time:.2f}秒")
         return result, execution_time
\ No newline at end of file
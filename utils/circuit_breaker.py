@@ -0,0 +1,247 @@
+# 熔断器 - 上游连续失败时快速失败，冷却后用少量探测请求判断是否恢复
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 视为上游故障的异常（其他异常如参数错误不计入熔断）。取消不计入：外层超时取消的请求
+# 由持有超时的调用方把guard放在超时之外，超时后调用call.fail标记失败
+FAILURE_EXCEPTIONS = (asyncio.TimeoutError, aiohttp.ClientError, ConnectionError)
+
+# 状态变化历史的最大记录数
+MAX_TRANSITIONS = 1000
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求被直接拒绝"""
+
+class _Call:
+    """一次受熔断器保护的调用，调用方可以把没有抛出异常的失败（如错误结果、5xx）标记为失败"""
+
+    __slots__ = ("failure", "probe")
+
+    def __init__(self, probe: bool):
+        self.failure: Optional[str] = None
+        self.probe = probe
+
+    def fail(self, reason: str):
+        """
+        标记本次调用失败
+
+        Args:
+            reason: 失败原因
+        """
+        self.failure = reason
+
+class CircuitBreaker:
+    """三态熔断器
+
+    closed: 正常放行，连续failure_threshold次失败后打开；
+    open: 直接拒绝（抛出CircuitOpenError），cooldown秒后进入half_open；
+    half_open: 最多放行half_open_probes个探测请求，探测成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0, half_open_probes: int = 1):
+        """
+        初始化熔断器
+
+        Args:
+            name: 上游名称
+            failure_threshold: 打开熔断的连续失败次数
+            cooldown: 打开后的冷却时间（秒）
+            half_open_probes: 半开状态同时放行的探测请求数
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.half_open_probes = max(1, half_open_probes)
+
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._started = time.monotonic()
+
+        self.transitions: List[Dict[str, Any]] = []
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _transition(self, state: str, reason: str):
+        """切换状态并记录"""
+        if len(self.transitions) < MAX_TRANSITIONS:
+            self.transitions.append({
+                "t": round(time.monotonic() - self._started, 3),
+                "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "from": self.state,
+                "to": state,
+                "reason": reason
+            })
+        logger.warning(f"{self.name} 熔断器 {self.state} → {state}（{reason}）")
+        self.state = state
+
+    def _before_call(self) -> bool:
+        """
+        判断是否放行，拒绝时抛出CircuitOpenError
+
+        Returns:
+            本次调用是否为半开状态的探测请求
+        """
+        if self.state == OPEN:
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"{self.name} 熔断中（连续失败，{remaining:.1f}秒后重试）")
+            self._transition(HALF_OPEN, "冷却结束")
+            self._probes_in_flight = 0
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"{self.name} 熔断半开，等待探测请求结果")
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def _on_success(self, call: _Call):
+        """调用成功"""
+        self.stats["successes"] += 1
+        self._consecutive_failures = 0
+        if call.probe:
+            self._probes_in_flight -= 1
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED, "探测成功")
+
+    def _on_failure(self, call: _Call, reason: str):
+        """调用失败"""
+        self.stats["failures"] += 1
+        self._consecutive_failures += 1
+        if call.probe:
+            self._probes_in_flight -= 1
+            if self.state == HALF_OPEN:
+                self._open(f"探测失败: {reason}")
+        elif self.state == CLOSED and self._consecutive_failures >= self.failure_threshold:
+            self._open(f"连续{self._consecutive_failures}次失败: {reason}")
+
+    def _on_neutral(self, call: _Call):
+        """调用因非上游原因出错，不影响熔断状态"""
+        if call.probe:
+            self._probes_in_flight -= 1
+
+    def _open(self, reason: str):
+        """打开熔断"""
+        self._opened_at = time.monotonic()
+        self.stats["opened"] += 1
+        self._transition(OPEN, reason)
+
+    @contextmanager
+    def guard(self):
+        """
+        保护一次上游调用
+
+        熔断打开时在进入时抛出CircuitOpenError；FAILURE_EXCEPTIONS中的异常和call.fail()标记计为失败，
+        其他异常不影响熔断状态，正常结束计为成功。
+
+        Yields:
+            调用对象（可调用fail(原因)标记失败）
+        """
+        call = _Call(self._before_call())
+        self.stats["calls"] += 1
+        try:
+            yield call
+        except FAILURE_EXCEPTIONS as e:
+            self._on_failure(call, type(e).__name__)
+            raise
+        except BaseException:
+            if call.failure is not None:
+                self._on_failure(call, call.failure)
+            else:
+                self._on_neutral(call)
+            raise
+        if call.failure is not None:
+            self._on_failure(call, call.failure)
+        else:
+            self._on_success(call)
+
+    def is_open(self) -> bool:
+        """熔断是否处于打开状态且仍在冷却中"""
+        return self.state == OPEN and time.monotonic() < self._opened_at + self.cooldown
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取熔断器统计信息（写入运行摘要）
+
+        Returns:
+            {state, calls, successes, failures, rejected, opened, transitions}
+        """
+        return {"state": self.state, **self.stats, "transitions": list(self.transitions)}
+
+# 全局熔断器注册表：上游名称 -> 熔断器
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_circuit_breaker(name: str) -> Optional[CircuitBreaker]:
+    """
+    获取（或按ASYNC_CONFIG创建）指定上游的熔断器
+
+    Args:
+        name: 上游名称，例如"rag:dify"、"chat:<模型>"、"embedding:<模型>"
+
+    Returns:
+        该上游共享的熔断器，禁用熔断时为None
+    """
+    breaker = _breakers.get(name)
+    if breaker is not None:
+        return breaker
+
+    from utils.async_config import get_async_config
+    config = get_async_config().get_circuit_breaker_config()
+    if not config["enabled"]:
+        return None
+    breaker = CircuitBreaker(name, config["failure_threshold"], config["cooldown"], config["half_open_probes"])
+    _breakers[name] = breaker
+    return breaker
+
+@contextmanager
+def guard(name: Optional[str]):
+    """
+    用指定上游的熔断器保护一次调用（禁用熔断或name为None时直接放行）
+
+    Args:
+        name: 上游名称
+
+    Yields:
+        调用对象（可调用fail(原因)标记失败）
+    """
+    breaker = get_circuit_breaker(name) if name else None
+    if breaker is None:
+        yield _Call(False)
+        return
+    with breaker.guard() as call:
+        yield call
+
+def raise_if_open(name: str):
+    """
+    熔断器处于打开状态时抛出CircuitOpenError（用于在重试之间提前放弃，不占用探测名额）
+
+    Args:
+        name: 上游名称
+    """
+    breaker = _breakers.get(name)
+    if breaker is not None and breaker.is_open():
+        raise CircuitOpenError(f"{name} 熔断中，放弃重试")
+
+def get_all_breaker_stats() -> Dict[str, Any]:
+    """
+    获取所有熔断器的统计信息
+
+    Returns:
+        {上游名称: 统计信息}
+    """
+    return {name: breaker.get_stats() for name, breaker in _breakers.items()}
@@ -0,0 +1,215 @@
+# 批量嵌入客户端 - 将并发评估中的嵌入请求合并为Ollama /api/embed批量请求
+
+import asyncio
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+
+from utils.http_session import get_session_manager
+from utils.adaptive_limiter import get_limiter, note_http_status
+from utils.rate_limiter import RateLimitError, estimate_tokens, get_rate_limiter
+from utils.telemetry import note_response, track
+from utils.circuit_breaker import guard
+
+logger = logging.getLogger(__name__)
+
+class OllamaEmbeddingBatcher:
+    """Ollama嵌入请求微批处理器
+
+    所有并发调用embed()的文本先进入待处理队列，达到批次上限或等待flush_interval秒后
+    合并为一次 /api/embed 请求（input为文本列表），再把向量分发回各自的等待者。
+    旧版Ollama不支持 /api/embed 时自动退回逐条 /api/embeddings 请求。
+    """
+
+    def __init__(self, base_url: str, model: str, api_key: str = "",
+                 max_batch_size: int = 32, flush_interval: float = 0.005, timeout: int = 30):
+        """
+        初始化批量嵌入客户端
+
+        Args:
+            base_url: Ollama服务地址
+            model: 嵌入模型名称
+            api_key: API密钥（可选）
+            max_batch_size: 单次请求的最大文本数
+            flush_interval: 未满批次的最长等待时间（秒）
+            timeout: 单次请求超时时间（秒）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+
+        # 文本 -> 等待该文本向量的Future列表（相同文本只请求一次）
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+        self._legacy_api = False
+        # 嵌入服务的自适应并发限制器（在途批次请求数）
+        from config import ASYNC_CONFIG
+        self._limiter = get_limiter("embedding", ASYNC_CONFIG["adaptive_embedding_concurrency"])
+        # 嵌入模型的令牌桶（每个HTTP请求获取一次）
+        self._bucket = get_rate_limiter(f"embedding:{model}")
+
+        self.stats = {"texts": 0, "requests": 0, "batches": 0, "deduplicated": 0}
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        获取单个文本的嵌入向量（自动与其他并发请求合并）
+
+        Args:
+            text: 文本
+
+        Returns:
+            嵌入向量
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self.stats["texts"] += 1
+        if text in self._pending:
+            self.stats["deduplicated"] += 1
+            self._pending[text].append(future)
+        else:
+            self._pending[text] = [future]
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_interval, self._flush)
+
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量获取嵌入向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的向量列表
+        """
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def _flush(self):
+        """把待处理文本按批次上限拆分并发出请求"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+
+        for i in range(0, len(items), self.max_batch_size):
+            batch = dict(items[i:i + self.max_batch_size])
+            task = asyncio.ensure_future(self._send_batch(batch))
+            # 保留任务引用，避免被垃圾回收
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send_batch(self, batch: Dict[str, List[asyncio.Future]]):
+        """发送一个批次并把结果分发给等待者"""
+        texts = list(batch.keys())
+        self.stats["batches"] += 1
+
+        try:
+            # 嵌入服务连续失败时熔断，等待者直接收到CircuitOpenError
+            with track("embedding", self.model), guard(f"embedding:{self.model}") as call:
+                async with self._limiter.slot():
+                    if self._legacy_api:
+                        vectors = await self._request_legacy(texts, call)
+                    else:
+                        vectors = await self._request_batch(texts, call)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for text, vector in zip(texts, vectors):
+            for future in batch[text]:
+                if not future.done():
+                    future.set_result(vector)
+
+    def _headers(self) -> Dict[str, str]:
+        """构建请求头"""
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    async def _request_batch(self, texts: List[str], call: Any = None) -> List[List[float]]:
+        """通过 /api/embed 一次请求多个文本（call为熔断器调用对象，5xx时标记失败）"""
+        url = f"{self.base_url}/api/embed"
+        session = get_session_manager().get_session(url)
+
+        self.stats["requests"] += 1
+        request_body = json.dumps({"model": self.model, "input": texts}).encode("utf-8")
+        await self._bucket.acquire(sum(estimate_tokens(text) for text in texts))
+        async with session.post(url, headers=self._headers(), data=request_body,
+                                timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+            note_response(response.status, len(request_body), response.content_length)
+            if response.status == 429:
+                note_http_status(response.status)
+                retry_after = self._bucket.on_rate_limited(response.headers)
+                raise RateLimitError(f"嵌入向量批量请求失败: 429 - {await response.text()}", retry_after)
+
+            if response.status == 404:
+                # 旧版Ollama没有 /api/embed，之后统一使用逐条接口
+                if not self._legacy_api:
+                    logger.warning("Ollama不支持 /api/embed，退回 /api/embeddings 逐条请求")
+                self._legacy_api = True
+                await response.read()
+                return await self._request_legacy(texts, call)
+
+            if response.status != 200:
+                note_http_status(response.status)
+                if response.status >= 500 and call is not None:
+                    call.fail(f"HTTP {response.status}")
+                error_text = await response.text()
+                raise Exception(f"嵌入向量批量请求失败: {response.status} - {error_text}")
+
+            result = await response.json()
+            vectors = result.get("embeddings", [])
+            if len(vectors) != len(texts):
+                raise Exception(f"嵌入向量数量不匹配: {len(vectors)} vs {len(texts)}")
+            return vectors
+
+    async def _request_legacy(self, texts: List[str], call: Any = None) -> List[List[float]]:
+        """通过 /api/embeddings 逐条请求（call为熔断器调用对象，5xx时标记失败）"""
+        url = f"{self.base_url}/api/embeddings"
+        session = get_session_manager().get_session(url)
+
+        async def request_one(text: str) -> List[float]:
+            self.stats["requests"] += 1
+            request_body = json.dumps({"model": self.model, "prompt": text}).encode("utf-8")
+            await self._bucket.acquire(estimate_tokens(text))
+            async with session.post(url, headers=self._headers(), data=request_body,
+                                    timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                note_response(response.status, len(request_body), response.content_length)
+                if response.status == 429:
+                    note_http_status(response.status)
+                    retry_after = self._bucket.on_rate_limited(response.headers)
+                    raise RateLimitError("嵌入向量请求失败: 429", retry_after)
+                if response.status != 200:
+                    note_http_status(response.status)
+                    if response.status >= 500 and call is not None:
+                        call.fail(f"HTTP {response.status}")
+                    raise Exception(f"嵌入向量请求失败: {response.status}")
+                result = await response.json()
+                return result.get("embedding", [])
+
+        return list(await asyncio.gather(*(request_one(text) for text in texts)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取批处理统计信息"""
+        return {
+            **self.stats,
+            "texts_per_request": self.stats["texts"] / self.stats["requests"] if self.stats["requests"] else 0.0,
+            "legacy_api": self._legacy_api
+        }
@@ -0,0 +1,244 @@
+# 嵌入向量存储 - 按(模型, 文本哈希)持久化的内存映射向量库
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl  # 仅POSIX平台支持跨进程文件锁
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class _ModelVectorFile:
+    """单个嵌入模型的向量文件
+
+    目录结构:
+        vectors.f32  按行追加的float32向量（每行dim个值）
+        index.tsv    "文本哈希\\t行号\\t维度"，在向量写入之后追加
+
+    读者只信任以换行结尾的索引行，而索引行总是在对应向量写入后才追加，
+    因此并发读取时不会读到未写完的向量。
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = directory / "vectors.f32"
+        self.index_path = directory / "index.tsv"
+        self.lock_path = directory / ".lock"
+
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._index_offset = 0
+        self._mmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+    def _refresh_index(self):
+        """读取其他写入者新追加的索引行"""
+        if not self.index_path.exists():
+            return
+
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+
+        # 只处理完整的行，未写完的行留到下次读取
+        end = data.rfind(b"\n")
+        if end < 0:
+            return
+
+        for line in data[:end].decode("utf-8").splitlines():
+            text_hash, row, dim = line.split("\t")
+            self.rows[text_hash] = int(row)
+            self.dim = int(dim)
+
+        self._index_offset += end + 1
+
+    def _vectors(self, min_rows: int) -> np.memmap:
+        """返回至少包含min_rows行的只读内存映射"""
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            total_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(total_rows, self.dim))
+        return self._mmap
+
+    def get_many(self, text_hashes: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """按文本哈希批量读取向量"""
+        with self._lock:
+            if any(h not in self.rows for h in text_hashes):
+                self._refresh_index()
+
+            rows = [self.rows.get(h) for h in text_hashes]
+            found = [row for row in rows if row is not None]
+            if not found:
+                return [None] * len(text_hashes)
+
+            vectors = self._vectors(max(found) + 1)
+            return [np.array(vectors[row]) if row is not None else None for row in rows]
+
+    def put_many(self, text_hashes: Sequence[str], vectors: Sequence[Sequence[float]]) -> int:
+        """批量追加向量，已存在的哈希会被跳过，返回实际写入的条数"""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh_index()
+
+                pending = {}
+                for text_hash, vector in zip(text_hashes, vectors):
+                    if text_hash in self.rows or text_hash in pending:
+                        continue
+                    array = np.asarray(vector, dtype=np.float32).reshape(-1)
+                    if self.dim is None:
+                        self.dim = array.shape[0]
+                    if array.shape[0] != self.dim:
+                        logger.warning(f"嵌入向量维度不一致，跳过缓存: {array.shape[0]} vs {self.dim}")
+                        continue
+                    pending[text_hash] = array
+
+                if not pending:
+                    return 0
+
+                # 新向量接在索引中最后一行之后：写入者中途崩溃时向量文件末尾可能有不完整的行
+                # 或没有索引行的向量，先截掉这部分，保证行号与文件偏移一致
+                first_row = max(self.rows.values(), default=-1) + 1
+                expected_size = first_row * 4 * self.dim
+
+                # 先写向量再写索引，保证读者看到的索引行都指向完整的向量
+                with open(self.vectors_path, "ab") as f:
+                    if f.tell() > expected_size:
+                        logger.warning(f"向量文件末尾有 {f.tell() - expected_size} 字节未被索引，已截断: {self.vectors_path}")
+                        f.truncate(expected_size)
+                    f.write(np.stack(list(pending.values())).tobytes())
+                    f.flush()
+
+                lines = []
+                for offset, text_hash in enumerate(pending):
+                    lines.append(f"{text_hash}\t{first_row + offset}\t{self.dim}\n")
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+                    f.flush()
+
+                self._refresh_index()
+                return len(pending)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class EmbeddingStore:
+    """嵌入向量存储 - 每个模型一个内存映射的float32向量文件加索引"""
+
+    def __init__(self, directory: str):
+        """
+        初始化向量存储
+
+        Args:
+            directory: 存储目录
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._models: Dict[str, _ModelVectorFile] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """计算文本哈希"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _model_file(self, model: str) -> _ModelVectorFile:
+        """获取模型对应的向量文件"""
+        with self._lock:
+            if model not in self._models:
+                slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+                self._models[model] = _ModelVectorFile(self.directory / slug)
+            return self._models[model]
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        """
+        读取单个文本的嵌入向量
+
+        Args:
+            model: 嵌入模型名称
+            text: 文本
+
+        Returns:
+            float32向量，未缓存时返回None
+        """
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量读取嵌入向量
+
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的向量列表，未缓存的位置为None
+        """
+        vectors = self._model_file(model).get_many([self.text_hash(text) for text in texts])
+        hits = sum(1 for vector in vectors if vector is not None)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(vectors) - hits
+        return vectors
+
+    def put(self, model: str, text: str, vector: Sequence[float]):
+        """写入单个文本的嵌入向量"""
+        self.put_many(model, [text], [vector])
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """
+        批量写入嵌入向量
+
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+            vectors: 对应的向量列表
+        """
+        written = self._model_file(model).put_many([self.text_hash(text) for text in texts], vectors)
+        self.stats["writes"] += written
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计信息"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "path": str(self.directory)
+        }
+
+# 进程内按目录共享的存储实例
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+def get_embedding_store(cache_config: Optional[Dict[str, Any]]) -> Optional[EmbeddingStore]:
+    """
+    根据缓存配置获取共享的向量存储
+
+    Args:
+        cache_config: 缓存配置（config.CACHE_CONFIG）
+
+    Returns:
+        向量存储实例，未启用时返回None
+    """
+    if not cache_config or not cache_config.get("embedding_cache_enabled"):
+        return None
+
+    directory = str(Path(cache_config["embedding_cache_dir"]).resolve())
+    with _stores_lock:
+        if directory not in _stores:
+            try:
+                _stores[directory] = EmbeddingStore(directory)
+            except Exception as e:
+                logger.warning(f"嵌入向量存储初始化失败，已禁用: {e}")
+                return None
+        return _stores[directory]
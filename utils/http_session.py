@@ -0,0 +1,107 @@
+# 共享HTTP会话管理 - 按上游主机复用连接池
+
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class HTTPSessionManager:
+    """进程级HTTP会话管理器 - 每个上游主机一个带连接池的aiohttp会话"""
+
+    def __init__(self, http_config: Optional[Dict[str, Any]] = None):
+        """
+        初始化会话管理器
+
+        Args:
+            http_config: HTTP客户端配置（AsyncConfigManager.get_http_config()的返回值）
+        """
+        if http_config is None:
+            from utils.async_config import get_async_config
+            http_config = get_async_config().get_http_config()
+
+        self.http_config = http_config
+        # (scheme, host, port) -> (session, event_loop)
+        self._sessions: Dict[Tuple[str, str, int], Tuple[aiohttp.ClientSession, asyncio.AbstractEventLoop]] = {}
+
+    @staticmethod
+    def _host_key(url: str) -> Tuple[str, str, int]:
+        """从URL提取上游主机键"""
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        return scheme, parts.hostname or "", port
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """创建带连接池和DNS缓存的会话"""
+        connector = aiohttp.TCPConnector(
+            limit=self.http_config.get("max_connections", 20),
+            limit_per_host=self.http_config.get("pool_size", 10),
+            ttl_dns_cache=self.http_config.get("dns_cache_ttl", 300),
+            use_dns_cache=True,
+            keepalive_timeout=self.http_config.get("keepalive_timeout", 30)
+        )
+        # 总超时由调用方按请求控制，这里只限制建立连接的时间
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.http_config.get("timeout", 30))
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def get_session(self, url: str) -> aiohttp.ClientSession:
+        """
+        获取指定URL所在主机的共享会话
+
+        Args:
+            url: 请求URL
+
+        Returns:
+            可复用的aiohttp会话（调用方不要关闭）
+        """
+        key = self._host_key(url)
+        loop = asyncio.get_running_loop()
+
+        entry = self._sessions.get(key)
+        if entry is not None:
+            session, session_loop = entry
+            if not session.closed and session_loop is loop:
+                return session
+            # 会话已关闭或属于其他事件循环（例如同步兼容接口中的asyncio.run），重新创建
+
+        session = self._create_session()
+        self._sessions[key] = (session, loop)
+        logger.debug(f"Created pooled HTTP session for {key[0]}://{key[1]}:{key[2]}")
+        return session
+
+    async def close_all(self):
+        """关闭当前事件循环中的所有会话"""
+        loop = asyncio.get_running_loop()
+
+        for key, (session, session_loop) in list(self._sessions.items()):
+            if session_loop is not loop:
+                continue
+            if not session.closed:
+                await session.close()
+            del self._sessions[key]
+
+        # 给底层SSL传输留出关闭时间，避免"Unclosed connection"警告
+        await asyncio.sleep(0.25)
+        logger.info("All pooled HTTP sessions closed")
+
+    def get_session_stats(self) -> Dict[str, Any]:
+        """获取会话统计信息"""
+        return {
+            "sessions": [f"{scheme}://{host}:{port}" for scheme, host, port in self._sessions],
+            "pool_size": self.http_config.get("pool_size"),
+            "max_connections": self.http_config.get("max_connections")
+        }
+
+# 全局会话管理器实例（延迟创建）
+_session_manager: Optional[HTTPSessionManager] = None
+
+def get_session_manager() -> HTTPSessionManager:
+    """获取全局HTTP会话管理器实例"""
+    global _session_manager
+    if _session_manager is None:
+        _session_manager = HTTPSessionManager()
+    return _session_manager
@@ -0,0 +1,224 @@
+# 评价结果缓存 - 基于内容哈希的持久化聊天模型评分缓存
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class JudgeCache:
+    """聊天模型评分缓存 - SQLite持久化，按大小LRU淘汰并支持TTL"""
+
+    # 每写入多少条检查一次容量，避免每次写入都统计行数
+    EVICT_CHECK_INTERVAL = 100
+
+    # 命中时的访问时间先记在内存中，积累到这么多条（或写入、关闭时）再批量更新
+    ACCESS_FLUSH_SIZE = 256
+
+    def __init__(self, path: str, max_entries: int = 50000, ttl: int = 30 * 24 * 3600):
+        """
+        初始化评分缓存
+
+        Args:
+            path: SQLite数据库文件路径
+            max_entries: 最大缓存条目数，超出后淘汰最久未访问的条目
+            ttl: 条目有效期（秒），0表示永不过期
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS judge_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                latency REAL NOT NULL DEFAULT 0,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_judge_cache_last_access ON judge_cache(last_access)")
+        self._conn.commit()
+
+        self._puts_since_check = 0
+        self._pending_access: Dict[str, float] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "writes": 0,
+            "evictions": 0,
+            "saved_seconds": 0.0,
+            "saved_tokens": 0
+        }
+
+    @classmethod
+    def from_config(cls, cache_config: Optional[Dict[str, Any]]) -> Optional["JudgeCache"]:
+        """
+        根据缓存配置创建实例
+
+        Args:
+            cache_config: 缓存配置（config.CACHE_CONFIG）
+
+        Returns:
+            缓存实例，未启用时返回None
+        """
+        if not cache_config or not cache_config.get("judge_cache_enabled"):
+            return None
+
+        try:
+            return cls(
+                cache_config["judge_cache_path"],
+                max_entries=cache_config.get("judge_cache_max_entries", 50000),
+                ttl=cache_config.get("judge_cache_ttl", 30 * 24 * 3600)
+            )
+        except Exception as e:
+            logger.warning(f"评分缓存初始化失败，已禁用: {e}")
+            return None
+
+    @staticmethod
+    def make_key(model: str, template_version: str, **inputs) -> str:
+        """
+        生成缓存键
+
+        Args:
+            model: 聊天模型名称
+            template_version: 提示词模板版本
+            **inputs: 提示词输入（问题、回答、标准答案、上下文等）
+
+        Returns:
+            SHA-256哈希键
+        """
+        payload = json.dumps([model, template_version, inputs], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存条目
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的评分字典，未命中或已过期时返回None
+        """
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, latency, tokens, created_at FROM judge_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, latency, tokens, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._pending_access.pop(key, None)
+                self._conn.execute("DELETE FROM judge_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            # 命中路径不写数据库，访问时间只影响LRU淘汰顺序
+            self._pending_access[key] = now
+            if len(self._pending_access) >= self.ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += latency
+            self.stats["saved_tokens"] += tokens
+
+        return json.loads(value)
+
+    def put(self, key: str, value: Dict[str, Any], latency: float = 0.0, tokens: int = 0):
+        """
+        写入缓存条目
+
+        Args:
+            key: 缓存键
+            value: 评分字典
+            latency: 原始请求耗时（秒），命中时计入节省时间
+            tokens: 原始请求消耗的token数，命中时计入节省token
+        """
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_cache (key, value, latency, tokens, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), latency, tokens, now, now)
+            )
+            self._pending_access.pop(key, None)
+            self._flush_access()
+            self._conn.commit()
+            self.stats["writes"] += 1
+
+            self._puts_since_check += 1
+            if self._puts_since_check >= self.EVICT_CHECK_INTERVAL:
+                self._puts_since_check = 0
+                self._evict()
+
+    def _flush_access(self):
+        """把积累的访问时间写入数据库，由调用方提交（调用方持有锁）"""
+        if not self._pending_access:
+            return
+        self._conn.executemany(
+            "UPDATE judge_cache SET last_access = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self._pending_access.items()]
+        )
+        self._pending_access.clear()
+
+    def _evict(self):
+        """淘汰过期条目和超出容量的最久未访问条目（调用方持有锁）"""
+        evicted = 0
+
+        if self.ttl:
+            cursor = self._conn.execute("DELETE FROM judge_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            evicted += cursor.rowcount
+
+        count = self._conn.execute("SELECT COUNT(*) FROM judge_cache").fetchone()[0]
+        if count > self.max_entries:
+            cursor = self._conn.execute(
+                "DELETE FROM judge_cache WHERE key IN "
+                "(SELECT key FROM judge_cache ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            evicted += cursor.rowcount
+
+        if evicted:
+            self._conn.commit()
+            self.stats["evictions"] += evicted
+            logger.debug(f"评分缓存淘汰 {evicted} 条")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "saved_seconds": round(self.stats["saved_seconds"], 3),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "path": str(self.path)
+        }
+
+    def close(self):
+        """写入积累的访问时间并关闭数据库连接"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._evict()
+            self._conn.close()
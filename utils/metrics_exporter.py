@@ -0,0 +1,360 @@
+# 运行指标导出 - 以Prometheus文本格式暴露进度、吞吐、进行中的调用、错误率和缓存命中，供长时间运行时抓取
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from utils.adaptive_limiter import get_all_limiter_stats
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, get_all_breaker_stats
+from utils.rate_limiter import get_all_rate_limiter_stats
+from utils.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+# 指标名前缀
+NAMESPACE = "rag_eval"
+
+# 调用耗时和排队时间直方图的le桶（秒）
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 熔断器状态的数值表示
+BREAKER_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Prometheus文本格式的Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: Any) -> str:
+    """转义标签值"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    """格式化样本值"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _MetricsText:
+    """按指标族组织样本并输出Prometheus文本格式"""
+
+    def __init__(self):
+        self._families: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def add(self, name: str, kind: str, help_text: str, value: Optional[float],
+            labels: Optional[Dict[str, Any]] = None, suffix: str = ""):
+        """
+        添加一个样本（值为None时跳过）
+
+        Args:
+            name: 指标名（不含前缀）
+            kind: counter、gauge或histogram
+            help_text: 说明
+            value: 样本值
+            labels: 标签
+            suffix: 样本名后缀（直方图的_bucket、_sum、_count）
+        """
+        if value is None:
+            return
+        full_name = f"{NAMESPACE}_{name}"
+        family = self._families.setdefault(full_name, (kind, help_text, []))
+        label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in (labels or {}).items())
+        family[2].append(f"{full_name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{full_name}{suffix} {_format_value(value)}")
+
+    def add_histogram(self, name: str, help_text: str, histogram: Any, labels: Dict[str, Any],
+                      bounds: Tuple[float, ...] = DURATION_BUCKETS):
+        """
+        添加一个直方图（telemetry.Histogram）
+
+        Args:
+            name: 指标名（不含前缀）
+            help_text: 说明
+            histogram: 直方图
+            labels: 标签
+            bounds: le桶上界
+        """
+        for bound, count in zip(bounds, histogram.cumulative_counts(bounds)):
+            self.add(name, "histogram", help_text, count, {**labels, "le": _format_value(bound)}, "_bucket")
+        self.add(name, "histogram", help_text, histogram.count, {**labels, "le": "+Inf"}, "_bucket")
+        self.add(name, "histogram", help_text, histogram.total, labels, "_sum")
+        self.add(name, "histogram", help_text, histogram.count, labels, "_count")
+
+    def render(self) -> str:
+        """输出文本格式"""
+        lines = []
+        for full_name, (kind, help_text, samples) in self._families.items():
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    """运行指标导出器
+
+    指标在每次抓取时从遥测存储、并发限制器、令牌桶、熔断器和评估器运行统计现场汇总，
+    运行期间不额外记录任何数据。可以同时启动HTTP端点（GET /metrics）和定期写入
+    node_exporter textfile collector文件（先写临时文件再原子替换）。
+    """
+
+    def __init__(self, port: int = 0, host: str = "0.0.0.0", textfile: str = "", textfile_interval: float = 15.0):
+        """
+        初始化导出器
+
+        Args:
+            port: HTTP端点端口（0为不启动）
+            host: HTTP端点监听地址
+            textfile: textfile collector输出文件（为空时不写入）
+            textfile_interval: 写入textfile的间隔（秒）
+        """
+        self.port = port
+        self.host = host
+        self.textfile = Path(textfile) if textfile else None
+        self.textfile_interval = max(1.0, textfile_interval)
+
+        self.phase = ""
+        self.total: Optional[int] = None
+        self.completed = 0
+        self._started = time.monotonic()
+        self._evaluator_stats: Optional[Callable[[], Dict[str, Any]]] = None
+
+        self._runner = None
+        self._textfile_task: Optional[asyncio.Task] = None
+
+    def set_progress(self, phase: str, total: Optional[int] = None,
+                     evaluator_stats: Optional[Callable[[], Dict[str, Any]]] = None):
+        """
+        开始一个阶段的进度统计
+
+        Args:
+            phase: 阶段名（run、collect、evaluate）
+            total: 用例总数（未知时为None，不输出预计剩余时间）
+            evaluator_stats: 返回评估器运行统计的回调（缓存命中等）
+        """
+        self.phase = phase
+        self.total = total
+        self.completed = 0
+        self._started = time.monotonic()
+        self._evaluator_stats = evaluator_stats
+
+    def case_completed(self, count: int = 1):
+        """
+        记录完成的用例数
+
+        Args:
+            count: 新完成的用例数
+        """
+        self.completed += count
+
+    def render(self) -> str:
+        """
+        汇总当前指标
+
+        Returns:
+            Prometheus文本格式
+        """
+        text = _MetricsText()
+        self._add_progress(text)
+        self._add_calls(text)
+        self._add_upstreams(text)
+        self._add_caches(text)
+        return text.render()
+
+    def _add_progress(self, text: _MetricsText):
+        """用例进度、吞吐和预计剩余时间"""
+        labels = {"phase": self.phase}
+        elapsed = time.monotonic() - self._started
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        text.add("cases_completed_total", "counter", "完成的用例数", self.completed, labels)
+        text.add("cases", "gauge", "用例总数", self.total, labels)
+        text.add("elapsed_seconds", "gauge", "当前阶段已运行的秒数", round(elapsed, 3), labels)
+        text.add("cases_per_second", "gauge", "平均每秒完成的用例数", round(rate, 6), labels)
+        if self.total is not None and rate > 0:
+            text.add("eta_seconds", "gauge", "按平均吞吐估计的剩余秒数",
+                     round(max(0, self.total - self.completed) / rate, 3), labels)
+
+    def _add_calls(self, text: _MetricsText):
+        """RAG查询、评分和嵌入调用的计数、耗时、重试、状态码和字节数"""
+        for entry in get_telemetry().snapshot():
+            labels = {"scope": entry["scope"], "name": entry["name"]}
+            histograms = entry["histograms"]
+            text.add("calls_in_flight", "gauge", "进行中的调用数（包括等待并发槽位和速率配额）",
+                     entry["in_flight"], labels)
+            for outcome, count in entry["outcomes"].items():
+                text.add("calls_total", "counter", "完成的调用数", count, {**labels, "outcome": outcome})
+            for status, count in entry["status"].items():
+                text.add("call_status_total", "counter", "按最后一次HTTP状态码统计的调用数", count,
+                         {**labels, "status": status})
+            if "wall_time" in histograms:
+                text.add_histogram("call_duration_seconds", "调用耗时（包括排队和重试）",
+                                   histograms["wall_time"], labels)
+            if "queue_wait" in histograms:
+                text.add_histogram("call_queue_wait_seconds", "等待并发槽位和速率配额的时间",
+                                   histograms["queue_wait"], labels)
+            if "retries" in histograms:
+                text.add("call_retries_total", "counter", "重试次数", histograms["retries"].total, labels)
+            if "request_bytes" in histograms:
+                text.add("call_request_bytes_total", "counter", "请求体字节数",
+                         histograms["request_bytes"].total, labels)
+            if "response_bytes" in histograms:
+                text.add("call_response_bytes_total", "counter", "响应体字节数",
+                         histograms["response_bytes"].total, labels)
+
+    def _add_upstreams(self, text: _MetricsText):
+        """并发上限、令牌桶和熔断器状态"""
+        for name, stats in get_all_limiter_stats().items():
+            labels = {"upstream": name}
+            text.add("concurrency_limit", "gauge", "当前并发上限", stats["final"], labels)
+            text.add("concurrency_in_flight", "gauge", "占用的并发槽位数", stats["in_flight"], labels)
+            text.add("concurrency_waiting", "gauge", "等待并发槽位的请求数", stats["waiting"], labels)
+            for reason, count in stats["overloads"].items():
+                text.add("overloads_total", "counter", "过载次数（429、5xx、超时）", count,
+                         {**labels, "reason": reason})
+
+        for name, stats in get_all_rate_limiter_stats().items():
+            labels = {"upstream": name}
+            text.add("rate_limit_waited_seconds_total", "counter", "等待速率配额的总秒数",
+                     stats["waited_seconds"], labels)
+            text.add("rate_limited_total", "counter", "上游返回429的次数", stats["rate_limited"], labels)
+
+        for name, stats in get_all_breaker_stats().items():
+            labels = {"upstream": name}
+            text.add("circuit_state", "gauge", "熔断器状态（0关闭、1半开、2打开）",
+                     BREAKER_STATES.get(stats["state"]), labels)
+            text.add("circuit_rejected_total", "counter", "熔断拒绝的请求数", stats["rejected"], labels)
+
+    def _add_caches(self, text: _MetricsText):
+        """评分缓存和向量存储的命中情况"""
+        if self._evaluator_stats is None:
+            return
+        try:
+            evaluator_stats = self._evaluator_stats()
+        except Exception as e:
+            logger.warning(f"读取评估器运行统计失败: {e}")
+            return
+
+        for evaluator_name, stats in evaluator_stats.items():
+            for cache in ("judge_cache", "embedding_store"):
+                cache_stats = stats.get(cache)
+                if not cache_stats:
+                    continue
+                labels = {"evaluator": evaluator_name, "cache": cache}
+                text.add("cache_hits_total", "counter", "缓存命中数", cache_stats.get("hits"), labels)
+                text.add("cache_misses_total", "counter", "缓存未命中数", cache_stats.get("misses"), labels)
+
+    async def start(self):
+        """启动HTTP端点和textfile写入任务（端口被占用等错误只记录警告，不影响评估）"""
+        if self.port:
+            from aiohttp import web
+
+            async def handle_metrics(request):
+                return web.Response(body=self.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+            app = web.Application()
+            app.router.add_get("/metrics", handle_metrics)
+            runner = web.AppRunner(app, access_log=None)
+            try:
+                await runner.setup()
+                await web.TCPSite(runner, self.host, self.port).start()
+                self._runner = runner
+                logger.info(f"指标端点已启动: http://{self.host}:{self.port}/metrics")
+            except OSError as e:
+                await runner.cleanup()
+                logger.warning(f"指标端点启动失败（{self.host}:{self.port}）: {e}")
+
+        if self.textfile is not None and self._textfile_task is None:
+            self._textfile_task = asyncio.create_task(self._write_textfile_periodically())
+
+    async def _write_textfile_periodically(self):
+        """定期写入textfile"""
+        while True:
+            self.write_textfile()
+            await asyncio.sleep(self.textfile_interval)
+
+    def write_textfile(self):
+        """写入textfile（先写临时文件再替换，抓取时不会读到半个文件）"""
+        if self.textfile is None:
+            return
+        try:
+            self.textfile.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.textfile.with_name(f".{self.textfile.name}.{os.getpid()}.tmp")
+            temp_path.write_text(self.render(), encoding="utf-8")
+            os.replace(temp_path, self.textfile)
+        except OSError as e:
+            logger.warning(f"指标文件写入失败 {self.textfile}: {e}")
+
+    async def stop(self):
+        """停止HTTP端点和textfile写入任务（textfile保留最终指标）"""
+        if self._textfile_task is not None:
+            self._textfile_task.cancel()
+            await asyncio.gather(self._textfile_task, return_exceptions=True)
+            self._textfile_task = None
+            self.write_textfile()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+# 进程内的导出器（按METRICS_CONFIG创建，未配置端口和textfile时为None）
+_exporter: Optional[MetricsExporter] = None
+
+def get_metrics_exporter() -> Optional[MetricsExporter]:
+    """
+    获取（或按METRICS_CONFIG创建）导出器
+
+    Returns:
+        导出器，未配置端口和textfile时为None
+    """
+    global _exporter
+    if _exporter is None:
+        from config import METRICS_CONFIG
+        if not METRICS_CONFIG["port"] and not METRICS_CONFIG["textfile"]:
+            return None
+        _exporter = MetricsExporter(
+            METRICS_CONFIG["port"], METRICS_CONFIG["host"],
+            METRICS_CONFIG["textfile"], METRICS_CONFIG["textfile_interval"]
+        )
+    return _exporter
+
+async def start_metrics_exporter(phase: str, total: Optional[Callable[[], Optional[int]]] = None,
+                                 evaluator_stats: Optional[Callable[[], Dict[str, Any]]] = None) -> Optional[MetricsExporter]:
+    """
+    开始导出一个阶段的指标（未启用时什么也不做）
+
+    Args:
+        phase: 阶段名（run、collect、evaluate）
+        total: 返回用例总数的回调（只在启用时调用，避免未启用时额外读取文件）
+        evaluator_stats: 返回评估器运行统计的回调
+
+    Returns:
+        导出器，未启用时为None
+    """
+    exporter = get_metrics_exporter()
+    if exporter is None:
+        return None
+    case_count = None
+    if total is not None:
+        try:
+            case_count = total()
+        except Exception as e:
+            logger.warning(f"统计用例总数失败，不输出预计剩余时间: {e}")
+    exporter.set_progress(phase, case_count, evaluator_stats)
+    await exporter.start()
+    return exporter
+
+async def stop_metrics_exporter():
+    """停止导出（未启用时什么也不做）"""
+    if _exporter is not None:
+        await _exporter.stop()
+
+def note_cases_completed(count: int = 1):
+    """
+    记录完成的用例数（未启用时什么也不做）
+
+    Args:
+        count: 新完成的用例数
+    """
+    if _exporter is not None:
+        _exporter.case_completed(count)
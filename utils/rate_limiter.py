@@ -0,0 +1,280 @@
+# 速率限制 - 每个上游一个RPM/TPM令牌桶，识别Retry-After和x-ratelimit-reset
+
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+
+from utils.telemetry import add_queue_wait
+
+logger = logging.getLogger(__name__)
+
+class RateLimitError(Exception):
+    """上游返回429，retry_after为上游要求的等待时间（秒，未提供时为None）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _parse_duration(value: str) -> Optional[float]:
+    """解析"1s"、"6m0s"、"20ms"、"1.5"格式的时长（秒）"""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    total = 0.0
+    number = ""
+    i = 0
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    while i < len(value):
+        char = value[i]
+        if char.isdigit() or char == ".":
+            number += char
+            i += 1
+            continue
+        unit = "ms" if value.startswith("ms", i) else char
+        if unit not in units or not number:
+            return None
+        total += float(number) * units[unit]
+        number = ""
+        i += len(unit)
+    return total if not number else None
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """
+    从响应头读取上游要求的等待时间
+
+    依次识别Retry-After（秒数或HTTP日期）、x-ratelimit-reset-requests/-tokens（OpenAI格式时长）
+    和x-ratelimit-reset（OpenRouter的毫秒时间戳、秒时间戳或秒数）。
+
+    Args:
+        headers: 响应头（不区分大小写的映射）
+
+    Returns:
+        等待秒数，没有相关响应头时为None
+    """
+    if not headers:
+        return None
+
+    value = headers.get("Retry-After")
+    if value:
+        seconds = _parse_duration(value)
+        if seconds is not None:
+            return max(0.0, seconds)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    resets = [
+        _parse_duration(headers.get(name))
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [seconds for seconds in resets if seconds is not None]
+    if resets:
+        return max(resets)
+
+    value = headers.get("x-ratelimit-reset")
+    if value:
+        try:
+            reset = float(value)
+        except ValueError:
+            return None
+        # 大数值为重置时刻的时间戳（毫秒或秒），小数值为剩余秒数
+        if reset > 1e12:
+            return max(0.0, reset / 1000.0 - time.time())
+        if reset > 1e9:
+            return max(0.0, reset - time.time())
+        return max(0.0, reset)
+    return None
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的token数（按UTF-8字节数/4，中日文约每字0.75个token）
+
+    Args:
+        text: 文本
+
+    Returns:
+        估计的token数
+    """
+    return max(1, len(text.encode("utf-8")) // 4)
+
+class TokenBucket:
+    """RPM/TPM双令牌桶
+
+    请求数和token数各一个桶，按每分钟预算匀速补充，容量为burst_seconds秒的配额。
+    单个请求的token数超过桶容量时等桶满后放行（之后的请求等待欠下的额度补回）。
+    上游返回429时暂停整个桶直到Retry-After到期，并清空请求令牌，避免暂停结束后集中重发。
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, burst_seconds: float = 10.0):
+        """
+        初始化令牌桶
+
+        Args:
+            name: 上游名称
+            rpm: 每分钟请求数（0为不限制）
+            tpm: 每分钟token数（0为不限制）
+            burst_seconds: 桶容量对应的秒数
+        """
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._request_rate = rpm / 60.0
+        self._token_rate = tpm / 60.0
+        self._request_capacity = max(1.0, self._request_rate * burst_seconds) if rpm else 0.0
+        self._token_capacity = max(1.0, self._token_rate * burst_seconds) if tpm else 0.0
+
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # 按事件循环创建的锁（同步兼容接口会在新的事件循环中运行）
+        self._lock: Optional[Tuple[asyncio.Lock, asyncio.AbstractEventLoop]] = None
+
+        self.stats = {"requests": 0, "tokens": 0, "waits": 0, "waited_seconds": 0.0,
+                      "rate_limited": 0, "retry_after_seconds": 0.0}
+
+    def _get_lock(self) -> asyncio.Lock:
+        """获取当前事件循环的锁"""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock[1] is not loop:
+            self._lock = (asyncio.Lock(), loop)
+        return self._lock[0]
+
+    def _refill(self, now: float):
+        """按经过的时间补充令牌"""
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self._request_capacity, self._requests + elapsed * self._request_rate)
+        if self.tpm:
+            self._tokens = min(self._token_capacity, self._tokens + elapsed * self._token_rate)
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """当前还需等待的秒数（0表示可以立即发送）"""
+        wait = max(0.0, self._paused_until - now)
+        if self.rpm and self._requests < 1.0:
+            wait = max(wait, (1.0 - self._requests) / self._request_rate)
+        if self.tpm:
+            needed = min(float(tokens), self._token_capacity)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) / self._token_rate)
+        return wait
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """
+        发送请求前获取配额（按到达顺序排队）
+
+        Args:
+            tokens: 本次请求的估计token数
+
+        Returns:
+            等待的秒数
+        """
+        self.stats["requests"] += 1
+        self.stats["tokens"] += tokens
+        if not self.rpm and not self.tpm and self._paused_until <= time.monotonic():
+            return 0.0
+
+        started = time.monotonic()
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1.0
+            if self.tpm:
+                self._tokens -= tokens
+
+        waited = time.monotonic() - started
+        add_queue_wait(waited)
+        if waited > 0.001:
+            self.stats["waits"] += 1
+            self.stats["waited_seconds"] += waited
+        return waited
+
+    def record_usage(self, actual_tokens: int, estimated_tokens: int):
+        """
+        用响应中的实际token数修正预扣的估计值
+
+        Args:
+            actual_tokens: 实际token数
+            estimated_tokens: acquire时的估计token数
+        """
+        self.stats["tokens"] += actual_tokens - estimated_tokens
+        if self.tpm:
+            self._tokens -= actual_tokens - estimated_tokens
+
+    def on_rate_limited(self, headers: Any = None) -> Optional[float]:
+        """
+        上游返回429时调用：按Retry-After暂停整个桶
+
+        Args:
+            headers: 429响应的响应头
+
+        Returns:
+            上游要求的等待秒数（未提供时为None）
+        """
+        retry_after = parse_retry_after(headers)
+        self.stats["rate_limited"] += 1
+        if retry_after:
+            self.stats["retry_after_seconds"] += retry_after
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        # 暂停结束后从空桶开始匀速发送
+        self._requests = min(self._requests, 0.0)
+        logger.warning(f"{self.name} 返回429" + (f"，暂停 {retry_after:.1f}秒" if retry_after else ""))
+        return retry_after
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取令牌桶统计信息"""
+        return {"rpm": self.rpm, "tpm": self.tpm, **self.stats,
+                "waited_seconds": round(self.stats["waited_seconds"], 3),
+                "retry_after_seconds": round(self.stats["retry_after_seconds"], 3)}
+
+# 全局令牌桶注册表：上游名称 -> 令牌桶
+_buckets: Dict[str, TokenBucket] = {}
+
+def get_rate_limiter(name: str) -> TokenBucket:
+    """
+    获取（或按RATE_LIMIT_CONFIG创建）指定上游的令牌桶
+
+    预算按完整上游名（如"chat:gpt-4o-mini"）、再按冒号后的模型名或系统名查找，都没有时使用默认值。
+
+    Args:
+        name: 上游名称，例如"rag:dify"、"chat:<模型>"、"embedding:<模型>"
+
+    Returns:
+        该上游共享的令牌桶
+    """
+    bucket = _buckets.get(name)
+    if bucket is not None:
+        return bucket
+
+    from config import RATE_LIMIT_CONFIG
+    limits = RATE_LIMIT_CONFIG["limits"]
+    short_name = name.split(":", 1)[-1]
+    rpm, tpm = limits.get(name) or limits.get(short_name) or (
+        RATE_LIMIT_CONFIG["default_rpm"], RATE_LIMIT_CONFIG["default_tpm"]
+    )
+    bucket = TokenBucket(name, rpm, tpm, RATE_LIMIT_CONFIG["burst_seconds"])
+    _buckets[name] = bucket
+    return bucket
+
+def get_all_rate_limiter_stats() -> Dict[str, Any]:
+    """
+    获取所有令牌桶的统计信息
+
+    Returns:
+        {上游名称: 统计信息}
+    """
+    return {name: bucket.get_stats() for name, bucket in _buckets.items()}
@@ -0,0 +1,272 @@
+# 列式结果存储 - 长表格式的Parquet结果（每个用例×系统×评估器×指标一行），可还原为宽表CSV视图
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 长表列：用例索引、系统、评估器、指标、分数、RAG回答延迟（秒）、错误原因
+LONG_COLUMNS = ("case_id", "system", "evaluator", "metric", "value", "latency", "error")
+
+# 字典编码的字符串列（取值种类少、重复多）
+DICTIONARY_COLUMNS = ("system", "evaluator", "metric", "error")
+
+# 写入文件元数据的格式版本
+STORE_FORMAT = "long-v1"
+
+def _require_pyarrow():
+    """导入pyarrow（可选依赖）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet结果存储需要安装pyarrow: pip install pyarrow")
+    return pa, pq
+
+def long_schema():
+    """长表的Arrow schema（分数和延迟为float32）"""
+    pa, _ = _require_pyarrow()
+    return pa.schema(
+        [
+            pa.field("case_id", pa.int32()),
+            pa.field("system", pa.string()),
+            pa.field("evaluator", pa.string()),
+            pa.field("metric", pa.string()),
+            pa.field("value", pa.float32()),
+            pa.field("latency", pa.float32()),
+            pa.field("error", pa.string())
+        ],
+        metadata={"format": STORE_FORMAT}
+    )
+
+class ResultStoreWriter:
+    """长表Parquet写入器
+
+    每个(用例, 系统, 评估器, 指标)写一行；评价失败时该评估器所有指标的value为空、error为错误原因。
+    行按列缓存，攒够row_group_size行后写为一个行组，字符串列使用字典编码。
+    """
+
+    def __init__(self, path: str, row_group_size: int = 50000):
+        """
+        初始化结果存储写入器
+
+        Args:
+            path: Parquet文件路径
+            row_group_size: 每个行组的行数
+        """
+        pa, pq = _require_pyarrow()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.row_group_size = max(1, row_group_size)
+        self._schema = long_schema()
+        self._writer = pq.ParquetWriter(
+            self.path,
+            self._schema,
+            use_dictionary=list(DICTIONARY_COLUMNS),
+            compression="zstd"
+        )
+        self._columns: Dict[str, List[Any]] = {name: [] for name in LONG_COLUMNS}
+        self.rows = 0
+
+    def write_case(self, case_id: int,
+                   scores: Dict[str, Dict[str, tuple]],
+                   metrics: Dict[str, List[str]],
+                   latencies: Optional[Dict[str, Optional[float]]] = None):
+        """
+        写入一个用例的所有评价结果
+
+        Args:
+            case_id: 用例索引
+            scores: {系统名: {评估器名: (评价指标字典, 错误原因)}}
+            metrics: {评估器名: 指标列表}
+            latencies: {系统名: RAG回答延迟}
+        """
+        latencies = latencies or {}
+        columns = self._columns
+        for system_name, evaluator_scores in scores.items():
+            latency = latencies.get(system_name)
+            for evaluator_name, metric_names in metrics.items():
+                metric_scores, error = evaluator_scores.get(evaluator_name, ({}, "未评价"))
+                for metric in metric_names:
+                    columns["case_id"].append(case_id)
+                    columns["system"].append(system_name)
+                    columns["evaluator"].append(evaluator_name)
+                    columns["metric"].append(metric)
+                    columns["value"].append(metric_scores.get(metric))
+                    columns["latency"].append(latency)
+                    columns["error"].append(error)
+
+        if len(columns["case_id"]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """把缓存的行写为一个行组"""
+        if not self._columns["case_id"]:
+            return
+        pa, _ = _require_pyarrow()
+        table = pa.Table.from_pydict(self._columns, schema=self._schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+        self._columns = {name: [] for name in LONG_COLUMNS}
+
+    def close(self):
+        """写出剩余行并关闭文件"""
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._writer = None
+
+def read_result_store(path: str,
+                      systems: Optional[Sequence[str]] = None,
+                      evaluators: Optional[Sequence[str]] = None,
+                      metrics: Optional[Sequence[str]] = None,
+                      columns: Optional[Sequence[str]] = None):
+    """
+    读取长表结果
+
+    过滤条件下推到Parquet读取，只解码需要的行组和列；字符串列以字典（分类）类型返回。
+
+    Args:
+        path: Parquet文件路径
+        systems: 只读取这些系统
+        evaluators: 只读取这些评估器
+        metrics: 只读取这些指标
+        columns: 只读取这些列，默认全部
+
+    Returns:
+        pyarrow.Table
+    """
+    _, pq = _require_pyarrow()
+
+    filters = []
+    for column, values in (("system", systems), ("evaluator", evaluators), ("metric", metrics)):
+        if values:
+            filters.append((column, "in", list(values)))
+
+    selected = list(columns) if columns else None
+    read_dictionary = [name for name in DICTIONARY_COLUMNS if selected is None or name in selected]
+
+    try:
+        return pq.read_table(
+            path,
+            columns=selected,
+            filters=filters or None,
+            read_dictionary=read_dictionary
+        )
+    except Exception as e:
+        raise ValueError(f"结果文件读取失败 {path}: {e}")
+
+def _infer_evaluator_metrics(table) -> Dict[str, List[str]]:
+    """按出现顺序获取长表中的{评估器名: 指标列表}"""
+    evaluator_metrics: Dict[str, List[str]] = {}
+    pairs = zip(table.column("evaluator").to_pylist(), table.column("metric").to_pylist())
+    for evaluator_name, metric in dict.fromkeys(pairs):
+        evaluator_metrics.setdefault(evaluator_name, []).append(metric)
+    return evaluator_metrics
+
+def _score_columns(system_name: str, evaluator_metrics: Dict[str, List[str]]) -> List[str]:
+    """某个系统在宽表中的分数列和错误列"""
+    columns = []
+    for evaluator_name, metric_names in evaluator_metrics.items():
+        columns.extend(f"{system_name}_{evaluator_name}_{metric}" for metric in metric_names)
+        columns.append(f"{system_name}_{evaluator_name}_error")
+    return columns
+
+def to_wide_frame(table, system_order: Optional[Sequence[str]] = None,
+                  evaluator_metrics: Optional[Dict[str, List[str]]] = None):
+    """
+    把长表转换为宽表（与multi_evaluation_results.csv相同的分数列）
+
+    Args:
+        table: read_result_store返回的表
+        system_order: 系统列的顺序，默认按出现顺序
+        evaluator_metrics: {评估器名: 指标列表}，决定列顺序，默认按出现顺序
+
+    Returns:
+        pandas.DataFrame，索引为case_id，列为{系统}_{评估器}_{指标}和{系统}_{评估器}_error
+    """
+    import pandas as pd
+
+    df = table.to_pandas()
+    if df.empty:
+        return pd.DataFrame(index=pd.Index([], name="case_id"))
+
+    systems = list(system_order) if system_order else list(dict.fromkeys(table.column("system").to_pylist()))
+    evaluator_metrics = evaluator_metrics or _infer_evaluator_metrics(table)
+
+    values = df.pivot_table(
+        index="case_id", columns=["system", "evaluator", "metric"], values="value",
+        aggfunc="first", dropna=False, observed=True
+    )
+    # 同一(系统, 评估器)下各指标的错误原因相同，取任意一行即可
+    errors = (
+        df.drop_duplicates(["case_id", "system", "evaluator"])
+        .pivot(index="case_id", columns=["system", "evaluator"], values="error")
+    )
+
+    wide = {}
+    for system_name in systems:
+        for evaluator_name, metric_names in evaluator_metrics.items():
+            for metric in metric_names:
+                key = (system_name, evaluator_name, metric)
+                wide[f"{system_name}_{evaluator_name}_{metric}"] = values[key] if key in values.columns else None
+            key = (system_name, evaluator_name)
+            wide[f"{system_name}_{evaluator_name}_error"] = errors[key].astype(object) if key in errors.columns else None
+
+    index = values.index.union(errors.index)
+    return pd.DataFrame(wide, index=index).rename_axis("case_id")
+
+def load_wide_results(output_dir: str, include_text: bool = True):
+    """
+    以宽表视图加载一次运行的结果（列与multi_evaluation_results.csv一致）
+
+    分数来自results.parquet；include_text为True时从detailed_results.jsonl补充问题、标准答案和各系统回答。
+
+    Args:
+        output_dir: 结果目录
+        include_text: 是否包含问题、标准答案和回答列
+
+    Returns:
+        pandas.DataFrame，索引为case_id
+    """
+    import pandas as pd
+    from utils.result_writers import StreamingResultWriter
+
+    output_path = Path(output_dir)
+    summary_path = output_path / StreamingResultWriter.SUMMARY_FILE
+    summary = {}
+    if summary_path.exists():
+        with open(summary_path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+
+    table = read_result_store(str(output_path / StreamingResultWriter.PARQUET_FILE))
+    systems = summary.get("systems") or list(dict.fromkeys(table.column("system").to_pylist()))
+    evaluator_metrics = summary.get("evaluators") or _infer_evaluator_metrics(table)
+    scores = to_wide_frame(table, systems, evaluator_metrics)
+    if not include_text:
+        return scores
+
+    text_rows = {}
+    with open(output_path / StreamingResultWriter.DETAIL_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            row = {"question": record["question"], "ground_truth": record["ground_truth"]}
+            for system_name in systems:
+                row[f"{system_name}_answer"] = record["answers"].get(system_name, "")
+            text_rows[record["index"]] = row
+
+    text = pd.DataFrame.from_dict(text_rows, orient="index")
+    text.index.name = "case_id"
+    wide = text.join(scores, how="outer")
+
+    # 按CSV的列顺序排列：问题、标准答案，然后每个系统的回答和分数列
+    ordered = ["question", "ground_truth"]
+    for system_name in systems:
+        ordered.append(f"{system_name}_answer")
+        ordered.extend(_score_columns(system_name, evaluator_metrics))
+    return wide[[column for column in ordered if column in wide.columns]]
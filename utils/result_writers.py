@@ -0,0 +1,294 @@
+# 结果写入 - 用例完成即写入JSONL明细、CSV和可选的Parquet，最后写入小的汇总文件
+
+import csv
+import json
+import logging
+import math
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from utils.result_store import ResultStoreWriter
+from utils.run_store import RunStore
+from utils.statistics import describe, summarize_scores
+
+logger = logging.getLogger(__name__)
+
+# 每个系统的延迟指标（秒）：端到端延迟（含重试和排队）、首字延迟、字间延迟、请求总耗时
+LATENCY_METRICS = ("latency", "ttft", "inter_token_latency", "total_time")
+
+class StreamingResultWriter:
+    """流式结果写入器
+
+    输出文件:
+        detailed_results.jsonl        每个用例一行（问题、标准答案、各系统回答和评分）
+        multi_evaluation_results.csv  与原CSV相同的宽表列，逐行追加
+        results.parquet               可选，长表格式的列式结果（见utils.result_store）
+        summary.json                  汇总统计（均值、分位数、bootstrap置信区间、系统间配对差异）、
+                                      各系统的延迟统计和运行统计，关闭时写入
+
+    用例可以按任意顺序完成；写入器用一个小的重排缓冲区保证文件中的行按用例顺序排列，
+    缓冲区大小只取决于流水线中在途用例的数量。
+    """
+
+    DETAIL_FILE = "detailed_results.jsonl"
+    CSV_FILE = "multi_evaluation_results.csv"
+    PARQUET_FILE = "results.parquet"
+    SUMMARY_FILE = "summary.json"
+
+    def __init__(self, output_dir: str, system_names: List[str], evaluator_metrics: Dict[str, List[str]],
+                 parquet: bool = False, parquet_row_group_size: int = 50000,
+                 run_store: Optional[RunStore] = None, run_id: Optional[int] = None,
+                 bootstrap_resamples: int = 2000, confidence: float = 0.95):
+        """
+        初始化结果写入器
+
+        Args:
+            output_dir: 结果输出目录
+            system_names: RAG系统名列表
+            evaluator_metrics: {评估器名: 指标列表}
+            parquet: 是否同时写入长表Parquet
+            parquet_row_group_size: Parquet每个行组的行数（长表行）
+            run_store: 运行历史数据库，给出时同时写入
+            run_id: 本次运行在运行历史中的ID
+            bootstrap_resamples: 汇总统计的bootstrap重采样次数（0表示不计算置信区间）
+            confidence: 置信区间的置信水平
+        """
+        self.output_path = Path(output_dir)
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.system_names = system_names
+        self.evaluator_metrics = evaluator_metrics
+
+        # CSV列：问题、标准答案，然后每个系统的回答、各评估器指标和错误原因
+        self.columns = ["question", "ground_truth"]
+        for system_name in system_names:
+            self.columns.append(f"{system_name}_answer")
+            for evaluator_name, metrics in evaluator_metrics.items():
+                self.columns.extend(f"{system_name}_{evaluator_name}_{metric}" for metric in metrics)
+                self.columns.append(f"{system_name}_{evaluator_name}_error")
+
+        self._detail_file = open(self.output_path / self.DETAIL_FILE, "w", encoding="utf-8")
+        self._csv_file = open(self.output_path / self.CSV_FILE, "w", encoding="utf-8", newline="")
+        self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.columns)
+        self._csv_writer.writeheader()
+
+        self._store: Optional[ResultStoreWriter] = None
+        if parquet:
+            try:
+                self._store = ResultStoreWriter(self.output_path / self.PARQUET_FILE, parquet_row_group_size)
+            except ValueError as e:
+                logger.warning(f"跳过Parquet输出: {e}")
+
+        self.run_store = run_store
+        self.run_id = run_id
+
+        # 重排缓冲区：用例索引 -> (明细记录, CSV行)
+        self._pending: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        self._next_index = 0
+
+        # 分数按写入顺序紧凑保存（缺失为NaN），同一评估器和指标下各系统逐用例对齐，用于配对差异
+        self._values: Dict[Tuple[str, str, str], array] = {
+            (system_name, evaluator_name, metric): array("d")
+            for system_name in system_names
+            for evaluator_name, metrics in evaluator_metrics.items()
+            for metric in metrics
+        }
+        # 延迟指标按系统保存（缺失为NaN，阻塞模式没有首字延迟）
+        self._latency_values: Dict[Tuple[str, str], array] = {
+            (system_name, metric): array("d") for system_name in system_names for metric in LATENCY_METRICS
+        }
+        self.bootstrap_resamples = bootstrap_resamples
+        self.confidence = confidence
+        self._error_counts: Dict[Tuple[str, str], int] = {}
+        self.count = 0
+        self._started = time.time()
+
+    def write_case(self, index: int, case: Dict[str, Any], answers: Dict[str, str],
+                   scores: Dict[str, Dict[str, Tuple[Dict[str, Optional[float]], Optional[str]]]],
+                   latencies: Optional[Dict[str, Optional[float]]] = None,
+                   timings: Optional[Dict[str, Optional[Dict[str, Any]]]] = None,
+                   telemetry: Optional[Dict[str, Optional[Dict[str, Any]]]] = None):
+        """
+        写入一个完成评价的用例
+
+        Args:
+            index: 用例在测试文件中的位置
+            case: 测试用例（question、ground_truth）
+            answers: {系统名: 回答}
+            scores: {系统名: {评估器名: (评价指标字典, 错误原因)}}
+            latencies: {系统名: RAG回答延迟（秒）}
+            timings: {系统名: {ttft, inter_token_latency, total_time, chunks}}（连接器记录的请求计时）
+            telemetry: {系统名: {wall_time, queue_wait, retries, status, request_bytes, response_bytes}}（RAG查询的遥测记录）
+        """
+        latencies = latencies or {}
+        timings = timings or {}
+        telemetry = telemetry or {}
+        row = {"question": case["question"], "ground_truth": case["ground_truth"]}
+        detail_scores = {}
+
+        for system_name in self.system_names:
+            row[f"{system_name}_answer"] = answers.get(system_name, "")
+            detail_scores[system_name] = {}
+            
+            timing = timings.get(system_name) or {}
+            for metric in LATENCY_METRICS:
+                value = latencies.get(system_name) if metric == "latency" else timing.get(metric)
+                self._latency_values[(system_name, metric)].append(math.nan if value is None else value)
+
+            for evaluator_name, metrics in self.evaluator_metrics.items():
+                metric_scores, error = scores.get(system_name, {}).get(evaluator_name, ({}, "未评价"))
+                for metric in metrics:
+                    value = metric_scores.get(metric)
+                    row[f"{system_name}_{evaluator_name}_{metric}"] = value
+                    self._values[(system_name, evaluator_name, metric)].append(math.nan if value is None else value)
+                row[f"{system_name}_{evaluator_name}_error"] = error
+                if error is not None:
+                    key = (system_name, evaluator_name)
+                    self._error_counts[key] = self._error_counts.get(key, 0) + 1
+
+                detail_scores[system_name][evaluator_name] = {
+                    "scores": {metric: metric_scores.get(metric) for metric in metrics},
+                    "error": error
+                }
+
+        detail = {
+            "index": index,
+            "case_key": case.get("case_key"),
+            "question": case["question"],
+            "ground_truth": case["ground_truth"],
+            "answers": {system_name: answers.get(system_name, "") for system_name in self.system_names},
+            "latencies": {system_name: latencies.get(system_name) for system_name in self.system_names},
+            "timings": {system_name: timings.get(system_name) for system_name in self.system_names},
+            "telemetry": {system_name: telemetry.get(system_name) for system_name in self.system_names},
+            "scores": detail_scores
+        }
+
+        if self._store is not None:
+            # 长表不要求顺序，直接写入
+            self._store.write_case(
+                index,
+                {system_name: scores.get(system_name, {}) for system_name in self.system_names},
+                self.evaluator_metrics,
+                latencies
+            )
+
+        if self.run_store is not None:
+            case_key = case.get("case_key") or ""
+            self.run_store.add_case(
+                self.run_id, index, case_key, case, detail["answers"], latencies, scores, self.evaluator_metrics
+            )
+
+        self._pending[index] = (detail, row)
+        self._drain()
+
+    def _drain(self, force: bool = False):
+        """按用例顺序写出缓冲区中已连续的用例（force时写出全部）"""
+        written = False
+        while self._pending:
+            if self._next_index in self._pending:
+                index = self._next_index
+            elif force:
+                index = min(self._pending)
+            else:
+                break
+
+            detail, row = self._pending.pop(index)
+            self._detail_file.write(json.dumps(detail, ensure_ascii=False) + "\n")
+            self._csv_writer.writerow(row)
+
+            self._next_index = index + 1
+            self.count += 1
+            written = True
+
+        if written:
+            self._detail_file.flush()
+            self._csv_file.flush()
+
+    def get_summary(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        获取汇总统计
+
+        Returns:
+            ({系统名: {评估器名: {指标: {count, mean, median, p10, p90, std, min, max, ci_low, ci_high}}}},
+             {评估器名: {指标: {"A - B": 配对差异}}})
+        """
+        return summarize_scores(
+            self._values, self.system_names, self.evaluator_metrics,
+            n_resamples=self.bootstrap_resamples, confidence=self.confidence
+        )
+
+    def get_latency_summary(self) -> Dict[str, Any]:
+        """
+        获取各系统的延迟统计
+
+        Returns:
+            {系统名: {延迟指标: {count, mean, median, p10, p90, ...}}}（只包含有数据的指标）
+        """
+        latency_summary: Dict[str, Any] = {}
+        for system_name in self.system_names:
+            latency_summary[system_name] = {}
+            for metric in LATENCY_METRICS:
+                stats = describe(
+                    self._latency_values[(system_name, metric)], self.bootstrap_resamples, self.confidence
+                )
+                if stats["count"]:
+                    latency_summary[system_name][metric] = stats
+        return latency_summary
+
+    def output_files(self) -> Dict[str, Path]:
+        """获取已写入的输出文件"""
+        files = {
+            "detail": self.output_path / self.DETAIL_FILE,
+            "csv": self.output_path / self.CSV_FILE,
+            "summary": self.output_path / self.SUMMARY_FILE
+        }
+        if self._store is not None:
+            files["parquet"] = self.output_path / self.PARQUET_FILE
+        return files
+
+    def close(self, run_stats: Optional[Dict[str, Any]] = None, status: str = "completed") -> Dict[str, Any]:
+        """
+        写出剩余用例并写入汇总文件
+
+        Args:
+            run_stats: 运行统计（评估器缓存命中等）
+            status: 写入运行历史的运行状态
+
+        Returns:
+            汇总文件内容
+        """
+        self._drain(force=True)
+
+        self._detail_file.close()
+        self._csv_file.close()
+        if self._store is not None:
+            self._store.close()
+        if self.run_store is not None:
+            self.run_store.finish_run(self.run_id, self.count, status)
+            self.run_store.close()
+
+        metric_summary, paired_differences = self.get_summary()
+        summary = {
+            "cases": self.count,
+            "systems": self.system_names,
+            "evaluators": self.evaluator_metrics,
+            "summary": metric_summary,
+            "paired_differences": paired_differences,
+            "latency": self.get_latency_summary(),
+            "confidence": self.confidence,
+            "errors": {
+                system_name: {
+                    evaluator_name: self._error_counts.get((system_name, evaluator_name), 0)
+                    for evaluator_name in self.evaluator_metrics
+                }
+                for system_name in self.system_names
+            },
+            "elapsed_seconds": round(time.time() - self._started, 3),
+            "run_id": self.run_id,
+            "run_stats": run_stats or {}
+        }
+
+        with open(self.output_path / self.SUMMARY_FILE, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        return summary
@@ -0,0 +1,196 @@
+# 运行比较 - 两次运行（或同一运行的两个系统）逐用例配对比较、显著性检验和回退门禁
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.result_writers import StreamingResultWriter
+from utils.run_journal import RunJournal
+from utils.run_store import RunStore
+from utils.statistics import paired_test
+
+logger = logging.getLogger(__name__)
+
+class RunScores:
+    """一次运行的逐用例分数"""
+
+    def __init__(self, label: str, systems: List[str]):
+        self.label = label
+        self.systems = systems
+        # (系统名, 评估器名, 指标) -> {用例键: 分数}
+        self.scores: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+        # 用例键 -> 问题
+        self.questions: Dict[str, str] = {}
+
+    def add(self, system_name: str, evaluator_name: str, metric: str, case_key: str, value: Optional[float]):
+        """记录一个分数（缺失的分数不参与比较）"""
+        if value is None:
+            return
+        self.scores.setdefault((system_name, evaluator_name, metric), {})[case_key] = value
+
+    def metrics(self, system_name: str) -> List[Tuple[str, str]]:
+        """某个系统有分数的(评估器名, 指标)"""
+        return [(evaluator_name, metric) for (system, evaluator_name, metric) in self.scores if system == system_name]
+
+def load_run_scores(source: str, db_path: Optional[str] = None) -> RunScores:
+    """
+    读取一次运行的逐用例分数
+
+    Args:
+        source: 结果目录（包含detailed_results.jsonl），或运行历史中的运行ID
+        db_path: 运行历史数据库路径（source为运行ID时使用）
+
+    Returns:
+        运行分数
+    """
+    path = Path(source)
+    if path.is_dir():
+        detail_path = path / StreamingResultWriter.DETAIL_FILE
+        if not detail_path.exists():
+            raise ValueError(f"结果目录中没有 {StreamingResultWriter.DETAIL_FILE}: {source}")
+
+        run = None
+        with open(detail_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if run is None:
+                    run = RunScores(str(source), list(record["scores"].keys()))
+                case_key = record.get("case_key") or RunJournal.case_key(record["question"], record["ground_truth"])
+                run.questions[case_key] = record["question"]
+                for system_name, evaluators in record["scores"].items():
+                    for evaluator_name, result in evaluators.items():
+                        for metric, value in result["scores"].items():
+                            run.add(system_name, evaluator_name, metric, case_key, value)
+        return run or RunScores(str(source), [])
+
+    if source.isdigit() and db_path and Path(db_path).exists():
+        store = RunStore(db_path)
+        try:
+            record = store.get_run(int(source))
+            if record is None:
+                raise ValueError(f"运行历史中没有运行 #{source}")
+            run = RunScores(f"#{source}", record["systems"])
+            for system_name, evaluator_name, metric, case_key, value, question in store.iter_scores(int(source)):
+                run.questions[case_key] = question
+                run.add(system_name, evaluator_name, metric, case_key, value)
+            return run
+        finally:
+            store.close()
+
+    raise ValueError(f"找不到运行: {source}（应为结果目录或运行历史中的运行ID）")
+
+def _metric_matches(evaluator_name: str, metric: str, patterns: Sequence[str]) -> bool:
+    """指标是否匹配列表（元素为"指标"或"评估器.指标"）"""
+    return metric in patterns or f"{evaluator_name}.{metric}" in patterns
+
+def _unknown_metrics(patterns: Optional[Sequence[str]], known: Sequence[Tuple[str, str]]) -> List[str]:
+    """列表中不匹配任何已知(评估器名, 指标)的元素"""
+    return [
+        pattern for pattern in patterns or []
+        if not any(_metric_matches(evaluator_name, metric, [pattern]) for evaluator_name, metric in known)
+    ]
+
+def compare_runs(baseline: RunScores, candidate: RunScores, system_pairs: List[Tuple[str, str]],
+                 metrics: Optional[Sequence[str]] = None, test: str = "permutation", alpha: float = 0.05,
+                 threshold: float = 0.1, gate_metrics: Optional[Sequence[str]] = None,
+                 n_resamples: int = 10000, max_regressions: int = 20) -> Dict[str, Any]:
+    """
+    逐指标配对比较（candidate - baseline），按用例键对齐
+
+    显著回退：平均差异为负且p值小于alpha。门禁指标出现显著回退，或候选运行中没有可比较的分数
+    （评价全部失败、RAG系统不可用等）时报告失败；gate_metrics为空时所有指标都参与门禁。
+    metrics或gate_metrics中不匹配基准运行任何指标的名称（如拼写错误）抛出ValueError。
+
+    Args:
+        baseline: 基准运行
+        candidate: 候选运行（同一运行比较两个系统时与baseline相同）
+        system_pairs: [(基准系统, 候选系统)]
+        metrics: 只比较这些指标（"指标"或"评估器.指标"），默认全部
+        test: 检验方法，permutation或wilcoxon
+        alpha: 显著性水平
+        threshold: 单个用例下降超过该值记为用例回退
+        gate_metrics: 参与门禁的指标
+        n_resamples: 置换和bootstrap次数
+        max_regressions: 每个指标最多列出的回退用例数
+
+    Returns:
+        {test, alpha, threshold, comparisons: [...], failed: [...]}
+    """
+    known = [metric for base_system, _ in system_pairs for metric in baseline.metrics(base_system)]
+    for option, patterns in (("--metrics", metrics), ("--gate", gate_metrics)):
+        unknown = _unknown_metrics(patterns, known)
+        if unknown:
+            available = sorted({f"{evaluator_name}.{metric}" for evaluator_name, metric in known})
+            raise ValueError(f"{option} 中的指标在基准运行中不存在: {', '.join(unknown)}"
+                             f"（可用: {', '.join(available) or '无'}）")
+
+    comparisons = []
+    failed = []
+
+    for base_system, candidate_system in system_pairs:
+        for evaluator_name, metric in baseline.metrics(base_system):
+            if metrics and not _metric_matches(evaluator_name, metric, metrics):
+                continue
+            gated = not gate_metrics or _metric_matches(evaluator_name, metric, gate_metrics)
+            base_scores = baseline.scores.get((base_system, evaluator_name, metric), {})
+            candidate_scores = candidate.scores.get((candidate_system, evaluator_name, metric)) or {}
+
+            case_keys = [key for key in base_scores if key in candidate_scores]
+            base_values = np.fromiter((base_scores[key] for key in case_keys), dtype=np.float64, count=len(case_keys))
+            candidate_values = np.fromiter(
+                (candidate_scores[key] for key in case_keys), dtype=np.float64, count=len(case_keys)
+            )
+
+            result = paired_test(candidate_values, base_values, test=test, n_resamples=n_resamples)
+            p_value = result.get("p_value")
+            significant = p_value is not None and p_value < alpha
+            regressed = significant and result.get("mean_diff", 0.0) < 0
+
+            # 逐用例回退：下降超过阈值的用例，下降最多的在前
+            deltas = candidate_values - base_values
+            order = np.argsort(deltas, kind="stable")
+            regressions = [
+                {
+                    "case_key": case_keys[i],
+                    "question": candidate.questions.get(case_keys[i]) or baseline.questions.get(case_keys[i], ""),
+                    "baseline": float(base_values[i]),
+                    "candidate": float(candidate_values[i]),
+                    "delta": float(deltas[i])
+                }
+                for i in order[:max_regressions]
+                if deltas[i] < -threshold
+            ]
+
+            comparison = {
+                "baseline_system": base_system,
+                "candidate_system": candidate_system,
+                "evaluator": evaluator_name,
+                "metric": metric,
+                **result,
+                "significant": significant,
+                "regressed": regressed,
+                "gated": gated,
+                "case_regressions": int(np.count_nonzero(deltas < -threshold)),
+                "regressions": regressions
+            }
+            comparisons.append(comparison)
+            if gated and not result["count"]:
+                # 没有可比较的分数时无法证明没有回退（评价或RAG系统故障时正应阻止发布）
+                failed.append(f"{candidate_system} {evaluator_name}.{metric}（没有可比较的分数）")
+            elif gated and regressed:
+                failed.append(f"{candidate_system} {evaluator_name}.{metric}")
+
+    return {
+        "baseline": baseline.label,
+        "candidate": candidate.label,
+        "test": test,
+        "alpha": alpha,
+        "threshold": threshold,
+        "comparisons": comparisons,
+        "failed": failed
+    }
@@ -0,0 +1,252 @@
+# 运行日志 - 追加写入的JSONL检查点，进程中断后可以从日志恢复
+
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class JournalState:
+    """从日志重放得到的运行状态"""
+
+    def __init__(self):
+        # 运行元数据（最后一条run记录）
+        self.run: Dict[str, Any] = {}
+        # (系统名, 用例键) -> RAG回答记录
+        self.answers: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # (评估器名, 系统名, 用例键) -> (评价指标字典, 错误原因)
+        self.scores: Dict[Tuple[str, str, str], Tuple[Dict[str, Optional[float]], Optional[str]]] = {}
+        # (评估器名, 系统名, 用例键) -> 评价时的指纹
+        self.score_fingerprints: Dict[Tuple[str, str, str], Optional[str]] = {}
+
+    def get_answer(self, system_name: str, case_key: str,
+                   fingerprint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        获取可复用的RAG回答
+
+        出错的回答视为缺失；给出fingerprint时，指纹不一致（系统配置变化）的回答也视为缺失。
+
+        Args:
+            system_name: 系统名
+            case_key: 用例键
+            fingerprint: 当前配置下的回答指纹
+
+        Returns:
+            回答记录，不可复用时返回None
+        """
+        record = self.answers.get((system_name, case_key))
+        if record is None or record.get("error"):
+            return None
+        if fingerprint is not None and record.get("fingerprint") != fingerprint:
+            return None
+        return record
+
+    def get_score(self, evaluator_name: str, system_name: str, case_key: str,
+                  fingerprint: Optional[str] = None) -> Optional[Tuple[Dict[str, Optional[float]], Optional[str]]]:
+        """
+        获取可复用的评价结果
+
+        超时或失败的评价视为缺失；给出fingerprint时，指纹不一致（回答或评估器配置变化）的评价也视为缺失。
+
+        Args:
+            evaluator_name: 评估器名
+            system_name: 系统名
+            case_key: 用例键
+            fingerprint: 当前配置下的评价指纹
+
+        Returns:
+            (评价指标字典, 错误原因)，不可复用时返回None
+        """
+        key = (evaluator_name, system_name, case_key)
+        result = self.scores.get(key)
+        if result is None or result[1] is not None:
+            return None
+        if fingerprint is not None and self.score_fingerprints.get(key) != fingerprint:
+            return None
+        return result
+
+class RunJournal:
+    """运行日志 - 每条RAG回答和每个评价结果完成时追加一行JSON
+
+    记录类型:
+        run     运行元数据（测试用例文件、系统列表等）
+        answer  某个系统对某个用例的回答
+        score   某个评估器对某个系统回答的评价
+
+    用例以问题和标准答案的内容哈希标识，测试用例顺序变化时仍能正确恢复。
+    回答和评价记录带有指纹（用例、系统配置、回答内容、评估器配置的哈希），
+    增量评估时只复用指纹一致的记录。
+    每行写入后立即flush，进程崩溃最多丢失正在写的一行，重放时会跳过不完整的行。
+    """
+
+    FILE_NAME = "run_journal.jsonl"
+
+    def __init__(self, run_dir: str, resume: bool = False):
+        """
+        初始化运行日志
+
+        Args:
+            run_dir: 运行结果目录
+            resume: 为True时在已有日志后追加，否则清空重新开始
+        """
+        self.run_dir = Path(run_dir)
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.run_dir / self.FILE_NAME
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._file.tell() > 0:
+            # 上次中断时可能留下不完整的行，先换行避免新记录接在它后面
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+        self.stats = {"answers": 0, "scores": 0}
+
+    @staticmethod
+    def case_key(question: str, ground_truth: str) -> str:
+        """
+        计算用例键
+
+        Args:
+            question: 问题
+            ground_truth: 标准答案
+
+        Returns:
+            内容哈希（16位十六进制）
+        """
+        payload = json.dumps([question, ground_truth], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def fingerprint(*parts: Any) -> str:
+        """
+        计算指纹
+
+        Args:
+            *parts: 可JSON序列化的组成部分
+
+        Returns:
+            内容哈希（16位十六进制）
+        """
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def exists(cls, run_dir: str) -> bool:
+        """目录中是否已有运行日志"""
+        return (Path(run_dir) / cls.FILE_NAME).exists()
+
+    @classmethod
+    def load(cls, run_dir: str) -> JournalState:
+        """
+        重放运行日志
+
+        Args:
+            run_dir: 运行结果目录
+
+        Returns:
+            运行状态，同一键的记录以最后一条为准
+        """
+        state = JournalState()
+        path = Path(run_dir) / cls.FILE_NAME
+        if not path.exists():
+            return state
+
+        skipped = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程中断时未写完的行
+                    skipped += 1
+                    continue
+
+                record_type = record.get("type")
+                if record_type == "run":
+                    state.run = record
+                elif record_type == "answer":
+                    state.answers[(record["system"], record["case_key"])] = record
+                elif record_type == "score":
+                    key = (record["evaluator"], record["system"], record["case_key"])
+                    state.scores[key] = (record["scores"], record.get("error"))
+                    state.score_fingerprints[key] = record.get("fingerprint")
+
+        if skipped:
+            logger.warning(f"运行日志中有 {skipped} 行不完整，已跳过")
+
+        return state
+
+    def _write(self, record: Dict[str, Any]):
+        """追加一条记录"""
+        record["ts"] = time.time()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def record_run(self, **metadata):
+        """记录运行元数据"""
+        self._write({"type": "run", **metadata})
+
+    def record_answer(self, system_name: str, index: int, case_key: str, result: Dict[str, Any],
+                      fingerprint: Optional[str] = None):
+        """
+        记录RAG回答
+
+        Args:
+            system_name: 系统名
+            index: 用例在测试文件中的位置
+            case_key: 用例键
+            result: 查询结果（answer、contexts、error、latency、timing、telemetry）
+            fingerprint: 回答指纹
+        """
+        self._write({
+            "type": "answer",
+            "system": system_name,
+            "index": index,
+            "case_key": case_key,
+            "answer": result.get("answer", ""),
+            "contexts": result.get("contexts", []),
+            "error": result.get("error"),
+            "latency": result.get("latency"),
+            "timing": result.get("timing"),
+            "telemetry": result.get("telemetry"),
+            "fingerprint": fingerprint
+        })
+        self.stats["answers"] += 1
+
+    def record_scores(self, evaluator_name: str, items: List[Dict[str, Any]],
+                      results: List[Tuple[Dict[str, Optional[float]], Optional[str]]],
+                      fingerprints: Optional[List[Optional[str]]] = None):
+        """
+        记录一批评价结果
+
+        Args:
+            evaluator_name: 评估器名
+            items: 评价项列表（包含system、index、case_key）
+            results: 与评价项一一对应的(评价指标字典, 错误原因)
+            fingerprints: 与评价项一一对应的评价指纹
+        """
+        fingerprints = fingerprints or [None] * len(items)
+        for item, (scores, error), fingerprint in zip(items, results, fingerprints):
+            self._write({
+                "type": "score",
+                "evaluator": evaluator_name,
+                "system": item["system"],
+                "index": item["index"],
+                "case_key": item["case_key"],
+                "scores": scores,
+                "error": error,
+                "fingerprint": fingerprint
+            })
+        self.stats["scores"] += len(items)
+
+    def close(self):
+        """刷盘并关闭日志文件"""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
@@ -0,0 +1,330 @@
+# 运行历史 - SQLite保存每次运行的用例、回答和评分，支持跨运行查询趋势和逐用例回退
+
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command TEXT NOT NULL,
+    source TEXT,
+    output_dir TEXT,
+    systems TEXT NOT NULL,
+    evaluators TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    case_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS cases (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    case_id INTEGER NOT NULL,
+    case_key TEXT NOT NULL,
+    question TEXT NOT NULL,
+    ground_truth TEXT NOT NULL,
+    PRIMARY KEY (run_id, case_id)
+);
+CREATE TABLE IF NOT EXISTS answers (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    case_id INTEGER NOT NULL,
+    system TEXT NOT NULL,
+    answer TEXT,
+    latency REAL,
+    PRIMARY KEY (run_id, case_id, system)
+);
+CREATE TABLE IF NOT EXISTS scores (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    case_id INTEGER NOT NULL,
+    case_key TEXT NOT NULL,
+    system TEXT NOT NULL,
+    evaluator TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    error TEXT,
+    PRIMARY KEY (run_id, case_id, system, evaluator, metric)
+);
+CREATE INDEX IF NOT EXISTS idx_cases_key ON cases(case_key);
+CREATE INDEX IF NOT EXISTS idx_scores_metric ON scores(system, metric, run_id);
+CREATE INDEX IF NOT EXISTS idx_scores_case ON scores(case_key, system, metric);
+"""
+
+RUN_COLUMNS = "run_id, command, source, output_dir, systems, evaluators, status, started_at, finished_at, case_count"
+
+def _run_record(row: Tuple) -> Dict[str, Any]:
+    """runs表的一行转换为字典"""
+    return {
+        "run_id": row[0],
+        "command": row[1],
+        "source": row[2],
+        "output_dir": row[3],
+        "systems": json.loads(row[4]),
+        "evaluators": json.loads(row[5]),
+        "status": row[6],
+        "started_at": row[7],
+        "finished_at": row[8],
+        "case_count": row[9]
+    }
+
+class RunStore:
+    """SQLite运行历史
+
+    表:
+        runs     每次运行一行（命令、输入文件、系统、评估器、状态、用例数）
+        cases    运行中的用例（case_key为问题和标准答案的内容哈希，跨运行关联同一用例）
+        answers  各系统的回答和延迟
+        scores   每个(用例, 系统, 评估器, 指标)一行
+
+    写入按用例缓存，每batch_size个用例在一个事务中批量写入。
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 200):
+        """
+        打开（必要时创建）运行历史数据库
+
+        Args:
+            db_path: SQLite文件路径
+            batch_size: 每个写入事务包含的用例数
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = max(1, batch_size)
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self._pending_cases = 0
+        self._rows: Dict[str, List[Tuple]] = {"cases": [], "answers": [], "scores": []}
+
+    def start_run(self, command: str, source: str, output_dir: str, systems: List[str],
+                  evaluator_metrics: Dict[str, List[str]]) -> int:
+        """
+        登记一次运行
+
+        Args:
+            command: 子命令（run、evaluate）
+            source: 输入文件（测试用例或回答文件）
+            output_dir: 结果输出目录
+            systems: RAG系统名列表
+            evaluator_metrics: {评估器名: 指标列表}
+
+        Returns:
+            运行ID
+        """
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (command, source, output_dir, systems, evaluators, status, started_at) "
+                "VALUES (?, ?, ?, ?, ?, 'running', ?)",
+                (command, source, output_dir, json.dumps(systems, ensure_ascii=False),
+                 json.dumps(evaluator_metrics, ensure_ascii=False), time.time())
+            )
+        return cursor.lastrowid
+
+    def add_case(self, run_id: int, case_id: int, case_key: str, case: Dict[str, Any],
+                 answers: Dict[str, str], latencies: Dict[str, Optional[float]],
+                 scores: Dict[str, Dict[str, Tuple[Dict[str, Optional[float]], Optional[str]]]],
+                 evaluator_metrics: Dict[str, List[str]]):
+        """
+        缓存一个用例的回答和评分，攒够batch_size个用例后写入
+
+        Args:
+            run_id: 运行ID
+            case_id: 用例索引
+            case_key: 用例键
+            case: 测试用例（question、ground_truth）
+            answers: {系统名: 回答}
+            latencies: {系统名: 回答延迟}
+            scores: {系统名: {评估器名: (评价指标字典, 错误原因)}}
+            evaluator_metrics: {评估器名: 指标列表}
+        """
+        self._rows["cases"].append((run_id, case_id, case_key, case["question"], case["ground_truth"]))
+        for system_name, answer in answers.items():
+            self._rows["answers"].append((run_id, case_id, system_name, answer, latencies.get(system_name)))
+            for evaluator_name, metrics in evaluator_metrics.items():
+                metric_scores, error = scores.get(system_name, {}).get(evaluator_name, ({}, "未评价"))
+                for metric in metrics:
+                    self._rows["scores"].append((
+                        run_id, case_id, case_key, system_name, evaluator_name, metric,
+                        metric_scores.get(metric), error
+                    ))
+
+        self._pending_cases += 1
+        if self._pending_cases >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """在一个事务中写入缓存的行"""
+        if not self._pending_cases:
+            return
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO cases VALUES (?, ?, ?, ?, ?)", self._rows["cases"])
+            self._conn.executemany("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)", self._rows["answers"])
+            self._conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._rows["scores"])
+        self._rows = {"cases": [], "answers": [], "scores": []}
+        self._pending_cases = 0
+
+    def finish_run(self, run_id: int, case_count: int, status: str = "completed"):
+        """
+        写入剩余数据并标记运行结束
+
+        Args:
+            run_id: 运行ID
+            case_count: 完成的用例数
+            status: 运行状态
+        """
+        self.flush()
+        with self._conn:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, finished_at = ?, case_count = ? WHERE run_id = ?",
+                (status, time.time(), case_count, run_id)
+            )
+
+    def list_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        最近的运行
+
+        Args:
+            limit: 最多返回的运行数
+
+        Returns:
+            运行记录列表（新的在前）
+        """
+        rows = self._conn.execute(f"SELECT {RUN_COLUMNS} FROM runs ORDER BY run_id DESC LIMIT ?", (limit,))
+        return [_run_record(row) for row in rows]
+
+    def metric_trend(self, system_name: str, metric: str, evaluator_name: Optional[str] = None,
+                     limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        某个系统某个指标在各次运行中的均值
+
+        Args:
+            system_name: 系统名
+            metric: 指标名
+            evaluator_name: 评估器名，默认不限
+            limit: 最多返回的运行数
+
+        Returns:
+            [{run_id, started_at, evaluator, mean, min, max, count, errors}]（新的在前）
+        """
+        query = (
+            "SELECT s.run_id, r.started_at, s.evaluator, AVG(s.value), MIN(s.value), MAX(s.value), "
+            "COUNT(s.value), SUM(s.error IS NOT NULL) "
+            "FROM scores s JOIN runs r ON r.run_id = s.run_id "
+            "WHERE s.system = ? AND s.metric = ?"
+        )
+        params: List[Any] = [system_name, metric]
+        if evaluator_name:
+            query += " AND s.evaluator = ?"
+            params.append(evaluator_name)
+        query += " GROUP BY s.run_id, s.evaluator ORDER BY s.run_id DESC LIMIT ?"
+        params.append(limit)
+
+        return [
+            {
+                "run_id": row[0],
+                "started_at": row[1],
+                "evaluator": row[2],
+                "mean": row[3],
+                "min": row[4],
+                "max": row[5],
+                "count": row[6],
+                "errors": row[7]
+            }
+            for row in self._conn.execute(query, params)
+        ]
+
+    def previous_run(self, run_id: int, system_name: str, metric: str) -> Optional[int]:
+        """某次运行之前、包含该系统和指标的最近一次运行"""
+        row = self._conn.execute(
+            "SELECT MAX(run_id) FROM scores WHERE system = ? AND metric = ? AND run_id < ?",
+            (system_name, metric, run_id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def latest_run(self) -> Optional[int]:
+        """最近一次运行的ID"""
+        row = self._conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0] if row else None
+
+    def get_run(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """获取运行记录，不存在时返回None"""
+        row = self._conn.execute(f"SELECT {RUN_COLUMNS} FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return _run_record(row) if row else None
+
+    def iter_scores(self, run_id: int):
+        """
+        读取一次运行的全部分数
+
+        Args:
+            run_id: 运行ID
+
+        Yields:
+            (系统名, 评估器名, 指标, 用例键, 分数, 问题)
+        """
+        yield from self._conn.execute(
+            "SELECT s.system, s.evaluator, s.metric, s.case_key, s.value, c.question "
+            "FROM scores s JOIN cases c ON c.run_id = s.run_id AND c.case_id = s.case_id "
+            "WHERE s.run_id = ?",
+            (run_id,)
+        )
+
+    def case_regressions(self, run_id: int, baseline_run_id: int, system_name: str, metric: str,
+                         evaluator_name: Optional[str] = None, threshold: float = 0.0,
+                         limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        逐用例比较两次运行，找出分数下降的用例（按用例键关联，用例顺序变化不影响）
+
+        Args:
+            run_id: 当前运行ID
+            baseline_run_id: 基准运行ID
+            system_name: 系统名
+            metric: 指标名
+            evaluator_name: 评估器名，默认不限
+            threshold: 下降超过该值才算回退
+            limit: 最多返回的用例数
+
+        Returns:
+            [{case_key, question, evaluator, baseline, current, delta}]（下降最多的在前）
+        """
+        query = (
+            "SELECT cur.case_key, c.question, cur.evaluator, base.value, cur.value, cur.value - base.value AS delta "
+            "FROM scores cur "
+            "JOIN scores base ON base.case_key = cur.case_key AND base.system = cur.system "
+            "AND base.evaluator = cur.evaluator AND base.metric = cur.metric AND base.run_id = ? "
+            "JOIN cases c ON c.run_id = cur.run_id AND c.case_id = cur.case_id "
+            "WHERE cur.run_id = ? AND cur.system = ? AND cur.metric = ? "
+            "AND cur.value IS NOT NULL AND base.value IS NOT NULL AND cur.value - base.value < ?"
+        )
+        params: List[Any] = [baseline_run_id, run_id, system_name, metric, -threshold]
+        if evaluator_name:
+            query += " AND cur.evaluator = ?"
+            params.append(evaluator_name)
+        query += " ORDER BY delta ASC LIMIT ?"
+        params.append(limit)
+
+        return [
+            {
+                "case_key": row[0],
+                "question": row[1],
+                "evaluator": row[2],
+                "baseline": row[3],
+                "current": row[4],
+                "delta": row[5]
+            }
+            for row in self._conn.execute(query, params)
+        ]
+
+    def close(self):
+        """写入剩余数据并关闭数据库"""
+        if self._conn is None:
+            return
+        self.flush()
+        self._conn.close()
+        self._conn = None
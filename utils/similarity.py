@@ -0,0 +1,94 @@
+# 向量相似度计算 - 基于NumPy矩阵运算的批量余弦相似度
+
+from typing import Sequence
+
+import numpy as np
+
+def as_matrix(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """
+    将向量列表堆叠为float32矩阵
+
+    Args:
+        vectors: 等长向量列表
+
+    Returns:
+        形状为(n, d)的float32矩阵
+    """
+    if len(vectors) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(np.stack([np.asarray(v, dtype=np.float32) for v in vectors]), dtype=np.float32)
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    按行归一化为单位向量（零向量保持为零）
+
+    Args:
+        matrix: 形状为(n, d)的矩阵
+
+    Returns:
+        行归一化后的矩阵
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def cosine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    计算两组向量两两之间的余弦相似度
+
+    Args:
+        a: 形状为(n, d)的矩阵
+        b: 形状为(m, d)的矩阵
+
+    Returns:
+        形状为(n, m)的相似度矩阵，裁剪到[0, 1]
+    """
+    return np.clip(normalize_rows(a) @ normalize_rows(b).T, 0.0, 1.0)
+
+def cosine_to_references(answers: np.ndarray, references: np.ndarray, reference_index: np.ndarray) -> np.ndarray:
+    """
+    计算每个回答与其对应参考文本的余弦相似度
+
+    多个RAG系统对同一问题的回答共享同一行参考向量（标准答案只归一化一次），
+    所有回答在一次向量化运算中完成。
+
+    Args:
+        answers: 回答向量矩阵，形状为(n, d)
+        references: 去重后的参考向量矩阵，形状为(g, d)
+        reference_index: 每个回答对应的参考行号，形状为(n,)
+
+    Returns:
+        形状为(n,)的相似度，裁剪到[0, 1]
+    """
+    if answers.shape[0] == 0:
+        return np.zeros(0, dtype=np.float32)
+    unit_answers = normalize_rows(answers)
+    unit_references = normalize_rows(references)
+    scores = np.einsum("ij,ij->i", unit_answers, unit_references[reference_index])
+    return np.clip(scores, 0.0, 1.0)
+
+def max_cosine_by_owner(answers: np.ndarray, contexts: np.ndarray, owner: np.ndarray) -> np.ndarray:
+    """
+    计算每个回答与其所属上下文片段的最大余弦相似度
+
+    Args:
+        answers: 回答向量矩阵，形状为(n, d)
+        contexts: 所有上下文片段向量，形状为(c, d)
+        owner: 每个上下文片段所属的回答行号，形状为(c,)
+
+    Returns:
+        形状为(n,)的相似度，没有上下文的回答为NaN
+    """
+    result = np.full(answers.shape[0], np.nan, dtype=np.float32)
+    if contexts.shape[0] == 0:
+        return result
+
+    unit_answers = normalize_rows(answers)
+    unit_contexts = normalize_rows(contexts)
+    scores = np.clip(np.einsum("ij,ij->i", unit_answers[owner], unit_contexts), 0.0, 1.0)
+
+    # 按所属回答分组取最大值
+    order = np.argsort(owner, kind="stable")
+    sorted_owner = owner[order]
+    starts = np.flatnonzero(np.r_[True, sorted_owner[1:] != sorted_owner[:-1]])
+    result[sorted_owner[starts]] = np.maximum.reduceat(scores[order], starts)
+    return result
@@ -0,0 +1,93 @@
+# 流式响应 - Server-Sent Events增量解析和首字延迟/字间延迟计时
+
+import time
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+
+async def iter_sse_events(content: Any) -> AsyncIterator[Tuple[str, str]]:
+    """
+    按行增量解析SSE事件流
+
+    Args:
+        content: 按行异步迭代的响应体（aiohttp的response.content）
+
+    Yields:
+        (事件类型, 数据)，多行data按换行拼接，未指定event时事件类型为"message"
+    """
+    event_type = ""
+    data_lines: List[str] = []
+
+    async for raw_line in content:
+        if isinstance(raw_line, bytes):
+            raw_line = raw_line.decode("utf-8", errors="replace")
+        line = raw_line.rstrip("\r\n")
+
+        if not line:
+            # 空行结束一个事件
+            if data_lines:
+                yield event_type or "message", "\n".join(data_lines)
+            event_type = ""
+            data_lines = []
+            continue
+        if line.startswith(":"):
+            continue
+
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            data_lines.append(value)
+        elif field == "event":
+            event_type = value
+
+    if data_lines:
+        yield event_type or "message", "\n".join(data_lines)
+
+class StreamTimer:
+    """流式请求计时：首字延迟（TTFT）、相邻内容片段之间的延迟和总耗时"""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._first: Optional[float] = None
+        self._last: Optional[float] = None
+        self._gaps: List[float] = []
+
+    def token(self):
+        """收到一个包含回答内容的片段"""
+        now = time.perf_counter()
+        if self._first is None:
+            self._first = now
+        else:
+            self._gaps.append(now - self._last)
+        self._last = now
+
+    def result(self) -> Dict[str, Any]:
+        """
+        获取计时结果
+
+        Returns:
+            {ttft, inter_token_latency, total_time, chunks}（秒），没有收到内容时ttft和inter_token_latency为None
+        """
+        total = time.perf_counter() - self._started
+        return {
+            "ttft": round(self._first - self._started, 4) if self._first is not None else None,
+            "inter_token_latency": round(sum(self._gaps) / len(self._gaps), 4) if self._gaps else None,
+            "total_time": round(total, 4),
+            "chunks": len(self._gaps) + (1 if self._first is not None else 0)
+        }
+
+def blocking_timing(started: float) -> Dict[str, Any]:
+    """
+    阻塞模式的计时（只有总耗时）
+
+    Args:
+        started: 请求开始时的time.perf_counter()
+
+    Returns:
+        与StreamTimer.result()相同结构的计时
+    """
+    return {
+        "ttft": None,
+        "inter_token_latency": None,
+        "total_time": round(time.perf_counter() - started, 4),
+        "chunks": None
+    }
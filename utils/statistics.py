@@ -0,0 +1,279 @@
+# 汇总统计 - 基于NumPy的描述统计、向量化bootstrap置信区间和系统间配对差异
+
+import math
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 单次bootstrap重采样矩阵的最大元素数，超过时分块计算以限制内存
+MAX_BOOTSTRAP_ELEMENTS = 1 << 22
+
+# 支持的配对检验方法
+PAIRED_TESTS = ("permutation", "wilcoxon")
+
+def _valid(values: Sequence[Optional[float]]) -> np.ndarray:
+    """转换为float64数组并去掉缺失值（None/NaN）"""
+    array = np.asarray(values, dtype=np.float64)
+    return array[~np.isnan(array)]
+
+def bootstrap_means(values: np.ndarray, n_resamples: int = 2000, seed: Optional[int] = 0) -> np.ndarray:
+    """
+    向量化bootstrap：一次生成(n_resamples, n)的重采样下标矩阵并按行求均值
+
+    Args:
+        values: 不含缺失值的一维数组
+        n_resamples: 重采样次数
+        seed: 随机种子（固定时结果可复现）
+
+    Returns:
+        形状为(n_resamples,)的重采样均值
+    """
+    n = len(values)
+    if n == 0 or n_resamples <= 0:
+        return np.zeros(0, dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    rows_per_chunk = max(1, MAX_BOOTSTRAP_ELEMENTS // n)
+    means = np.empty(n_resamples, dtype=np.float64)
+    for start in range(0, n_resamples, rows_per_chunk):
+        stop = min(n_resamples, start + rows_per_chunk)
+        indices = rng.integers(0, n, size=(stop - start, n))
+        means[start:stop] = values[indices].mean(axis=1)
+    return means
+
+def bootstrap_ci(values: Sequence[Optional[float]], n_resamples: int = 2000, confidence: float = 0.95,
+                 seed: Optional[int] = 0) -> Tuple[Optional[float], Optional[float]]:
+    """
+    均值的bootstrap百分位置信区间
+
+    Args:
+        values: 分数列表（缺失值会被忽略）
+        n_resamples: 重采样次数
+        confidence: 置信水平
+        seed: 随机种子
+
+    Returns:
+        (下限, 上限)，有效值少于2个时为(None, None)
+    """
+    valid = _valid(values)
+    if len(valid) < 2 or n_resamples <= 0:
+        return None, None
+
+    means = bootstrap_means(valid, n_resamples, seed)
+    alpha = (1.0 - confidence) / 2.0
+    low, high = np.quantile(means, [alpha, 1.0 - alpha])
+    return float(low), float(high)
+
+def describe(values: Sequence[Optional[float]], n_resamples: int = 2000, confidence: float = 0.95,
+             seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    描述统计
+
+    Args:
+        values: 分数列表（缺失值会被忽略）
+        n_resamples: bootstrap重采样次数（0表示不计算置信区间）
+        confidence: 置信水平
+        seed: 随机种子
+
+    Returns:
+        {count, missing, mean, median, p10, p90, std, min, max, ci_low, ci_high}，没有有效值时只有count和missing
+    """
+    array = np.asarray(values, dtype=np.float64)
+    valid = array[~np.isnan(array)]
+    stats: Dict[str, Any] = {"count": int(len(valid)), "missing": int(len(array) - len(valid))}
+    if len(valid) == 0:
+        return stats
+
+    p10, median, p90 = np.percentile(valid, [10, 50, 90])
+    ci_low, ci_high = bootstrap_ci(valid, n_resamples, confidence, seed)
+    stats.update({
+        "mean": float(valid.mean()),
+        "median": float(median),
+        "p10": float(p10),
+        "p90": float(p90),
+        "std": float(valid.std(ddof=1)) if len(valid) > 1 else 0.0,
+        "min": float(valid.min()),
+        "max": float(valid.max()),
+        "ci_low": ci_low,
+        "ci_high": ci_high
+    })
+    return stats
+
+def paired_difference(a: Sequence[Optional[float]], b: Sequence[Optional[float]], n_resamples: int = 2000,
+                      confidence: float = 0.95, seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    同一批用例上两个系统的配对差异（a - b），只使用两边都有分数的用例
+
+    Args:
+        a: 系统A按用例顺序排列的分数
+        b: 系统B按用例顺序排列的分数（与a等长）
+        n_resamples: bootstrap重采样次数
+        confidence: 置信水平
+        seed: 随机种子
+
+    Returns:
+        {count, mean_diff, median_diff, ci_low, ci_high, wins, losses, ties}
+    """
+    a_array = np.asarray(a, dtype=np.float64)
+    b_array = np.asarray(b, dtype=np.float64)
+    mask = ~(np.isnan(a_array) | np.isnan(b_array))
+    diff = a_array[mask] - b_array[mask]
+
+    result: Dict[str, Any] = {"count": int(len(diff))}
+    if len(diff) == 0:
+        return result
+
+    ci_low, ci_high = bootstrap_ci(diff, n_resamples, confidence, seed)
+    result.update({
+        "mean_diff": float(diff.mean()),
+        "median_diff": float(np.median(diff)),
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "wins": int((diff > 0).sum()),
+        "losses": int((diff < 0).sum()),
+        "ties": int((diff == 0).sum())
+    })
+    return result
+
+def summarize_scores(values: Dict[Tuple[str, str, str], Sequence[Optional[float]]],
+                     system_names: List[str], evaluator_metrics: Dict[str, List[str]],
+                     n_resamples: int = 2000, confidence: float = 0.95,
+                     seed: Optional[int] = 0) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    计算所有系统/评估器/指标的汇总统计和系统两两之间的配对差异
+
+    Args:
+        values: {(系统名, 评估器名, 指标): 按用例顺序排列的分数}（同一评估器和指标下各系统等长对齐）
+        system_names: 系统名列表
+        evaluator_metrics: {评估器名: 指标列表}
+        n_resamples: bootstrap重采样次数
+        confidence: 置信水平
+        seed: 随机种子
+
+    Returns:
+        (汇总 {系统名: {评估器名: {指标: 统计}}},
+         配对差异 {评估器名: {指标: {"A - B": 差异统计}}})
+    """
+    summary: Dict[str, Any] = {}
+    for system_name in system_names:
+        summary[system_name] = {}
+        for evaluator_name, metrics in evaluator_metrics.items():
+            summary[system_name][evaluator_name] = {}
+            for metric in metrics:
+                stats = describe(values.get((system_name, evaluator_name, metric), []), n_resamples, confidence, seed)
+                if stats["count"]:
+                    summary[system_name][evaluator_name][metric] = stats
+
+    paired: Dict[str, Any] = {}
+    for evaluator_name, metrics in evaluator_metrics.items():
+        paired[evaluator_name] = {}
+        for metric in metrics:
+            comparisons = {}
+            for i, system_a in enumerate(system_names):
+                for system_b in system_names[i + 1:]:
+                    a = values.get((system_a, evaluator_name, metric))
+                    b = values.get((system_b, evaluator_name, metric))
+                    if a is None or b is None:
+                        continue
+                    comparisons[f"{system_a} - {system_b}"] = paired_difference(a, b, n_resamples, confidence, seed)
+            if comparisons:
+                paired[evaluator_name][metric] = comparisons
+    return summary, paired
+
+def permutation_test(diff: Sequence[float], n_resamples: int = 10000, seed: Optional[int] = 0) -> Optional[float]:
+    """
+    配对符号翻转置换检验（双侧），检验配对差异的均值是否为0
+
+    随机翻转每个差异的符号，一次生成(n_resamples, n)的符号矩阵并按行求均值，
+    p值为置换均值的绝对值不小于观测均值的比例。
+
+    Args:
+        diff: 配对差异（不含缺失值）
+        n_resamples: 置换次数
+        seed: 随机种子
+
+    Returns:
+        p值，没有非零差异时为None
+    """
+    diff = np.asarray(diff, dtype=np.float64)
+    n = len(diff)
+    if n == 0 or not np.any(diff):
+        return None
+
+    observed = abs(diff.mean())
+    rng = np.random.default_rng(seed)
+    rows_per_chunk = max(1, MAX_BOOTSTRAP_ELEMENTS // n)
+    extreme = 0
+    for start in range(0, n_resamples, rows_per_chunk):
+        rows = min(n_resamples, start + rows_per_chunk) - start
+        signs = rng.integers(0, 2, size=(rows, n), dtype=np.int8) * 2 - 1
+        permuted = np.abs((signs * diff).mean(axis=1))
+        # 浮点误差内相等的视为同样极端
+        extreme += int(np.count_nonzero(permuted >= observed - 1e-12))
+    return (extreme + 1) / (n_resamples + 1)
+
+def wilcoxon_test(diff: Sequence[float]) -> Optional[float]:
+    """
+    Wilcoxon符号秩检验（双侧，正态近似，去掉零差异，含同秩修正和连续性修正）
+
+    Args:
+        diff: 配对差异（不含缺失值）
+
+    Returns:
+        p值，非零差异为空时为None
+    """
+    diff = np.asarray(diff, dtype=np.float64)
+    diff = diff[diff != 0]
+    n = len(diff)
+    if n == 0:
+        return None
+
+    # 绝对值的平均秩（同值取平均）
+    _, inverse, counts = np.unique(np.abs(diff), return_inverse=True, return_counts=True)
+    upper = np.cumsum(counts)
+    average_ranks = upper - (counts - 1) / 2.0
+    ranks = average_ranks[inverse]
+
+    w_plus = ranks[diff > 0].sum()
+    mean = n * (n + 1) / 4.0
+    variance = n * (n + 1) * (2 * n + 1) / 24.0 - (counts ** 3 - counts).sum() / 48.0
+    if variance <= 0:
+        return None
+
+    z = (abs(w_plus - mean) - 0.5) / math.sqrt(variance)
+    return float(math.erfc(max(z, 0.0) / math.sqrt(2.0)))
+
+def paired_test(a: Sequence[Optional[float]], b: Sequence[Optional[float]], test: str = "permutation",
+                n_resamples: int = 10000, confidence: float = 0.95, seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    配对差异（a - b）及其显著性检验
+
+    Args:
+        a: 按用例对齐的分数
+        b: 按用例对齐的分数（与a等长）
+        test: 检验方法，permutation或wilcoxon
+        n_resamples: 置换和bootstrap次数
+        confidence: 置信水平
+        seed: 随机种子
+
+    Returns:
+        paired_difference的结果加上test和p_value
+    """
+    if test not in PAIRED_TESTS:
+        raise ValueError(f"不支持的检验方法: {test}（支持: {', '.join(PAIRED_TESTS)}）")
+
+    result = paired_difference(a, b, n_resamples, confidence, seed)
+    result["test"] = test
+    if not result["count"]:
+        result["p_value"] = None
+        return result
+
+    a_array = np.asarray(a, dtype=np.float64)
+    b_array = np.asarray(b, dtype=np.float64)
+    mask = ~(np.isnan(a_array) | np.isnan(b_array))
+    diff = a_array[mask] - b_array[mask]
+    if test == "wilcoxon":
+        result["p_value"] = wilcoxon_test(diff)
+    else:
+        result["p_value"] = permutation_test(diff, n_resamples, seed)
+    return result
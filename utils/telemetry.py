@@ -0,0 +1,308 @@
+# 请求遥测 - 每次RAG查询和评价调用的耗时、排队、重试、状态码和负载大小，HDR风格直方图汇总
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+# 每个2的幂区间内的线性子桶数（2^SUB_BUCKET_BITS），相对误差不超过1/2^(SUB_BUCKET_BITS-1)
+SUB_BUCKET_BITS = 7
+
+# 直方图报告的分位数
+PERCENTILES = (50, 95, 99)
+
+class Histogram:
+    """HDR风格的对数-线性直方图
+
+    值按scale换算为非负整数后分桶：小于2^SUB_BUCKET_BITS的值每个整数一个桶，
+    更大的值在每个2的幂区间内均分为2^(SUB_BUCKET_BITS-1)个桶，相对误差约0.8%。
+    桶计数稀疏保存，内存只与出现过的数量级有关，记录一个值是O(1)。
+    """
+
+    def __init__(self, scale: float = 1.0):
+        """
+        初始化直方图
+
+        Args:
+            scale: 记录时的换算倍数（例如秒换算为微秒时为1e6）
+        """
+        self.scale = scale
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    @staticmethod
+    def _index(value: int) -> int:
+        """整数值所在的桶"""
+        sub_count = 1 << SUB_BUCKET_BITS
+        if value < sub_count:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return shift * (sub_count >> 1) + (value >> shift)
+
+    @staticmethod
+    def _bounds(index: int) -> Tuple[int, int]:
+        """桶对应的整数值范围[下限, 上限]"""
+        sub_count = 1 << SUB_BUCKET_BITS
+        if index < sub_count:
+            return index, index
+        half = sub_count >> 1
+        shift = index // half - 1
+        sub = index - shift * half
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    def record(self, value: Optional[float]):
+        """
+        记录一个值（None和负值忽略）
+
+        Args:
+            value: 原始单位的值
+        """
+        if value is None or value < 0:
+            return
+        index = self._index(int(value * self.scale))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        分位数（返回所在桶的中点，换算回原始单位）
+
+        Args:
+            percentile: 0-100
+
+        Returns:
+            分位数，没有记录时为None
+        """
+        if not self.count:
+            return None
+        target = max(1, int(round(self.count * percentile / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                low, high = self._bounds(index)
+                value = (low + high) / 2.0 / self.scale
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        汇总
+
+        Returns:
+            {count, mean, min, max, p50, p95, p99}
+        """
+        if not self.count:
+            return {"count": 0}
+        summary = {"count": self.count, "mean": self.total / self.count, "min": self.min, "max": self.max}
+        for percentile in PERCENTILES:
+            summary[f"p{percentile}"] = self.percentile(percentile)
+        return summary
+
+    def cumulative_counts(self, bounds: Tuple[float, ...]) -> List[int]:
+        """
+        不大于各上界的记录数（用于导出Prometheus直方图的le桶，跨越上界的桶不计入）
+
+        Args:
+            bounds: 升序的上界（原始单位）
+
+        Returns:
+            与bounds等长的累计计数
+        """
+        limits = [int(bound * self.scale) for bound in bounds]
+        counts = [0] * len(limits)
+        for index, count in self.counts.items():
+            high = self._bounds(index)[1]
+            for position, limit in enumerate(limits):
+                if high <= limit:
+                    counts[position] += count
+        return counts
+
+# 每次调用记录的直方图指标及换算倍数：时间按微秒、字节按1字节分桶
+METRIC_SCALES = {
+    "wall_time": 1e6,
+    "queue_wait": 1e6,
+    "retries": 1.0,
+    "request_bytes": 1.0,
+    "response_bytes": 1.0
+}
+
+class TelemetryStore:
+    """进程内的遥测存储：按(类别, 名称)保存各指标的直方图、状态码和成功/失败计数，以及进行中的调用数"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._statuses: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._outcomes: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+
+    def begin(self, scope: str, name: str):
+        """
+        一次调用开始
+
+        Args:
+            scope: 类别
+            name: 系统名、评估器名或模型名
+        """
+        key = (scope, name)
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def record(self, scope: str, name: str, record: Dict[str, Any]):
+        """
+        记录一次调用
+
+        Args:
+            scope: 类别（rag、judge、embedding、operation）
+            name: 系统名、评估器名或模型名
+            record: track()产生的调用记录
+        """
+        key = (scope, name)
+        self._in_flight[key] = max(0, self._in_flight.get(key, 0) - 1)
+        outcomes = self._outcomes.setdefault(key, {"success": 0, "error": 0})
+        outcomes["error" if record.get("error") else "success"] += 1
+
+        for metric, scale in METRIC_SCALES.items():
+            key = (scope, name, metric)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(scale)
+            histogram.record(record.get(metric))
+
+        statuses = self._statuses.setdefault((scope, name), {})
+        status = str(record.get("status") or "unknown")
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总所有调用
+
+        Returns:
+            {类别: {名称: {指标: {count, mean, min, max, p50, p95, p99}, "status": {状态: 次数}}}}
+        """
+        result: Dict[str, Any] = {}
+        for (scope, name, metric), histogram in self._histograms.items():
+            if histogram.count:
+                result.setdefault(scope, {}).setdefault(name, {})[metric] = histogram.to_dict()
+        for (scope, name), statuses in self._statuses.items():
+            result.setdefault(scope, {}).setdefault(name, {})["status"] = dict(statuses)
+        return result
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        当前状态（供指标导出使用，直方图为内部对象，只读）
+
+        Returns:
+            [{scope, name, in_flight, outcomes, status, histograms: {指标: Histogram}}]
+        """
+        keys = set(self._in_flight) | set(self._outcomes)
+        return [
+            {
+                "scope": scope,
+                "name": name,
+                "in_flight": self._in_flight.get((scope, name), 0),
+                "outcomes": dict(self._outcomes.get((scope, name), {"success": 0, "error": 0})),
+                "status": dict(self._statuses.get((scope, name), {})),
+                "histograms": {
+                    metric: self._histograms[(scope, name, metric)]
+                    for metric in METRIC_SCALES if (scope, name, metric) in self._histograms
+                }
+            }
+            for scope, name in sorted(keys)
+        ]
+
+    def reset(self):
+        """清空所有记录"""
+        self._histograms.clear()
+        self._statuses.clear()
+        self._outcomes.clear()
+        self._in_flight.clear()
+
+# 全局遥测存储
+_store = TelemetryStore()
+
+# 当前任务正在进行的调用记录（连接器、限制器和重试通过下面的函数补充字段）
+_current_record: ContextVar[Optional[Dict[str, Any]]] = ContextVar("telemetry_record", default=None)
+
+def get_telemetry() -> TelemetryStore:
+    """获取全局遥测存储"""
+    return _store
+
+@contextmanager
+def track(scope: str, name: str):
+    """
+    记录一次调用：结束时写入全局直方图
+
+    Args:
+        scope: 类别（rag、judge、embedding）
+        name: 系统名、评估器名或模型名
+
+    Yields:
+        调用记录 {wall_time, queue_wait, retries, status, error, request_bytes, response_bytes}
+    """
+    record: Dict[str, Any] = {
+        "wall_time": None, "queue_wait": 0.0, "retries": 0, "status": None, "error": False,
+        "request_bytes": None, "response_bytes": None
+    }
+    _store.begin(scope, name)
+    token = _current_record.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+        if record["status"] is None:
+            # 没有经过HTTP请求（如本地计算）且正常结束
+            record["status"] = "ok"
+    except BaseException as e:
+        record["error"] = True
+        if record["status"] is None:
+            record["status"] = "timeout" if isinstance(e, TimeoutError) else "error"
+        raise
+    finally:
+        _current_record.reset(token)
+        record["wall_time"] = round(time.perf_counter() - started, 6)
+        record["queue_wait"] = round(record["queue_wait"], 6)
+        _store.record(scope, name, record)
+
+def add_queue_wait(seconds: float):
+    """当前调用等待并发槽位或速率配额的时间（累加）"""
+    record = _current_record.get()
+    if record is not None:
+        record["queue_wait"] += seconds
+
+def note_retry():
+    """当前调用发生了一次重试"""
+    record = _current_record.get()
+    if record is not None:
+        record["retries"] += 1
+
+def note_response(status: Any, request_bytes: Optional[int] = None, response_bytes: Optional[int] = None):
+    """
+    当前调用的HTTP状态码和负载大小（状态码以最后一次请求为准，字节数在重试和多次请求间累加）
+
+    Args:
+        status: HTTP状态码，或"timeout"、"circuit_open"、"error"
+        request_bytes: 请求体字节数
+        response_bytes: 响应体字节数
+    """
+    record = _current_record.get()
+    if record is None:
+        return
+    record["status"] = status
+    if request_bytes is not None:
+        record["request_bytes"] = (record["request_bytes"] or 0) + request_bytes
+    if response_bytes is not None:
+        record["response_bytes"] = (record["response_bytes"] or 0) + response_bytes
+
+def note_error():
+    """当前调用失败：没有收到过HTTP响应（连接失败、解析错误等）时状态记为"error"，否则保留最后的状态码"""
+    record = _current_record.get()
+    if record is None:
+        return
+    record["error"] = True
+    if record["status"] is None:
+        record["status"] = "error"
@@ -0,0 +1,191 @@
+# 测试用例加载 - 按需逐条读取JSONL、CSV、Parquet和JSON数组文件
+
+import csv
+import json
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, TextIO
+
+# 测试用例必须包含的字段
+REQUIRED_FIELDS = ("question", "ground_truth")
+
+# JSON数组每次读取的字符数
+JSON_CHUNK_SIZE = 1 << 16
+
+def _iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """逐行读取JSONL文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第{line_no}行JSON格式错误: {e}")
+
+def _iter_csv(path: Path) -> Iterator[Dict[str, Any]]:
+    """逐行读取CSV文件（首行为列名）"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
+
+def _iter_parquet(path: Path) -> Iterator[Dict[str, Any]]:
+    """按行组批量读取Parquet文件"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("读取Parquet测试用例需要安装pyarrow: pip install pyarrow")
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=1024):
+        yield from batch.to_pylist()
+
+def _iter_json_array(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    增量解析JSON数组，每次只在内存中保留一个分块和当前元素
+
+    Args:
+        f: 以文本模式打开的文件
+
+    Yields:
+        数组中的每个元素
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    started = False
+
+    def fill() -> bool:
+        """读取下一个分块，返回是否读到数据"""
+        nonlocal buffer, position, eof
+        chunk = f.read(JSON_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace() -> bool:
+        """跳过空白，返回缓冲区中是否还有字符"""
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return True
+            if not fill():
+                return False
+
+    # 数组开头
+    if not skip_whitespace() or buffer[position] != "[":
+        raise ValueError("JSON测试用例文件必须是数组")
+    position += 1
+
+    while True:
+        if not skip_whitespace():
+            raise ValueError("JSON数组不完整")
+
+        if buffer[position] == "]":
+            return
+        if started:
+            if buffer[position] != ",":
+                raise ValueError(f"JSON数组格式错误: 期望',' 实际'{buffer[position]}'")
+            position += 1
+            if not skip_whitespace():
+                raise ValueError("JSON数组不完整")
+
+        # 解析一个元素，元素跨分块时继续读取
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # 数字等标量可能恰好在分块边界被截断（如"67"和".5"分在两个分块），
+                # 读到结尾前需要确认后面还有字符，数字后面还需要是分隔符
+                truncated = end == len(buffer) or (
+                    isinstance(item, (int, float)) and buffer[end] not in ",]" and not buffer[end].isspace()
+                )
+                if truncated and not eof and fill():
+                    continue
+                break
+            except json.JSONDecodeError as e:
+                if eof or not fill():
+                    raise ValueError(f"JSON格式错误: {e}")
+
+        position = end
+        started = True
+        yield item
+
+def _iter_json(path: Path) -> Iterator[Dict[str, Any]]:
+    """增量读取JSON数组文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from _iter_json_array(f)
+
+# 扩展名 -> 读取函数
+READERS = {
+    ".jsonl": _iter_jsonl,
+    ".ndjson": _iter_jsonl,
+    ".csv": _iter_csv,
+    ".parquet": _iter_parquet,
+    ".json": _iter_json
+}
+
+def iter_test_cases(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    按需逐条读取测试用例
+
+    根据扩展名选择格式（.jsonl/.ndjson、.csv、.parquet、.json），整个文件不会一次性读入内存。
+    文件不存在或格式不支持时立即报错，内容错误在读到对应位置时报错。
+
+    Args:
+        file_path: 测试用例文件路径
+
+    Returns:
+        测试用例迭代器（每个元素至少包含question和ground_truth）
+    """
+    path = Path(file_path)
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        raise ValueError(f"不支持的测试用例格式: {path.suffix}（支持: {', '.join(READERS)}）")
+    if not path.is_file():
+        raise ValueError(f"测试用例文件不存在: {file_path}")
+
+    return _iter_validated(reader, path)
+
+def _iter_validated(reader, path: Path) -> Iterator[Dict[str, Any]]:
+    """读取并检查必需字段"""
+    file_path = str(path)
+    try:
+        for index, case in enumerate(reader(path)):
+            if not isinstance(case, dict) or any(field not in case for field in REQUIRED_FIELDS):
+                raise ValueError(f"第{index + 1}个测试用例缺少字段: {', '.join(REQUIRED_FIELDS)}")
+            yield case
+    except ValueError as e:
+        raise ValueError(f"测试用例加载失败 {file_path}: {e}")
+    except OSError as e:
+        raise ValueError(f"测试用例加载失败 {file_path}: {e}")
+
+def count_test_cases(file_path: str) -> Optional[int]:
+    """
+    统计测试用例数（用于显示进度和预计剩余时间）
+
+    JSONL按非空行计数、Parquet读取文件元数据，不解析内容；CSV和JSON数组需要完整读一遍。
+
+    Args:
+        file_path: 测试用例文件路径
+
+    Returns:
+        用例数，格式不支持或文件不存在时为None
+    """
+    path = Path(file_path)
+    reader = READERS.get(path.suffix.lower())
+    if reader is None or not path.is_file():
+        return None
+    if reader is _iter_jsonl:
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+    if reader is _iter_parquet:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            return None
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(1 for _ in reader(path))